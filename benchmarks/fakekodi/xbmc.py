@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+"""Stand-in for Kodi's xbmc module.
+
+JSON-RPC requests are answered by the library assigned to `LIBRARY`
+(see benchmarks/synthetic.py) and special:// paths are mapped below
+`ROOT`. The time spent building responses is added to `RPC_SECONDS`, it
+stands in for the time Kodi itself needs.
+"""
+
+import json
+import os
+import time
+
+LOGDEBUG = 0
+LOGINFO = 1
+LOGWARNING = 2
+LOGERROR = 3
+LOGFATAL = 4
+
+ROOT = '/tmp/fakekodi'
+LIBRARY = None
+VERBOSE = False
+RPC_SECONDS = 0.0
+RPC_CALLS = 0
+
+
+def log(msg, level=LOGDEBUG):
+    if VERBOSE or level >= LOGWARNING:
+        print(msg)
+
+
+def translatePath(path):
+    if path.startswith('special://'):
+        return os.path.join(ROOT, path[len('special://'):])
+    return path
+
+
+def executeJSONRPC(request):
+    global RPC_SECONDS, RPC_CALLS
+    started = time.time()
+    response = json.dumps(LIBRARY.handle(json.loads(request)))
+    RPC_SECONDS += time.time() - started
+    RPC_CALLS += 1
+    return response
+
+
+def getInfoLabel(label):
+    return ''
+
+
+def getGlobalIdleTime():
+    return 0
+
+
+def sleep(milliseconds):
+    time.sleep(milliseconds / 1000.0)
+
+
+class Monitor(object):
+
+    def abortRequested(self):
+        return False
+
+    def waitForAbort(self, timeout=0):
+        time.sleep(timeout or 0)
+        return False
+
+
+class Player(object):
+
+    def isPlaying(self):
+        return False
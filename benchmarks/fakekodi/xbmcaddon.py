@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+
+"""Stand-in for Kodi's xbmcaddon module, settings are read from `SETTINGS`."""
+
+import os
+
+SETTINGS = {}
+INFO = {
+    'id': 'script.artworkorganizer',
+    'name': 'Artwork Organizer',
+    'version': '0.0.0',
+    'profile': 'special://profile/addon_data/script.artworkorganizer/',
+    'path': os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+}
+
+
+class Addon(object):
+
+    def __init__(self, id=None):
+        pass
+
+    def getAddonInfo(self, key):
+        return INFO[key]
+
+    def getSetting(self, key):
+        return SETTINGS.get(key, '')
+
+    def getSettingBool(self, key):
+        return SETTINGS.get(key, '') == 'true'
+
+    def getSettingInt(self, key):
+        return int(SETTINGS.get(key) or 0)
+
+    def setSetting(self, key, value):
+        SETTINGS[key] = value
+
+    def getLocalizedString(self, id):
+        return str(id)
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+"""Stand-in for Kodi's xbmcgui module, dialogs do nothing."""
+
+
+class Window(object):
+    _properties = {}
+
+    def __init__(self, id):
+        self._id = id
+
+    def getProperty(self, key):
+        return self._properties.get((self._id, key), '')
+
+    def setProperty(self, key, value):
+        self._properties[(self._id, key)] = value
+
+    def clearProperty(self, key):
+        self._properties.pop((self._id, key), None)
+
+
+class DialogProgress(object):
+
+    def create(self, heading, message=''):
+        pass
+
+    def update(self, percent, message=''):
+        pass
+
+    def iscanceled(self):
+        return False
+
+    def close(self):
+        pass
+
+
+class DialogProgressBG(DialogProgress):
+
+    def isFinished(self):
+        return False
+
+
+class Dialog(object):
+
+    def ok(self, heading, message):
+        return True
+
+    def yesno(self, heading, message, *args, **kwargs):
+        return True
+
+    def notification(self, heading, message, *args, **kwargs):
+        pass
+
+    def textviewer(self, heading, text, *args, **kwargs):
+        pass
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+"""Stand-in for Kodi's xbmcvfs module on top of the local filesystem."""
+
+import os
+import shutil
+
+from xbmc import translatePath
+
+
+def exists(path):
+    return os.path.exists(translatePath(path))
+
+
+def listdir(path):
+    path = translatePath(path)
+    dirs, files = [], []
+    for name in os.listdir(path):
+        if os.path.isdir(os.path.join(path, name)):
+            dirs.append(name)
+        else:
+            files.append(name)
+    return dirs, files
+
+
+def mkdir(path):
+    try:
+        os.mkdir(translatePath(path))
+        return True
+    except OSError:
+        return False
+
+
+def mkdirs(path):
+    try:
+        os.makedirs(translatePath(path))
+        return True
+    except OSError:
+        return False
+
+
+def rmdir(path, force=False):
+    try:
+        if force:
+            shutil.rmtree(translatePath(path))
+        else:
+            os.rmdir(translatePath(path))
+        return True
+    except OSError:
+        return False
+
+
+def copy(source, dest):
+    try:
+        shutil.copyfile(translatePath(source), translatePath(dest))
+        return True
+    except (IOError, OSError):
+        return False
+
+
+def delete(path):
+    try:
+        os.remove(translatePath(path))
+        return True
+    except OSError:
+        return False
+
+
+def rename(source, dest):
+    try:
+        os.replace(translatePath(source), translatePath(dest))
+        return True
+    except OSError:
+        return False
+
+
+class Stat(object):
+
+    def __init__(self, path):
+        try:
+            self._stat = os.stat(translatePath(path))
+        except OSError:
+            self._stat = None
+
+    def st_size(self):
+        return self._stat.st_size if self._stat else 0
+
+    def st_mtime(self):
+        return int(self._stat.st_mtime) if self._stat else 0
+
+
+class File(object):
+
+    def __init__(self, path, mode='r'):
+        self._file = open(translatePath(path), 'wb' if mode == 'w' else 'rb')
+
+    def read(self, size=-1):
+        return self.readBytes(size).decode('utf-8')
+
+    def readBytes(self, size=-1):
+        if size and size > 0:
+            return bytearray(self._file.read(size))
+        return bytearray(self._file.read())
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self._file.write(data)
+        return True
+
+    def size(self):
+        return os.fstat(self._file.fileno()).st_size
+
+    def seek(self, offset, whence=0):
+        return self._file.seek(offset, whence)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
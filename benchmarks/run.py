@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmark the add-on outside Kodi against a synthetic library.
+
+    python benchmarks/run.py --sources 500 --movies 10000 --episodes 200000
+    python benchmarks/run.py --save-baseline benchmarks/baseline.json
+    python benchmarks/run.py --baseline benchmarks/baseline.json --tolerance 0.25
+
+The stand-in Kodi modules in benchmarks/fakekodi are put in front of the
+path, so the add-on runs unmodified. Each phase is timed separately:
+
+    sources     media source identification (LibrarySnapshot)
+    rpc_parse   paged library queries parsed into item records
+    naming      artwork file names built from the records
+    copy        a complete Main() run, library queries included
+
+With --baseline the run fails (exit status 1) when a phase takes longer
+than its baseline time plus the tolerance.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, 'fakekodi'))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import xbmc
+import xbmcaddon
+from synthetic import SyntheticLibrary
+
+ARTTYPES = ['moviefanart', 'tvshowfanart', 'musicvideofanart', 'artistfanart', 'moviethumbs', 'movieposters',
+            'tvshowbanners', 'tvshowposters', 'seasonthumbs', 'episodethumbs', 'musicvideothumbs', 'artistthumbs',
+            'albumthumbs']
+
+
+class Phase(object):
+
+    def __init__(self, name, results, trace_memory):
+        self.name = name
+        self.results = results
+        self.trace_memory = trace_memory
+        self.items = 0
+
+    def __enter__(self):
+        if self.trace_memory:
+            tracemalloc.start()
+        self.rpc_seconds = xbmc.RPC_SECONDS
+        self.started = time.time()
+        return self
+
+    def __exit__(self, *args):
+        seconds = time.time() - self.started
+        result = {'seconds': round(seconds, 4), 'items': self.items,
+                  'items_per_sec': round(self.items / seconds, 1) if seconds else None,
+                  'kodi_seconds': round(xbmc.RPC_SECONDS - self.rpc_seconds, 4)}
+        if self.trace_memory:
+            result['peak_memory_mb'] = round(tracemalloc.get_traced_memory()[1] / 1e6, 2)
+            tracemalloc.stop()
+        self.results[self.name] = result
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sources', type=int, default=10)
+    parser.add_argument('--movies', type=int, default=2000)
+    parser.add_argument('--tvshows', type=int, default=200)
+    parser.add_argument('--episodes', type=int, default=10000)
+    parser.add_argument('--musicvideos', type=int, default=200)
+    parser.add_argument('--artists', type=int, default=200)
+    parser.add_argument('--albums', type=int, default=400)
+    parser.add_argument('--art-files', type=int, default=500, help='number of unique fake images on disk')
+    parser.add_argument('--art-size', type=int, default=20000, help='size of each fake image in bytes')
+    parser.add_argument('--split', action='store_true', help='split artwork by media source')
+    parser.add_argument('--setting', action='append', default=[], metavar='ID=VALUE',
+                        help='override an add-on setting, can be repeated')
+    parser.add_argument('--memory', action='store_true', help='trace peak python memory per phase (slower)')
+    parser.add_argument('--root', help='working directory, a temporary one is removed afterwards')
+    parser.add_argument('--baseline', help='fail when a phase is slower than in this baseline file')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown against the baseline')
+    parser.add_argument('--save-baseline', help='write the results as the new baseline')
+    parser.add_argument('--verbose', action='store_true', help='print the add-on log')
+    return parser.parse_args(argv)
+
+
+def setup(args, root):
+    xbmc.ROOT = root
+    xbmc.VERBOSE = args.verbose
+    for path in ('masterprofile', 'profile/addon_data/script.artworkorganizer', 'database', 'thumbnails'):
+        if not os.path.isdir(os.path.join(root, path)):
+            os.makedirs(os.path.join(root, path))
+    open(os.path.join(root, 'masterprofile', 'sources.xml'), 'w').close()
+    xbmc.LIBRARY = SyntheticLibrary(root, sources=args.sources, movies=args.movies, tvshows=args.tvshows,
+                                    episodes=args.episodes, musicvideos=args.musicvideos, artists=args.artists,
+                                    albums=args.albums, art_files=args.art_files, art_size=args.art_size)
+    settings = dict((arttype, 'true') for arttype in ARTTYPES)
+    settings['directory'] = os.path.join(root, 'artwork')
+    if args.split:
+        settings.update({'split_media_sources': 'true', 'split_movies_sources': 'true', 'split_tvshows_sources': 'true'})
+    settings.update(setting.split('=', 1) for setting in args.setting)
+    xbmcaddon.SETTINGS.clear()
+    xbmcaddon.SETTINGS.update(settings)
+
+
+def benchmark(args):
+    import default
+    import lib.library as video_library
+
+    results = {}
+    snapshot = video_library.LibrarySnapshot()
+    with Phase('sources', results, args.memory) as phase:
+        snapshot.movie_content
+        phase.items = len(snapshot.movies) + len(snapshot.tvshows) + len(snapshot.episodes)
+
+    records = []
+    with Phase('rpc_parse', results, args.memory) as phase:
+        movies = video_library.LibraryQuery(
+            "VideoLibrary.GetMovies", "movies", {"properties": ["file", "title", "year", "fanart", "thumbnail", "art"]},
+            convert=lambda item: video_library.Movie(item['movieid'], (item['fanart'], item['thumbnail'], item['art'].get('poster')),
+                                                     None, video_library._normalize_path(item['file']), item['title'], item['year']))
+        episodes = video_library.LibraryQuery(
+            "VideoLibrary.GetEpisodes", "episodes", {"properties": ["file", "title", "thumbnail", "season", "episode", "showtitle"]},
+            convert=lambda item: video_library.Episode(item['episodeid'], (item['thumbnail'],), None,
+                                                       video_library._normalize_path(item['file']), item['showtitle'],
+                                                       item['season'], item['episode'], item['title']))
+        records.extend(movies)
+        records.extend(episodes)
+        phase.items = len(records)
+
+    with Phase('naming', results, args.memory) as phase:
+        for record in records:
+            video_library._normalize_string(default.clean_filename(record.name + '.jpg'))
+        phase.items = len(records)
+    del records
+
+    with Phase('copy', results, args.memory) as phase:
+        default.Main()
+        phase.items = sum(len(files) for path, dirs, files in os.walk(os.path.join(xbmc.ROOT, 'artwork')))
+    return results
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name in baseline and result['seconds'] > baseline[name]['seconds'] * (1 + tolerance):
+            regressions.append('%s: %.3fs, baseline %.3fs' % (name, result['seconds'], baseline[name]['seconds']))
+    return regressions
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    root = args.root or tempfile.mkdtemp(prefix='artworkorganizer-bench-')
+    try:
+        started = time.time()
+        setup(args, root)
+        print('synthetic library: %s items, %s sources (%.1fs)' % (xbmc.LIBRARY.count(), args.sources, time.time() - started))
+        results = benchmark(args)
+    finally:
+        if not args.root:
+            shutil.rmtree(root, ignore_errors=True)
+    for name in ('sources', 'rpc_parse', 'naming', 'copy'):
+        result = results[name]
+        print('%-10s %9.3fs %9s items %12s items/sec  kodi %.3fs%s' % (
+            name, result['seconds'], result['items'], result['items_per_sec'], result['kodi_seconds'],
+            '  peak %.1f MB' % result['peak_memory_mb'] if 'peak_memory_mb' in result else ''))
+    if resource is not None:
+        # kilobytes on linux, bytes on macos
+        print('peak process memory: %s' % resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print('slower than baseline:\n  ' + '\n  '.join(regressions))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+"""Synthetic Kodi library for the benchmarks.
+
+Generates media sources, movies, tv shows with seasons and episodes,
+music videos, artists and albums, and answers the JSON-RPC methods the
+add-on uses (filters, limits, batches). Artwork is a pool of fake image
+files on disk that items refer to round robin.
+"""
+
+import json
+import os
+
+METHODS = {
+    'VideoLibrary.GetMovies': ('movies', 'movieid'),
+    'VideoLibrary.GetTVShows': ('tvshows', 'tvshowid'),
+    'VideoLibrary.GetSeasons': ('seasons', 'seasonid'),
+    'VideoLibrary.GetEpisodes': ('episodes', 'episodeid'),
+    'VideoLibrary.GetMusicVideos': ('musicvideos', 'musicvideoid'),
+    'AudioLibrary.GetArtists': ('artists', 'artistid'),
+    'AudioLibrary.GetAlbums': ('albums', 'albumid'),
+}
+
+DATEADDED = '2020-01-01 00:00:00'
+
+
+class SyntheticLibrary(object):
+
+    def __init__(self, root, sources=10, movies=1000, tvshows=100, episodes=5000, musicvideos=100,
+                 artists=100, albums=200, art_files=500, art_size=20000):
+        self.root = root
+        self.art = self._create_art(art_files, art_size)
+        self._art_index = 0
+        half = max(1, sources // 2)
+        self.sources = {
+            'video': [{'label': 'Movies %03d' % i, 'file': '/media/movies%03d/' % i} for i in range(half)] +
+                     [{'label': 'TV %03d' % i, 'file': '/media/tv%03d/' % i} for i in range(max(1, sources - half))],
+            'music': [{'label': 'Music', 'file': '/media/music/'}],
+        }
+        movie_sources = [source['file'] for source in self.sources['video'][:half]]
+        tv_sources = [source['file'] for source in self.sources['video'][half:]]
+        self.items = dict((key, []) for key, idkey in METHODS.values())
+        # filtered item lists, paged queries repeat the same filter for every page
+        self._filtered = {}
+        for i in range(movies):
+            path = '%sMovie %d/movie %d.mkv' % (movie_sources[i % len(movie_sources)], i, i)
+            self._add('movies', 'movieid', {'title': 'Movie %d' % i, 'year': 1950 + i % 70, 'file': path,
+                                            'fanart': self._next_art(), 'thumbnail': self._next_art(),
+                                            'art': {'poster': self._next_art()}})
+        for i in range(tvshows):
+            path = '%sShow %d/' % (tv_sources[i % len(tv_sources)], i)
+            self._add('tvshows', 'tvshowid', {'title': 'Show %d' % i, 'file': path, 'fanart': self._next_art(),
+                                              'art': {'banner': self._next_art(), 'poster': self._next_art()}})
+        seasons = {}
+        for i in range(episodes):
+            show = self.items['tvshows'][i % max(1, tvshows)] if tvshows else None
+            if show is None:
+                break
+            season = 1 + (i // max(1, tvshows)) // 20
+            number = 1 + (i // max(1, tvshows)) % 20
+            key = (show['tvshowid'], season)
+            if key not in seasons:
+                seasons[key] = self._add('seasons', 'seasonid', {'tvshowid': show['tvshowid'], 'season': season,
+                                                                 'showtitle': show['title'], 'thumbnail': self._next_art()},
+                                         label='Season %d' % season)
+            self._add('episodes', 'episodeid', {'tvshowid': show['tvshowid'], 'title': 'Episode %d' % i,
+                                                'showtitle': show['title'], 'season': season, 'episode': number,
+                                                'file': '%sS%02dE%02d.mkv' % (show['file'], season, number),
+                                                'thumbnail': self._next_art()})
+        for i in range(musicvideos):
+            self._add('musicvideos', 'musicvideoid', {'title': 'Song %d' % i, 'artist': ['Artist %d' % (i % 50)],
+                                                      'file': '/media/musicvideos/song %d.mkv' % i,
+                                                      'fanart': self._next_art(), 'thumbnail': self._next_art()})
+        for i in range(artists):
+            self._add('artists', 'artistid', {'artist': 'Artist %d' % i, 'fanart': self._next_art(),
+                                              'thumbnail': self._next_art()}, label='Artist %d' % i)
+        for i in range(albums):
+            self._add('albums', 'albumid', {'title': 'Album %d' % i, 'artist': ['Artist %d' % (i % max(1, artists))],
+                                            'thumbnail': self._next_art()})
+
+    def _create_art(self, count, size):
+        directory = os.path.join(self.root, 'media', 'art')
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        paths = []
+        for i in range(count):
+            path = os.path.join(directory, '%05d.jpg' % i)
+            if not os.path.exists(path):
+                with open(path, 'wb') as f:
+                    f.write(os.urandom(size))
+            paths.append(path)
+        return paths
+
+    def _next_art(self):
+        self._art_index += 1
+        return self.art[self._art_index % len(self.art)]
+
+    def _add(self, key, idkey, item, label=None):
+        item[idkey] = len(self.items[key]) + 1
+        item['label'] = label or item.get('title', '')
+        item['dateadded'] = DATEADDED
+        self.items[key].append(item)
+        return item
+
+    def count(self):
+        return sum(len(items) for items in self.items.values())
+
+    def handle(self, query):
+        if isinstance(query, list):
+            return [self.handle(item) for item in query]
+        method = query['method']
+        params = query.get('params', {})
+        if method == 'Files.GetSources':
+            return self._result(query, {'sources': self.sources.get(params.get('media'), [])})
+        if method not in METHODS:
+            return {'id': query.get('id'), 'jsonrpc': '2.0', 'error': {'code': -32601, 'message': 'Method not found.'}}
+        key, idkey = METHODS[method]
+        items = self._filter(key, params.get('tvshowid'), params.get('filter'))
+        total = len(items)
+        limits = params.get('limits', {})
+        start = limits.get('start', 0)
+        end = min(limits.get('end', total), total)
+        fields = set(params.get('properties', [])) | set([idkey, 'label'])
+        page = [dict((field, value) for field, value in item.items() if field in fields) for item in items[start:end]]
+        result = {'limits': {'start': start, 'end': start + len(page), 'total': total}}
+        if page:
+            result[key] = page
+        return self._result(query, result)
+
+    def _filter(self, key, tvshowid, rule):
+        cache_key = (key, tvshowid, json.dumps(rule, sort_keys=True))
+        if cache_key not in self._filtered:
+            items = self.items[key]
+            if tvshowid is not None:
+                items = [item for item in items if item['tvshowid'] == tvshowid]
+            if rule:
+                items = [item for item in items if _match(item, rule)]
+            self._filtered[cache_key] = items
+        return self._filtered[cache_key]
+
+    def _result(self, query, result):
+        return {'id': query.get('id'), 'jsonrpc': '2.0', 'result': result}
+
+
+def _match(item, rule):
+    if 'and' in rule:
+        return all(_match(item, sub) for sub in rule['and'])
+    if 'or' in rule:
+        return any(_match(item, sub) for sub in rule['or'])
+    field = rule['field']
+    value = item.get('file', '') if field == 'path' else item.get(field, '')
+    operator = rule['operator']
+    if operator == 'contains':
+        return rule['value'] in value
+    if operator == 'greaterthan':
+        return value > rule['value']
+    if operator == 'lessthan':
+        return value < rule['value']
+    if operator == 'is':
+        return value == rule['value']
+    return True
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmark the copy methods of lib/fastcopy.py across file sizes.
+
+    python benchmarks/throughput.py
+    python benchmarks/throughput.py --sizes 64K,1M,16M --files 50 --root /mnt/nas/bench
+
+Every method copies the same files to the same directory:
+
+    xbmcvfs     xbmcvfs.copy, what the add-on used before
+    kernel      FileCopier on local paths, copy_file_range or sendfile
+    buffered    FileCopier on local paths without the kernel copy
+    vfs         FileCopier through xbmcvfs.File, used for smb:// and the like
+
+Outside Kodi xbmcvfs is the stand-in in benchmarks/fakekodi, its copy is
+shutil.copyfile, which uses sendfile on linux as well. Kodi's own copy
+goes through its VFS in small blocks like the vfs method. The files are
+read from the page cache after the first round, --root on a mounted share
+measures the network as well.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, 'fakekodi'))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import xbmcvfs
+from lib.fastcopy import FileCopier
+
+METHODS = ('xbmcvfs', 'kernel', 'buffered', 'vfs')
+UNITS = {'K': 1024, 'M': 1024 * 1024}
+
+
+def parse_size(size):
+    size = size.strip().upper()
+    if size[-1:] in UNITS:
+        return int(size[:-1]) * UNITS[size[-1]]
+    return int(size)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', default='16K,256K,4M,32M', help='file sizes, comma separated, K and M suffixes')
+    parser.add_argument('--files', type=int, default=20, help='files copied per size and method')
+    parser.add_argument('--rounds', type=int, default=3, help='the fastest round counts')
+    parser.add_argument('--root', help='working directory, a temporary one is removed afterwards')
+    return parser.parse_args(argv)
+
+
+def copier(method):
+    if method == 'xbmcvfs':
+        def copy(source, dest):
+            if not xbmcvfs.copy(source, dest):
+                raise IOError('copy failed')
+        return copy
+    files = FileCopier()
+    if method == 'buffered':
+        files._kernel = False
+    elif method == 'vfs':
+        return lambda source, dest: files._copy_vfs(source, dest, dest + '.tmp')
+    return files.copy
+
+
+def benchmark(args, root):
+    results = []
+    for size in [parse_size(size) for size in args.sizes.split(',')]:
+        sources = []
+        for index in range(args.files):
+            path = os.path.join(root, 'source-%d-%d.jpg' % (size, index))
+            with open(path, 'wb') as f:
+                f.write(os.urandom(size))
+            sources.append(path)
+        dests = os.path.join(root, 'artwork')
+        for method in METHODS:
+            copy = copier(method)
+            best = None
+            for _ in range(args.rounds):
+                shutil.rmtree(dests, ignore_errors=True)
+                os.makedirs(dests)
+                started = time.time()
+                for source in sources:
+                    copy(source, os.path.join(dests, os.path.basename(source)))
+                seconds = time.time() - started
+                best = seconds if best is None else min(best, seconds)
+            results.append((size, method, best))
+        for source in sources:
+            os.remove(source)
+    return results
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    root = args.root or tempfile.mkdtemp(prefix='artworkorganizer-copy-')
+    try:
+        results = benchmark(args, root)
+    finally:
+        if args.root:
+            shutil.rmtree(os.path.join(root, 'artwork'), ignore_errors=True)
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+    baseline = dict((size, seconds) for size, method, seconds in results if method == 'xbmcvfs')
+    for size, method, seconds in results:
+        print('%9d bytes  %-9s %8.4fs %10.1f MB/s %8.2fx' % (
+            size, method, seconds, size * args.files / seconds / 1e6 if seconds else 0,
+            baseline[size] / seconds if seconds else 0))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,8 +1,21 @@
-import os, shutil, re, unicodedata
+import os, sys, shutil, re, time, unicodedata, threading, uuid
 import xbmc, xbmcgui, xbmcaddon, xbmcvfs
-import json
 import lib.library as video_library
-from collections import namedtuple
+from lib.manifest import Manifest
+from lib.copier import CopyEngine
+from lib.texturecache import TextureCache
+from lib.store import ArtworkStore, read_file
+from lib.resize import HAS_PIL, Resizer, find_profile, parse_profiles
+from lib.journal import Journal, FailureLedger
+from lib.database import open_backend
+from lib.plan import Entry, Plan
+from lib.bundle import BundleWriter, is_bundle_file
+from lib.linker import Linker, unlink_shared
+from lib.scheduler import PlaybackScheduler
+from lib.metrics import Metrics
+from lib.fetcher import Fetcher, remote_url
+from lib.fastcopy import FileCopier, is_local
+from lib.destinations import Destination, SharedReads, load_destinations
 
 try:  # Kodi v19 or newer
     from xbmcvfs import translatePath
@@ -14,36 +27,161 @@ ADDONID = ADDON.getAddonInfo('id')
 ADDONNAME = ADDON.getAddonInfo('name')
 ADDONVERSION = ADDON.getAddonInfo('version')
 LANGUAGE = ADDON.getLocalizedString
+# set on the home window while the script or the service copies artwork
+RUNNING = '%s.running' % ADDONID
 
 def log(txt, level=xbmc.LOGDEBUG):
     message = '%s: %s' % (ADDONID, txt)
     xbmc.log(msg=message, level=level)
 
+# the owner of the lock set by this interpreter, and the check and set of threads in it
+LOCK_OWNER = uuid.uuid4().hex
+LOCK = threading.Lock()
+
+def acquire_lock():
+    # script runs and service syncs write the same folders and run files, only one runs at a time
+    window = xbmcgui.Window( 10000 )
+    with LOCK:
+        if window.getProperty( RUNNING ):
+            return False
+        window.setProperty( RUNNING, LOCK_OWNER )
+    # the script and the service run in interpreters of their own and may both have found the
+    # property unset, the one that set it last owns the lock
+    xbmc.sleep( 100 )
+    return window.getProperty( RUNNING ) == LOCK_OWNER
+
+def release_lock():
+    window = xbmcgui.Window( 10000 )
+    with LOCK:
+        if window.getProperty( RUNNING ) == LOCK_OWNER:
+            window.clearProperty( RUNNING )
+
 def clean_filename(filename):
     illegal_char = '^<>:"/\|?*'
     for char in illegal_char:
         filename = filename.replace( char , '' )
     return filename
 
+def format_size(size):
+    for unit in ( 'B', 'KB', 'MB', 'GB' ):
+        if size < 1024 or unit == 'GB':
+            break
+        size = size / 1024.0
+    return '%.1f %s' % ( size, unit ) if unit != 'B' else '%d B' % size
+
+# art types produced from each library query: (art type, label, json property, artwork)
+MOVIE_ARTTYPES = [ ( 'moviefanart', 32001, 'fanart', lambda item: item['fanart'] ),
+                   ( 'moviethumbs', 32005, 'thumbnail', lambda item: item['thumbnail'] ),
+                   ( 'movieposters', 32006, 'art', lambda item: item['art'].get('poster') ) ]
+TVSHOW_ARTTYPES = [ ( 'tvshowfanart', 32002, 'fanart', lambda item: item['fanart'] ),
+                    ( 'tvshowbanners', 32013, 'art', lambda item: item['art'].get('banner') ),
+                    ( 'tvshowposters', 32014, 'art', lambda item: item['art'].get('poster') ) ]
+SEASON_ARTTYPES = [ ( 'seasonthumbs', 32007, 'thumbnail', lambda item: item['thumbnail'] ) ]
+EPISODE_ARTTYPES = [ ( 'episodethumbs', 32008, 'thumbnail', lambda item: item['thumbnail'] ) ]
+MUSICVIDEO_ARTTYPES = [ ( 'musicvideofanart', 32003, 'fanart', lambda item: item['fanart'] ),
+                        ( 'musicvideothumbs', 32009, 'thumbnail', lambda item: item['thumbnail'] ) ]
+ARTIST_ARTTYPES = [ ( 'artistfanart', 32004, 'fanart', lambda item: item['fanart'] ),
+                    ( 'artistthumbs', 32010, 'thumbnail', lambda item: item['thumbnail'] ) ]
+ALBUM_ARTTYPES = [ ( 'albumthumbs', 32011, 'thumbnail', lambda item: item['thumbnail'] ) ]
+ALL_ARTTYPES = MOVIE_ARTTYPES + TVSHOW_ARTTYPES + SEASON_ARTTYPES + EPISODE_ARTTYPES + MUSICVIDEO_ARTTYPES + ARTIST_ARTTYPES + ALBUM_ARTTYPES
+
+# properties the artwork file names are built from
+MOVIE_PROPERTIES = [ "file", "title", "year" ]
+TVSHOW_PROPERTIES = [ "file", "title" ]
+SEASON_PROPERTIES = [ "showtitle" ]
+EPISODE_PROPERTIES = [ "file", "title", "season", "episode", "showtitle" ]
+MUSICVIDEO_PROPERTIES = [ "title", "artist" ]
+ARTIST_PROPERTIES = []
+ALBUM_PROPERTIES = [ "title", "artist" ]
+
+# details of a single library item by notification type: (method, result, id parameter)
+DETAILS = { 'movie': ( 'VideoLibrary.GetMovieDetails', 'moviedetails', 'movieid' ),
+            'tvshow': ( 'VideoLibrary.GetTVShowDetails', 'tvshowdetails', 'tvshowid' ),
+            'season': ( 'VideoLibrary.GetSeasonDetails', 'seasondetails', 'seasonid' ),
+            'episode': ( 'VideoLibrary.GetEpisodeDetails', 'episodedetails', 'episodeid' ),
+            'musicvideo': ( 'VideoLibrary.GetMusicVideoDetails', 'musicvideodetails', 'musicvideoid' ),
+            'artist': ( 'AudioLibrary.GetArtistDetails', 'artistdetails', 'artistid' ),
+            'album': ( 'AudioLibrary.GetAlbumDetails', 'albumdetails', 'albumid' ) }
+
 class Main:
-    def __init__ ( self ):
+    def __init__ ( self, updated=None, removed=None, is_canceled=None, retry=False, dry_run=False, plan=None ):
+        # the service passes the ids of the library items that changed since its
+        # last sync as { type: set( ids ) }, script runs process the whole library
+        # or, in retry mode, only the artwork that failed to copy before
+        # a dry run only saves the plan of what it would copy, plan is the path of a saved plan to copy
+        self.service = updated is not None
+        self.retry = retry
+        self.dry_run = dry_run
+        self.planfile = plan
+        self.updated = updated or {}
+        self.removed = removed or {}
+        self.is_canceled = is_canceled or xbmc.Monitor().abortRequested
         self._load_settings()
+        # the time of every phase, the library requests and the copies are saved after the run
+        self.metrics = Metrics( profiling=self.profile_run == 'true' )
+        video_library.rpc_listener = self.metrics.rpc_done
+        self.metrics.phase( 'setup' )
         self._init_variables()
+        self.metrics.phase( 'sources' )
         # make sure that "sources.xml" is already set
         if xbmcvfs.exists("special://masterprofile/sources.xml"):
             # only delete if it is safe!
             if not self._directory_in_sources():
-                self._delete_directories()
-                # get media sources if setting is defined
-                if  self.split_media_sources == "true" and (self.split_movies_sources == "true" or self.split_tvshows_sources == "true"):
-                    self._get_media_sources_and_content()
-                self._create_directories()
-                if self.directoriescreated == 'true':
-                    self._copy_artwork()
+                if self.service:
+                    self.metrics.phase( 'copy' )
+                    self._sync_items()
+                elif self.retry:
+                    self.metrics.phase( 'copy' )
+                    self._retry_failures()
+                elif self.planfile is not None:
+                    self.metrics.phase( 'copy' )
+                    self._copy_saved_plan()
+                else:
+                    # get media sources if any destination splits its artwork by source
+                    if self.match_movies_sources or self.match_tvshows_sources:
+                        self._get_media_sources_and_content()
+                    # every item is resolved to its artwork files before anything is deleted or copied
+                    self.metrics.phase( 'planning' )
+                    plan = self._plan_artwork()
+                    if plan is None:
+                        pass
+                    elif self.dry_run:
+                        self.metrics.phase( 'report' )
+                        self._report_plan( plan )
+                    else:
+                        # incremental runs keep the previous artwork and only update what changed,
+                        # an interrupted run is resumed instead of starting over
+                        if self.incremental != 'true' and not self.journal.resumed:
+                            self.metrics.phase( 'delete' )
+                            self._delete_directories()
+                        self.metrics.phase( 'directories' )
+                        self._create_directories()
+                        if self.directoriescreated == 'true':
+                            self.metrics.phase( 'copy' )
+                            self._copy_artwork( plan )
             else:
                 log("WARNING! The specified destination directory is defined as a media source. Please choose a different path!", level=xbmc.LOGINFO)
         else:
             log("You MUST set your media sources BEFORE running this addon.", level=xbmc.LOGINFO)
+        if self.bundles is not None:
+            # the indexes are written once the manifest no longer prunes artwork
+            self.metrics.phase( 'bundles' )
+            self.bundles.close()
+        self._save_metrics()
+
+    def _save_metrics( self ):
+        self.metrics.finish()
+        video_library.rpc_listener = None
+        log( 'run phases: %s' % ', '.join( '%s %.1fs' % ( name, seconds ) for name, seconds in self.metrics.phases ) )
+        # frequent service syncs don't replace the metrics of the last full run
+        profile = translatePath( ADDON.getAddonInfo('profile') )
+        path = os.path.join( profile, 'metrics-service.json' if self.service else 'metrics.json' )
+        try:
+            self.metrics.save( path )
+            if self.metrics.save_profile( os.path.join( profile, 'profile.prof' ) ):
+                log( 'profiler stats saved to %s' % os.path.join( profile, 'profile.prof' ), level=xbmc.LOGINFO )
+        except ( IOError, OSError ) as e:
+            log( 'failed to save metrics %s: %s' % ( path, e ) )
 
     def _load_settings( self ):
         self.moviefanart = ADDON.getSetting( "moviefanart" )
@@ -75,6 +213,44 @@ class Main:
             self.split_tvshows_sources = "false"
         # Option to normalize names. Useful when using nfs file systems (accented names not supported!)
         self.normalize_names = ADDON.getSetting( "normalize_names" )
+        # Option to only copy new or changed artwork instead of recreating all directories
+        self.incremental = ADDON.getSetting( "incremental" )
+        if self.service:
+            # the service never recreates the directories, artwork is deleted through the manifest
+            self.incremental = 'true'
+        # Option to only query the items added since the last run, every few days the whole library is queried again
+        self.delta_queries = ADDON.getSetting( "delta_queries" )
+        self.full_reconcile_days = int( ADDON.getSetting( "full_reconcile_days" ) or 7 )
+        # Option to copy artwork from Kodi's texture cache when it has been cached before
+        self.use_texture_cache = ADDON.getSetting( "texture_cache" )
+        # Option to store each unique image once and link the named artwork files to it
+        self.dedupe_artwork = ADDON.getSetting( "dedupe_artwork" )
+        # Option to write each art type folder as a single tar bundle, far fewer files on network shares
+        self.bundle_artwork = ADDON.getSetting( "bundle_artwork" )
+        # Option to link local artwork into the artwork directory instead of copying it:
+        # off (0), hard link or clone (1), hard link, clone or symbolic link (2)
+        self.link_artwork = ADDON.getSetting( "link_artwork" )
+        # Option to scale artwork down to the sizes set in the output profiles
+        self.resize_artwork = ADDON.getSetting( "resize_artwork" )
+        self.resize_profiles = ADDON.getSetting( "resize_profiles" )
+        # Number of library items retrieved per query, bounds the memory used for large libraries
+        self.page_size = int( ADDON.getSetting( "page_size" ) or video_library.PAGE_SIZE )
+        # Read the library from Kodi's local databases (0) or always through JSON-RPC (1)
+        self.library_backend = ADDON.getSetting( "library_backend" )
+        # Option to run under cProfile and save its stats next to the run metrics
+        self.profile_run = ADDON.getSetting( "profile_run" )
+        # Copying while something plays: at full speed (0), paused (1) or within a budget of files and bytes per second (2)
+        self.playback_mode = int( ADDON.getSetting( "playback_mode" ) or 0 )
+        self.playback_bytes = int( ADDON.getSetting( "playback_bytes" ) or 0 ) * 1024
+        self.playback_files = int( ADDON.getSetting( "playback_files" ) or 0 )
+        self.playback_idle = int( ADDON.getSetting( "playback_idle" ) or 0 )
+        # Number of concurrent copies per destination type
+        self.copy_threads = { 'local': int( ADDON.getSetting( "copy_threads_local" ) or 2 ),
+                              'smb': int( ADDON.getSetting( "copy_threads_smb" ) or 4 ),
+                              'nfs': int( ADDON.getSetting( "copy_threads_nfs" ) or 4 ) }
+        # Option to download remote artwork over pooled connections, skipping images the server reports unchanged
+        self.fetch_remote = ADDON.getSetting( "fetch_remote" )
+        self.fetch_connections = int( ADDON.getSetting( "fetch_connections" ) or 4 )
 
     def _init_variables( self ):
         self.moviefanartdir = 'MovieFanart'
@@ -91,7 +267,21 @@ class Main:
         self.artistthumbsdir = 'ArtistThumbs'
         self.albumthumbsdir = 'AlbumThumbs'
         self.directoriescreated = 'true'
-        self.dialog = xbmcgui.DialogProgress()
+        if self.service:
+            # the service syncs in the background
+            self.dialog = None
+        else:
+            self.dialog = xbmcgui.DialogProgress()
+        # local sqlite databases are read directly, shared mysql databases through JSON-RPC
+        self.backend = None
+        if self.library_backend != '1':
+            self.backend = open_backend()
+        if self.backend is None:
+            self.backend = video_library.JSONRPC
+        log( 'reading the library through %s' % self.backend.name )
+        self.library = video_library.get_snapshot()
+        self.library.page_size = self.page_size
+        self.library.backend = self.backend
         if self.directory == '':
             self.directory = translatePath(xbmcaddon.Addon().getAddonInfo('profile'))
         if self.path != '':
@@ -137,14 +327,107 @@ class Main:
         if self.albumthumbs == 'true':
             self.albumthumbspath = os.path.join( self.directory, self.albumthumbsdir )
             self.artworklist.append( self.albumthumbspath )
+        # output profiles of the art types that are resized
+        self.profiles = {}
+        if self.resize_artwork == 'true':
+            if not HAS_PIL:
+                log( 'resizing artwork needs the PIL module, copying the original artwork' )
+            else:
+                try:
+                    profiles = parse_profiles( self.resize_profiles )
+                except ValueError as e:
+                    log( e )
+                    profiles = {}
+                for arttype in ALL_ARTTYPES:
+                    profile = find_profile( profiles, arttype[0] )
+                    if profile is not None:
+                        self.profiles[arttype[0]] = profile
+        # the artwork directory and the further destinations in destinations.json, each with its own art types and layout
+        folders = dict( ( arttype[0], getattr( self, arttype[0] + 'dir' ) ) for arttype in ALL_ARTTYPES )
+        defaults = { 'arttypes': [ arttype[0] for arttype in ALL_ARTTYPES if getattr( self, arttype[0] ) == 'true' ],
+                     'split_movies_sources': self.split_movies_sources, 'split_tvshows_sources': self.split_tvshows_sources,
+                     'normalize_names': self.normalize_names }
+        self.destinations = [ Destination.from_options( { 'directory': self.directory }, defaults, folders, self._split_arttypes ) ]
+        for options in load_destinations( os.path.join( translatePath( ADDON.getAddonInfo('profile') ), 'destinations.json' ) ):
+            if self.path != '':
+                # the artwork of a custom folder goes to a folder of the same name in every destination
+                options = dict( options, directory=os.path.join( options['directory'], os.path.split( os.path.dirname( self.path ) )[1] ) )
+            destination = Destination.from_options( options, defaults, folders, self._split_arttypes )
+            if any( destination.overlaps( other ) for other in self.destinations ):
+                log( 'WARNING! destination %s overlaps with another destination, skipped' % destination.directory, level=xbmc.LOGINFO )
+                continue
+            # only the artwork directory stops the run, other destinations are skipped before anything depends on them
+            if self._in_sources( destination.directory, nested=True ):
+                log( 'WARNING! The destination %s is defined as a media source or lies within one, skipped' % destination.directory, level=xbmc.LOGINFO )
+                continue
+            self.destinations.append( destination )
+        if len( self.destinations ) > 1:
+            log( 'copying to %s destinations: %s' % ( len( self.destinations ), ', '.join( destination.directory for destination in self.destinations ) ) )
+        # media sources are matched when any destination splits its artwork by source
+        self.match_movies_sources = any( destination.split.intersection( self._split_arttypes( True, False ) ) for destination in self.destinations )
+        self.match_tvshows_sources = any( destination.split.intersection( self._split_arttypes( False, True ) ) for destination in self.destinations )
+        # a file name is only normalized when a destination asks for it
+        self.normalize_any = any( destination.normalize_names for destination in self.destinations )
+        self.completed = []
+        # art types whose items were queried with a date filter this run
+        self.deltaquery = []
+        self.started = time.time()
+        # directories are created up front by script runs, on demand by the service, saved plans and further destinations
+        if self.service or self.planfile is not None or len( self.destinations ) > 1:
+            self.createddirs = set()
+        else:
+            self.createddirs = None
+        # art type folders are streamed into tar bundles instead of separate files
+        self.bundles = None
+        if self.bundle_artwork == 'true':
+            self.bundles = BundleWriter( self.directory )
+        profile = translatePath( ADDON.getAddonInfo('profile') )
+        if not xbmcvfs.exists( profile ):
+            xbmcvfs.mkdirs( profile )
+        if self.incremental == 'true':
+            self.manifest = Manifest( os.path.join( profile, 'manifest.json' ), self.directory, self._remove_artwork,
+                                      [ destination.describe() for destination in self.destinations[1:] ] )
+        # artwork that failed to copy is kept with the reason until a later run copies it
+        self.ledger = FailureLedger( os.path.join( profile, 'failures.json' ) )
+        # script runs keep a journal of the copied artwork to resume from when they are interrupted
+        self.journal = None
+        if not ( self.service or self.retry or self.dry_run or self.planfile is not None ):
+            self.journal = Journal( os.path.join( profile, 'journal.jsonl' ), self.directory )
+            if self.journal.resumed:
+                log( 'resuming interrupted run, artwork copied: %s, art types completed: %s' % ( len( self.journal.copied ), ', '.join( sorted( self.journal.completed ) ) ), level=xbmc.LOGINFO )
+                if self.incremental == 'true':
+                    # the interrupted run may not have saved its manifest
+                    for dest, entry in self.journal.copied.items():
+                        if 'size' in entry:
+                            self.manifest.record( dest, entry['type'], entry['source'], entry['size'], entry['mtime'], entry['item'], entry['profile'] )
+
+    def _split_arttypes( self, movies, tvshows ):
+        # the art types split into a folder per media source
+        arttypes = []
+        if movies:
+            arttypes.extend( arttype[0] for arttype in MOVIE_ARTTYPES )
+        if tvshows:
+            arttypes.extend( arttype[0] for arttype in TVSHOW_ARTTYPES + SEASON_ARTTYPES + EPISODE_ARTTYPES )
+        return arttypes
 
     def _directory_in_sources( self ):
-        all_sources = video_library.get_all_sources()
+        return self._in_sources( self.directory )
+
+    def _in_sources( self, directory, nested=False ):
+        # a media source in directory, with nested also directory inside a media source
+        directory = video_library._normalize_path( directory )
+        all_sources = self.library.all_sources
         for source in [s.path for s in all_sources]:
-            if video_library._normalize_path(self.directory) in source:
+            if directory in source:
+                return True
+            if nested and ( directory + '/' ).startswith( source + '/' ):
                 return True
         return False
 
+    def _primary( self, dest ):
+        # only the artwork directory is bundled and deduplicated, other destinations hold separate files
+        return len( self.destinations ) == 1 or self.destinations[0].contains( dest )
+
     def _delete_directories( self ):
         if xbmcvfs.exists( self.directory ):
             dirs, files = xbmcvfs.listdir( self.directory )
@@ -153,19 +436,45 @@ class Main:
                     shutil.rmtree( os.path.join(self.directory, item) )
                 except:
                     pass
+            # bundles of the art type folders
+            names = [ os.path.basename( path ) for path in self.artworklist ]
+            for item in files:
+                if is_bundle_file( item, names ):
+                    xbmcvfs.delete( os.path.join( self.directory, item ) )
+        for destination in self.destinations[1:]:
+            # other destinations may hold more than artwork, only their art type folders are removed
+            for path in destination.folders.values():
+                if xbmcvfs.exists( path ):
+                    xbmcvfs.rmdir( path, force=True )
 
     def _get_media_sources_and_content ( self ):
-        # retrieve both movies and tvshows sources
-        if self.split_movies_sources == "true" and self.split_tvshows_sources == "true":
-            self.movies_sources, self.tvshows_sources, self.movies_content, self.tvshows_content = video_library._identify_source_content()
-        # retrieve movies sources
-        elif self.split_movies_sources == "true":
-            self.movies_sources = video_library.get_movie_sources()
-            self.movies_content = video_library.get_movie_content()
-        # retrieve tvshows sources
-        elif self.split_tvshows_sources == "true":
-            self.tvshows_sources = video_library.get_tv_sources()
-            self.tvshows_content = video_library.get_tv_content()
+        # sources and content are identified once per run and shared by both media types
+        # items refer to their source by index, the directory names are built once
+        if self.match_movies_sources:
+            self.movies_sources = self.library.movie_sources
+            self.movies_content = self.library.movie_content
+        if self.match_tvshows_sources:
+            self.tvshows_sources = self.library.tv_sources
+            self.tvshows_content = self.library.tv_content
+            self.tvshows_index = self.library.tv_index
+        self._get_source_dirs()
+
+    def _get_source_lookup( self ):
+        # the service only needs the sources of a few items, they are looked up per
+        # item instead of identifying the content of every source first
+        lookup = self.library.video_lookup
+        if self.match_movies_sources:
+            self.movies_content = lookup
+        if self.match_tvshows_sources:
+            self.tvshows_content = lookup
+            self.tvshows_index = lookup
+        self._get_source_dirs()
+
+    def _get_source_dirs( self ):
+        self.source_dirs = list( self.library.source_names.names )
+        self.normalized_source_dirs = self.source_dirs
+        if self.normalize_any:
+            self.normalized_source_dirs = [ video_library._normalize_string( name ) for name in self.source_dirs ]
 
     def _create_directories( self ):
         if not xbmcvfs.exists( self.directory ):
@@ -174,6 +483,9 @@ class Main:
             except:
                 self.directoriescreated = 'false'
                 log( 'failed to create artwork directory' )
+        if self.bundles is not None:
+            # bundles are written to the artwork directory itself
+            return
         if self.directoriescreated == 'true':
             for path in self.artworklist:
                 try:
@@ -217,495 +529,772 @@ class Main:
                         self.directoriescreated = 'false'
                         log( 'failed to create directories for tvshows content type' )
 
-    def _copy_artwork( self ):
+    def _plan_artwork( self ):
+        # the plan of the whole library, None when the run was cancelled
         self.dialog.create( ADDONNAME )
         self.dialog.update(0)
-        if not self.dialog.iscanceled():
-            if self.moviefanart == 'true':
-                self._copy_moviefanart()
-        if not self.dialog.iscanceled():
-            if self.tvshowfanart == 'true':
-                self._copy_tvshowfanart()
-        if not self.dialog.iscanceled():
-            if self.musicvideofanart == 'true':
-                self._copy_musicvideofanart()
-        if not self.dialog.iscanceled():
-            if (self.artistfanart == 'true') and (self.path == ''):
-                self._copy_artistfanart()
-        if not self.dialog.iscanceled():
-            if self.moviethumbs == 'true':
-                self._copy_moviethumbs()
-        if not self.dialog.iscanceled():
-            if self.movieposters == 'true':
-                self._copy_movieposters()
-        if not self.dialog.iscanceled():
-            if self.tvshowbanners == 'true':
-                self._copy_tvshowbanners()
-        if not self.dialog.iscanceled():
-            if self.tvshowposters == 'true':
-                self._copy_tvshowposters()
-        if not self.dialog.iscanceled():
-            if self.seasonthumbs == 'true':
-                self._copy_seasonthumbs()
-        if not self.dialog.iscanceled():
-            if self.episodethumbs == 'true':
-                self._copy_episodethumbs()
-        if not self.dialog.iscanceled():
-            if self.musicvideothumbs == 'true':
-                self._copy_musicvideothumbs()
-        if not self.dialog.iscanceled():
-            if (self.artistthumbs == 'true') and (self.path == ''):
-                self._copy_artistthumbs()
-        if not self.dialog.iscanceled():
-            if (self.albumthumbs == 'true') and (self.path == ''):
-                self._copy_albumthumbs()
+        plan = Plan( self.directory )
+        if self.dry_run:
+            # the dry run estimates the bytes it would copy from the artwork it would copy from
+            self.texture_cache = None
+            if self.use_texture_cache == 'true':
+                self.texture_cache = TextureCache()
+        if not self._is_canceled():
+            self._plan_movieartwork( plan )
+        if not self._is_canceled():
+            self._plan_tvshowartwork( plan )
+        if not self._is_canceled():
+            self._plan_episodeartwork( plan )
+        if not self._is_canceled():
+            self._plan_musicvideoartwork( plan )
+        if not self._is_canceled():
+            if self.path == '':
+                self._plan_artistartwork( plan )
+        if not self._is_canceled():
+            if self.path == '':
+                self._plan_albumartwork( plan )
+        # the library isn't queried again this run
+        self.backend.close()
+        if self.dry_run and self.texture_cache is not None:
+            self.texture_cache.close()
+        canceled = self._is_canceled()
         self.dialog.close()
+        if canceled:
+            log('script cancelled')
+            return None
+        log( 'artwork planned: %s' % len( plan ) )
+        self._log_collisions( plan )
+        return plan
 
-    def _copy_moviefanart( self ):
-        count = 0
-        processeditems = 0
-        json_query = xbmc.executeJSONRPC('{"jsonrpc": "2.0", "method": "VideoLibrary.GetMovies", "params": {"properties": ["file", "title", "fanart", "year"], "filter": {"field": "path", "operator": "contains", "value": "%s"}}, "id": 1}' % self.path)
-        json_response = json.loads(json_query)
-        if json_response.__contains__('result') and (json_response['result'] != None) and (json_response['result'].__contains__('movies')):
-            totalitems = len( json_response['result']['movies'] )
-            for item in json_response['result']['movies']:
-                if self.dialog.iscanceled():
-                    log('script cancelled')
-                    return
-                processeditems = processeditems + 1
-                self.dialog.update( int( float( processeditems ) / float( totalitems ) * 100), LANGUAGE(32001) + ': ' + str( count + 1 ) )
-                name = item['title']
-                year = str(item['year'])
-                artwork = item['fanart']
-                tmp_filename = name + ' (' + year + ')' + '.jpg'
-                filename = clean_filename( tmp_filename )
-                if self.normalize_names == "true":
-                    filename = video_library._normalize_string(filename)
-                # test file path with movie_content to find source name
-                moviefanartpath = self.moviefanartpath
-                if self.split_movies_sources == "true" and video_library._normalize_path(item['file']) in self.movies_content:
-                    media_source = self.movies_content[video_library._normalize_path(item['file'])]
-                    if self.normalize_names == "true":
-                        media_source = video_library._normalize_string(media_source)
-                    moviefanartpath = os.path.join( self.moviefanartpath, media_source )
-                if artwork != '':
-                    try:
-                        xbmcvfs.copy( translatePath( artwork ), os.path.join( moviefanartpath, filename ) )
-                        count += 1
-                    except:
-                        log( 'failed to copy moviefanart' )
-        log( 'moviefanart copied: %s' % count )
-
-    def _copy_tvshowfanart( self ):
-        count = 0
-        processeditems = 0
-        json_query = xbmc.executeJSONRPC('{"jsonrpc": "2.0", "method": "VideoLibrary.GetTVShows", "params": {"properties": ["file", "title", "fanart"], "filter": {"field": "path", "operator": "contains", "value": "%s"}}, "id": 1}' % self.path)
-        json_response = json.loads(json_query)
-        if json_response.__contains__('result') and (json_response['result'] != None) and (json_response['result'].__contains__('tvshows')):
-            totalitems = len( json_response['result']['tvshows'] )
-            for item in json_response['result']['tvshows']:
-                if self.dialog.iscanceled():
-                    log('script cancelled')
-                    return
-                processeditems = processeditems + 1
-                self.dialog.update( int( float( processeditems ) / float( totalitems ) * 100), LANGUAGE(32002) + ': ' + str( count + 1 ) )
-                name = item['title']
-                artwork = item['fanart']
-                tmp_filename = name + '.jpg'
-                filename = clean_filename( tmp_filename )
-                if self.normalize_names == "true":
-                    filename = video_library._normalize_string(filename)
-                # test file path with tv_content to find source name
-                tvshowfanartpath = self.tvshowfanartpath
-                if self.split_tvshows_sources == "true":
-                    for tv_file_path, source_name in self.tvshows_content.items():
-                        if tv_file_path.startswith(video_library._normalize_path(item['file'])):
-                            if self.normalize_names == "true":
-                                source_name = video_library._normalize_string(source_name)
-                            tvshowfanartpath = os.path.join( self.tvshowfanartpath, source_name )
-                            break
-                if artwork != '':
-                    try:
-                        xbmcvfs.copy( translatePath( artwork ), os.path.join( tvshowfanartpath, filename ) )
-                        count += 1
-                    except:
-                        log( 'failed to copy tvshowfanart' )
-        log( 'tvshowfanart copied: %s' % count )
-
-    def _copy_musicvideofanart( self ):
-        count = 0
-        processeditems = 0
-        json_query = xbmc.executeJSONRPC('{"jsonrpc": "2.0", "method": "VideoLibrary.GetMusicVideos", "params": {"properties": ["title", "fanart", "artist"], "filter": {"field": "path", "operator": "contains", "value": "%s"}}, "id": 1}' % self.path)
-        json_response = json.loads(json_query)
-        if json_response.__contains__('result') and (json_response['result'] != None) and (json_response['result'].__contains__('musicvideos')):
-            totalitems = len( json_response['result']['musicvideos'] )
-            for item in json_response['result']['musicvideos']:
-                if self.dialog.iscanceled():
-                    log('script cancelled')
-                    return
-                processeditems = processeditems + 1
-                self.dialog.update( int( float( processeditems ) / float( totalitems ) * 100), LANGUAGE(32003) + ': ' + str( count + 1 ) )
-                name = item['title']
-                artwork = item['fanart']
-                if item['artist']: # bug workaround, musicvideos can end up in the database without an artistname
-                    artist = item['artist'][0]
-                    tmp_filename = artist + ' - ' + name + '.jpg'
-                else:
-                    tmp_filename = name + '.jpg'
-                filename = clean_filename( tmp_filename )
-                if self.normalize_names == "true":
-                    filename = video_library._normalize_string(filename)
-                if artwork != '':
-                    try:
-                        xbmcvfs.copy( translatePath( artwork ), os.path.join( self.musicvideofanartpath, filename ) )
-                        count += 1
-                    except:
-                        log( 'failed to copy musicvideofanart' )
-        log( 'musicvideofanart copied: %s' % count )
-
-    def _copy_artistfanart( self ):
-        count = 0
-        processeditems = 0
-        json_query = xbmc.executeJSONRPC('{"jsonrpc": "2.0", "method": "AudioLibrary.GetArtists", "params": {"properties": ["fanart"]}, "id": 1}')
-        json_response = json.loads(json_query)
-        if json_response.__contains__('result') and (json_response['result'] != None) and (json_response['result'].__contains__('artists')):
-            totalitems = len( json_response['result']['artists'] )
-            for item in json_response['result']['artists']:
-                if self.dialog.iscanceled():
-                    log('script cancelled')
-                    return
-                processeditems = processeditems + 1
-                self.dialog.update( int( float( processeditems ) / float( totalitems ) * 100), LANGUAGE(32004) + ': ' + str( count + 1 ) )
-                name = item['label']
-                artwork = item['fanart']
-                tmp_filename = name + '.jpg'
-                filename = clean_filename( tmp_filename )
-                if self.normalize_names == "true":
-                    filename = video_library._normalize_string(filename)
-                if artwork != '':
-                    try:
-                        xbmcvfs.copy( translatePath( artwork ), os.path.join( self.artistfanartpath, filename ) )
-                        count += 1
-                    except:
-                        log( 'failed to copy artistfanart' )
-        log( 'artistfanart copied: %s' % count )
-
-    def _copy_moviethumbs( self ):
-        count = 0
-        processeditems = 0
-        json_query = xbmc.executeJSONRPC('{"jsonrpc": "2.0", "method": "VideoLibrary.GetMovies", "params": {"properties": ["file", "title", "thumbnail", "year"], "filter": {"field": "path", "operator": "contains", "value": "%s"}}, "id": 1}' % self.path)
-        json_response = json.loads(json_query)
-        if json_response.__contains__('result') and (json_response['result'] != None) and (json_response['result'].__contains__('movies')):
-            totalitems = len( json_response['result']['movies'] )
-            for item in json_response['result']['movies']:
-                if self.dialog.iscanceled():
-                    log('script cancelled')
-                    return
-                processeditems = processeditems + 1
-                self.dialog.update( int( float( processeditems ) / float( totalitems ) * 100), LANGUAGE(32005) + ': ' + str( count + 1 ) )
-                name = item['title']
-                year = str(item['year'])
-                artwork = item['thumbnail']
-                tmp_filename = name + ' (' + year + ')' + '.jpg'
-                filename = clean_filename( tmp_filename )
-                if self.normalize_names == "true":
-                    filename = video_library._normalize_string(filename)
-                # test file path with movie_content to find source name
-                moviethumbspath = self.moviethumbspath
-                if self.split_movies_sources == "true" and video_library._normalize_path(item['file']) in self.movies_content:
-                    media_source = self.movies_content[video_library._normalize_path(item['file'])]
-                    if self.normalize_names == "true":
-                        media_source = video_library._normalize_string(media_source)
-                    moviethumbspath = os.path.join( self.moviethumbspath, media_source )
-                if artwork != '':
-                    try:
-                        xbmcvfs.copy( translatePath( artwork ), os.path.join( moviethumbspath, filename ) )
-                        count += 1
-                    except:
-                        log( 'failed to copy moviethumb' )
-        log( 'moviethumbs copied: %s' % count )
-
-    def _copy_movieposters( self ):
-        count = 0
-        processeditems = 0
-        json_query = xbmc.executeJSONRPC('{"jsonrpc": "2.0", "method": "VideoLibrary.GetMovies", "params": {"properties": ["file", "title", "art", "year"], "filter": {"field": "path", "operator": "contains", "value": "%s"}}, "id": 1}' % self.path)
-        json_response = json.loads(json_query)
-        if json_response.__contains__('result') and (json_response['result'] != None) and (json_response['result'].__contains__('movies')):
-            totalitems = len( json_response['result']['movies'] )
-            for item in json_response['result']['movies']:
-                if self.dialog.iscanceled():
-                    log('script cancelled')
-                    return
-                processeditems = processeditems + 1
-                self.dialog.update( int( float( processeditems ) / float( totalitems ) * 100), LANGUAGE(32006) + ': ' + str( count + 1 ) )
-                name = item['title']
-                year = str(item['year'])
-                artwork = item['art'].get('poster')
-                tmp_filename = name + ' (' + year + ')' + '.jpg'
-                filename = clean_filename( tmp_filename )
-                if self.normalize_names == "true":
-                    filename = video_library._normalize_string(filename)
-                # test file path with movie_content to find source name
-                movieposterspath = self.movieposterspath
-                if self.split_movies_sources == "true" and video_library._normalize_path(item['file']) in self.movies_content:
-                    media_source = self.movies_content[video_library._normalize_path(item['file'])]
-                    if self.normalize_names == "true":
-                        media_source = video_library._normalize_string(media_source)
-                    movieposterspath = os.path.join( self.movieposterspath, media_source )
-                if artwork != '':
-                    try:
-                        xbmcvfs.copy( translatePath( artwork ), os.path.join( movieposterspath, filename ) )
-                        count += 1
-                    except:
-                        log( 'failed to copy movieposter' )
-        log( 'movieposters copied: %s' % count )
-
-    def _copy_tvshowbanners( self ):
-        count = 0
-        processeditems = 0
-        json_query = xbmc.executeJSONRPC('{"jsonrpc": "2.0", "method": "VideoLibrary.GetTVShows", "params": {"properties": ["file", "title", "art"], "filter": {"field": "path", "operator": "contains", "value": "%s"}}, "id": 1}' % self.path)
-        json_response = json.loads(json_query)
-        if json_response.__contains__('result') and (json_response['result'] != None) and (json_response['result'].__contains__('tvshows')):
-            totalitems = len( json_response['result']['tvshows'] )
-            for item in json_response['result']['tvshows']:
-                if self.dialog.iscanceled():
-                    log('script cancelled')
-                    return
-                processeditems = processeditems + 1
-                self.dialog.update( int( float( processeditems ) / float( totalitems ) * 100), LANGUAGE(32013) + ': ' + str( count + 1 ) )
-                name = item['title']
-                artwork = item['art'].get('banner')
-                tmp_filename = name + '.jpg'
-                filename = clean_filename( tmp_filename )
-                if self.normalize_names == "true":
-                    filename = video_library._normalize_string(filename)
-                # test tvshow path in tv_content to find source name
-                tvshowbannerspath = self.tvshowbannerspath
-                if self.split_tvshows_sources == "true":
-                    for tv_file_path, source_name in self.tvshows_content.items():
-                        if tv_file_path.startswith(video_library._normalize_path(item['file'])):
-                            if self.normalize_names == "true":
-                                source_name = video_library._normalize_string(source_name)
-                            tvshowbannerspath = os.path.join( self.tvshowbannerspath, source_name )
-                            break
-                if artwork != '':
-                    try:
-                        xbmcvfs.copy( translatePath( artwork ), os.path.join( tvshowbannerspath, filename ) )
-                        count += 1
-                    except:
-                        log( 'failed to copy tvshowbanner' )
-        log( 'tvshowbanners copied: %s' % count )
-
-    def _copy_tvshowposters( self ):
-        count = 0
-        processeditems = 0
-        json_query = xbmc.executeJSONRPC('{"jsonrpc": "2.0", "method": "VideoLibrary.GetTVShows", "params": {"properties": ["file", "title", "art"], "filter": {"field": "path", "operator": "contains", "value": "%s"}}, "id": 1}' % self.path)
-        json_response = json.loads(json_query)
-        if json_response.__contains__('result') and (json_response['result'] != None) and (json_response['result'].__contains__('tvshows')):
-            totalitems = len( json_response['result']['tvshows'] )
-            for item in json_response['result']['tvshows']:
-                if self.dialog.iscanceled():
-                    log('script cancelled')
-                    return
-                processeditems = processeditems + 1
-                self.dialog.update( int( float( processeditems ) / float( totalitems ) * 100), LANGUAGE(32014) + ': ' + str( count + 1 ) )
-                name = item['title']
-                artwork = item['art'].get('poster')
-                tmp_filename = name + '.jpg'
-                filename = clean_filename( tmp_filename )
-                if self.normalize_names == "true":
-                    filename = video_library._normalize_string(filename)
-                # test file path with tv_content to find source name
-                tvshowposterspath = self.tvshowposterspath
-                if self.split_tvshows_sources == "true":
-                    for tv_file_path, source_name in self.tvshows_content.items():
-                        if tv_file_path.startswith(video_library._normalize_path(item['file'])):
-                            if self.normalize_names == "true":
-                                source_name = video_library._normalize_string(source_name)
-                            tvshowposterspath = os.path.join( self.tvshowposterspath, source_name )
-                            break
-                if artwork != '':
-                    try:
-                        xbmcvfs.copy( translatePath( artwork ), os.path.join( tvshowposterspath, filename ) )
-                        count += 1
-                    except:
-                        log( 'failed to copy tvshowposter' )
-        log( 'tvshowposters copied: %s' % count )
-
-    def _copy_seasonthumbs( self ):
-        _TVShow_ = namedtuple('TVShow', ['id', 'path'])
-        count = 0
-        tvshows = []
-        json_query = xbmc.executeJSONRPC('{"jsonrpc": "2.0", "method": "VideoLibrary.GetTVShows", "params": {"properties": ["file"], "filter": {"field": "path", "operator": "contains", "value": "%s"}}, "id": 1}' % self.path)
-        json_response = json.loads(json_query)
-        if json_response.__contains__('result') and (json_response['result'] != None) and (json_response['result'].__contains__('tvshows')):
-            for item in json_response['result']['tvshows']:
-                if self.dialog.iscanceled():
-                    log('script cancelled')
-                    return
-                tvshow = _TVShow_(int(item['tvshowid']), item['file'])
-                tvshows.append(tvshow)
-            for tvshow in tvshows:
-                processeditems = 0
-                json_query = xbmc.executeJSONRPC('{"jsonrpc": "2.0", "method": "VideoLibrary.GetSeasons", "params": {"properties": ["thumbnail", "showtitle"], "tvshowid":%s}, "id": 1}' % tvshow.id )
-                json_response = json.loads(json_query)
-                if json_response.__contains__('result') and (json_response['result'] != None) and (json_response['result'].__contains__('seasons')):
-                    totalitems = len( json_response['result']['seasons'] )
-                    for item in json_response['result']['seasons']:
-                        if self.dialog.iscanceled():
-                            log('script cancelled')
-                            return
-                        processeditems = processeditems + 1
-                        self.dialog.update( int( float( processeditems ) / float( totalitems ) * 100), LANGUAGE(32007) + ': ' + str( count + 1 ) )
-                        name = item['label']
-                        tvshow_title = item['showtitle']
-                        artwork = item['thumbnail']
-                        tmp_filename = tvshow_title + ' - ' + name + '.jpg'
-                        filename = clean_filename( tmp_filename )
-                        if self.normalize_names == "true":
-                            filename = video_library._normalize_string(filename)
-                        # test file path with tv_content to find source name
-                        seasonthumbspath = self.seasonthumbspath
-                        if self.split_tvshows_sources == "true":
-                            for tv_file_path, source_name in self.tvshows_content.items():
-                                if tv_file_path.startswith(video_library._normalize_path(tvshow.path)):
-                                    if self.normalize_names == "true":
-                                        source_name = video_library._normalize_string(source_name)
-                                    seasonthumbspath = os.path.join( self.seasonthumbspath, source_name )
-                                    break
-                        if artwork != '':
-                            try:
-                                xbmcvfs.copy( translatePath( artwork ), os.path.join( seasonthumbspath, filename ) )
-                                count += 1
-                            except:
-                                log( 'failed to copy seasonthumb' )
-        log( 'seasonthumbs copied: %s' % count )
-
-    def _copy_episodethumbs( self ):
-        count = 0
-        processeditems = 0
-        json_query = xbmc.executeJSONRPC('{"jsonrpc": "2.0", "method": "VideoLibrary.GetEpisodes", "params": {"properties": ["file", "title", "thumbnail", "season", "episode", "showtitle"], "filter": {"field": "path", "operator": "contains", "value": "%s"}}, "id": 1}' % self.path)
-        json_response = json.loads(json_query)
-        if json_response.__contains__('result') and (json_response['result'] != None) and (json_response['result'].__contains__('episodes')):
-            totalitems = len( json_response['result']['episodes'] )
-            for item in json_response['result']['episodes']:
-                if self.dialog.iscanceled():
-                    log('script cancelled')
-                    return
-                processeditems = processeditems + 1
-                self.dialog.update( int( float( processeditems ) / float( totalitems ) * 100), LANGUAGE(32008) + ': ' + str( count + 1 ) )
-                name = item['title']
-                tvshow = item['showtitle']
-                artwork = item['thumbnail']
-                season = item['season']
-                episode = item['episode']
-                episodenumber = "s%.2d%.2d" % (int( season ), int( episode ))
-                tmp_filename = tvshow + ' - ' + episodenumber + ' - ' + name + '.jpg'
-                filename = clean_filename( tmp_filename )
-                if self.normalize_names == "true":
-                    filename = video_library._normalize_string(filename)
-                # test file path with tv_content to find source name
-                episodethumbspath = self.episodethumbspath
-                if self.split_tvshows_sources == "true" and video_library._normalize_path(item['file']) in self.tvshows_content:
-                    source_name = self.tvshows_content[video_library._normalize_path(item['file'])]
-                    if self.normalize_names == "true":
-                        source_name = video_library._normalize_string(source_name)
-                    episodethumbspath = os.path.join( self.episodethumbspath, source_name)
-                if artwork != '':
-                    try:
-                        xbmcvfs.copy( translatePath( artwork ), os.path.join( episodethumbspath, filename ) )
-                        count += 1
-                    except:
-                        log( 'failed to copy episodethumb' )
-        log( 'episodethumbs copied: %s' % count )
-
-    def _copy_musicvideothumbs( self ):
-        count = 0
-        processeditems = 0
-        json_query = xbmc.executeJSONRPC('{"jsonrpc": "2.0", "method": "VideoLibrary.GetMusicVideos", "params": {"properties": ["title", "thumbnail", "artist"], "filter": {"field": "path", "operator": "contains", "value": "%s"}}, "id": 1}' % self.path)
-        json_response = json.loads(json_query)
-        if json_response.__contains__('result') and (json_response['result'] != None) and (json_response['result'].__contains__('musicvideos')):
-            totalitems = len( json_response['result']['musicvideos'] )
-            for item in json_response['result']['musicvideos']:
-                if self.dialog.iscanceled():
-                    log('script cancelled')
-                    return
-                processeditems = processeditems + 1
-                self.dialog.update( int( float( processeditems ) / float( totalitems ) * 100), LANGUAGE(32009) + ': ' + str( count + 1 ) )
-                name = item['title']
-                artwork = item['thumbnail']
-                if item['artist']: # bug workaround, musicvideos can end up in the database without an artistname
-                    artist = item['artist'][0]
-                    tmp_filename = artist + ' - ' + name + '.jpg'
-                else:
-                    tmp_filename = name + '.jpg'
-                filename = clean_filename( tmp_filename )
-                if self.normalize_names == "true":
-                    filename = video_library._normalize_string(filename)
-                if artwork != '':
-                    try:
-                        xbmcvfs.copy( translatePath( artwork ), os.path.join( self.musicvideothumbspath, filename ) )
-                        count += 1
-                    except:
-                        log( 'failed to copy musicvideothumb' )
-        log( 'musicvideothumbs copied: %s' % count )
-
-    def _copy_artistthumbs( self ):
-        count = 0
-        processeditems = 0
-        json_query = xbmc.executeJSONRPC('{"jsonrpc": "2.0", "method": "AudioLibrary.GetArtists", "params": {"properties": ["thumbnail"]}, "id": 1}')
-        json_response = json.loads(json_query)
-        if json_response.__contains__('result') and (json_response['result'] != None) and (json_response['result'].__contains__('artists')):
-            totalitems = len( json_response['result']['artists'] )
-            for item in json_response['result']['artists']:
-                if self.dialog.iscanceled():
-                    log('script cancelled')
-                    return
-                processeditems = processeditems + 1
-                self.dialog.update( int( float( processeditems ) / float( totalitems ) * 100), LANGUAGE(32010) + ': ' + str( count + 1 ) )
-                name = item['label']
-                artwork = item['thumbnail']
-                tmp_filename = name + '.jpg'
-                filename = clean_filename( tmp_filename )
-                if self.normalize_names == "true":
-                    filename = video_library._normalize_string(filename)
-                if artwork != '':
-                    try:
-                        xbmcvfs.copy( translatePath( artwork ), os.path.join( self.artistthumbspath, filename ) )
-                        count += 1
-                    except:
-                        log( 'failed to copy artistthumb' )
-        log( 'artistthumbs copied: %s' % count )
-
-    def _copy_albumthumbs( self ):
-        count = 0
-        processeditems = 0
-        json_query = xbmc.executeJSONRPC('{"jsonrpc": "2.0", "method": "AudioLibrary.GetAlbums", "params": {"properties": ["title", "thumbnail", "artist"]}, "id": 1}')
-        json_response = json.loads(json_query)
-        if json_response.__contains__('result') and (json_response['result'] != None) and (json_response['result'].__contains__('albums')):
-            totalitems = len( json_response['result']['albums'] )
-            for item in json_response['result']['albums']:
-                if self.dialog.iscanceled():
-                    log('script cancelled')
-                    return
-                processeditems = processeditems + 1
-                self.dialog.update( int( float( processeditems ) / float( totalitems ) * 100), LANGUAGE(32011) + ': ' + str( count + 1 ) )
-                name = item['title']
-                artist = item['artist'][0]
-                artwork = item['thumbnail']
-                tmp_filename = artist + ' - ' + name + '.jpg'
-                filename = clean_filename( tmp_filename )
-                if self.normalize_names == "true":
-                    filename = video_library._normalize_string(filename)
-                if artwork != '':
-                    try:
-                        xbmcvfs.copy( translatePath( artwork ), os.path.join( self.albumthumbspath, filename ) )
-                        count += 1
-                    except:
-                        log( 'failed to copy albumthumb' )
-        log( 'albumthumbs copied: %s' % count )
+    def _log_collisions( self, plan ):
+        for dest, first, skipped in plan.collisions:
+            log( 'WARNING! %s and %s resolve to the same artwork file %s, only the first is copied' % ( first, skipped, dest ), level=xbmc.LOGINFO )
+
+    def _report_plan( self, plan ):
+        # the plan is kept in the profile folder, RunScript(script.artworkorganizer,execute) copies it
+        path = os.path.join( translatePath( ADDON.getAddonInfo('profile') ), 'plan.json' )
+        plan.save( path )
+        lines = []
+        files = size = currentfiles = currentsize = 0
+        for arttype in ALL_ARTTYPES:
+            total = plan.totals().get( arttype[0] )
+            if total is None:
+                continue
+            line = '%s: %s files, %s' % ( getattr( self, arttype[0] + 'dir' ), total[0], format_size( total[1] ) )
+            if self.incremental == 'true':
+                line += ', %s up to date' % total[2]
+            lines.append( line )
+            files += total[0]
+            size += total[1]
+            currentfiles += total[2]
+            currentsize += total[3]
+        lines.append( 'total: %s files, %s, %s files to copy, %s' % ( files, format_size( size ), files - currentfiles, format_size( size - currentsize ) ) )
+        if len( self.destinations ) > 1:
+            for destination in self.destinations:
+                entries = [ entry for group in plan.groups for entry in group.entries if destination.contains( entry.dest ) ]
+                lines.append( '%s: %s files, %s' % ( destination.directory, len( entries ), format_size( sum( entry.size or 0 for entry in entries ) ) ) )
+        if plan.collisions:
+            lines.append( 'artwork files used by more than one item, only the first is copied: %s' % len( plan.collisions ) )
+            lines.extend( '  %s (%s, %s)' % ( dest, first, skipped ) for dest, first, skipped in plan.collisions )
+        lines.append( 'plan saved to %s' % path )
+        for line in lines:
+            log( line, level=xbmc.LOGINFO )
+        xbmcgui.Dialog().textviewer( LANGUAGE(32038), '\n'.join( lines ) )
+
+    def _copy_saved_plan( self ):
+        # copies a plan saved by a dry run, only the artwork that isn't up to date yet
+        try:
+            plan = Plan.load( self.planfile, self.directory )
+        except ( IOError, OSError, ValueError, KeyError ) as e:
+            log( 'failed to read plan %s: %s' % ( self.planfile, e ), level=xbmc.LOGINFO )
+            return
+        self._log_collisions( plan )
+        self.dialog.create( ADDONNAME )
+        self._start_copy( self.dialog.iscanceled )
+        self._execute_plan( plan )
+        self._finish_copy()
+        if self.incremental == 'true':
+            self.manifest.save()
+        self._save_ledger()
+        self.dialog.close()
+
+    def _copy_artwork( self, plan ):
+        self.dialog.create( ADDONNAME )
+        self.dialog.update(0)
+        self._start_copy( self.dialog.iscanceled )
+        self._execute_plan( plan )
+        self._finish_copy()
+        fullpasses = [ arttype for arttype in self.completed if arttype not in self.deltaquery ]
+        if self.incremental == 'true':
+            # only prune art types that were fully processed, a cancelled run
+            # has not seen every library item and a delta query only returns new items
+            pruned = self.manifest.prune( fullpasses )
+            log( 'artwork pruned: %s' % len( pruned ) )
+            for arttype in self.completed:
+                # failed copies are retried by querying the same items again next run
+                if self.engine.results( arttype )[2] == 0:
+                    self.manifest.finished( arttype, self.started, arttype not in self.deltaquery )
+            self.manifest.save()
+        if self.store is not None and self.incremental == 'true':
+            log( 'unreferenced stored artwork removed: %s' % self.store.collect_garbage() )
+        self.ledger.prune( fullpasses, self.started )
+        self._save_ledger()
+        # the journal is kept for the next run to resume from until every art type is done
+        self.journal.close( self._run_finished() )
+        self.dialog.close()
+
+    def _run_finished( self ):
+        arttypes = ALL_ARTTYPES
+        if self.path != '':
+            # artist and album artwork can't be searched for in a custom folder
+            arttypes = [ arttype for arttype in arttypes if arttype not in ARTIST_ARTTYPES + ALBUM_ARTTYPES ]
+        return all( arttype[0] in self.completed for arttype in self._enabled_arttypes( arttypes ) )
+
+    def _save_ledger( self ):
+        self.ledger.save()
+        if self.ledger.entries:
+            log( 'artwork that failed to copy: %s, run the add-on in retry mode to copy it again' % len( self.ledger.entries ), level=xbmc.LOGINFO )
+
+    def _retry_failures( self ):
+        # only the artwork in the ledger is copied again, the library isn't queried
+        failures = sorted( self.ledger.entries.items() )
+        if not failures:
+            log( 'no failed artwork to retry', level=xbmc.LOGINFO )
+            return
+        self.dialog.create( ADDONNAME )
+        self._start_copy( self.dialog.iscanceled )
+        createddirs = set()
+        for processeditems, ( dest, entry ) in enumerate( failures, 1 ):
+            if self.engine.canceled():
+                log('script cancelled')
+                break
+            self.dialog.update( int( float( processeditems ) / float( len( failures ) ) * 100 ), dest )
+            path = os.path.dirname( dest )
+            if ( self.bundles is None or not self._primary( dest ) ) and path not in createddirs:
+                if not xbmcvfs.exists( path ):
+                    xbmcvfs.mkdirs( path )
+                createddirs.add( path )
+            self.engine.submit( entry['type'], dest, entry['artwork'], dest, entry['type'], entry['item'] )
+        self.engine.wait()
+        self._finish_copy()
+        for arttype in sorted( set( entry['type'] for dest, entry in failures ) ):
+            log( '%s retried, copied: %s, unchanged: %s, failed: %s' % ( ( arttype, ) + self.engine.results( arttype ) ) )
+        if self.incremental == 'true':
+            self.manifest.save()
+        self._save_ledger()
+        self.dialog.close()
+
+    def _start_copy( self, is_canceled ):
+        # every destination is a separate copy, the destinations of an image share a single read of it
+        self.reads = None
+        copy = self._copy_file
+        if len( self.destinations ) > 1:
+            self.reads = SharedReads()
+            copy = self._copy_target
+        self.engine = CopyEngine( self.metrics.profiled( copy ), self.copy_threads, is_canceled, failed=self._copy_failed )
+        self.copier = FileCopier()
+        self.scheduler = PlaybackScheduler( self.playback_mode, self.playback_bytes, self.playback_files, self.playback_idle, self.engine.cancel_event )
+        self.store = None
+        if self.dedupe_artwork == 'true':
+            if self.bundles is not None:
+                log( 'bundled artwork is not deduplicated' )
+            elif '://' in self.directory:
+                log( 'deduplicated artwork needs a local or mounted destination directory, copying instead' )
+            else:
+                self.store = ArtworkStore( self.directory )
+        self.texture_cache = None
+        if self.use_texture_cache == 'true':
+            self.texture_cache = TextureCache()
+        self.resizer = None
+        if self.profiles:
+            self.resizer = Resizer()
+        self.linker = None
+        if self.link_artwork in ( '1', '2' ):
+            if '://' in self.directory:
+                log( 'linked artwork needs a local or mounted destination directory, copying instead' )
+            else:
+                self.linker = Linker( symlinks=self.link_artwork == '2' )
+        self.fetcher = None
+        if self.fetch_remote == 'true':
+            profile = translatePath( ADDON.getAddonInfo('profile') )
+            self.fetcher = Fetcher( os.path.join( profile, 'validators.json' ), self.fetch_connections, user_agent='%s/%s' % ( ADDONID, ADDONVERSION ), canceled=self.engine.cancel_event )
+
+    def _finish_copy( self ):
+        # let copies that are still in flight finish before the manifest is saved
+        self.engine.close()
+        if self.texture_cache is not None:
+            log( 'texture cache hits: %s, misses: %s' % ( self.texture_cache.hits, self.texture_cache.misses ) )
+            self.texture_cache.close()
+        if self.store is not None:
+            log( 'artwork stored: %s, deduplicated: %s, bytes saved: %s' % ( self.store.stored, self.store.linked, self.store.bytes_saved ) )
+        if self.resizer is not None:
+            log( 'artwork resized: %s, already fitting: %s, bytes saved: %s' % ( self.resizer.resized, self.resizer.fitting, self.resizer.bytes_saved ) )
+        if self.bundles is not None:
+            log( 'artwork added to bundles: %s' % self.bundles.added )
+        if self.scheduler.paused_seconds or self.scheduler.throttled:
+            log( 'copy worker time paused during playback: %ds, copies slowed down: %s' % ( self.scheduler.paused_seconds, self.scheduler.throttled ) )
+        if self.linker is not None:
+            log( 'artwork hard linked: %s, cloned: %s, symbolic links: %s, copied: %s' % ( self.linker.hardlinked, self.linker.cloned, self.linker.symlinked, self.linker.copied ) )
+        log( 'artwork copied by the kernel: %s, buffered: %s, through the vfs: %s' % ( self.copier.zero_copy, self.copier.buffered, self.copier.vfs ) )
+        if self.reads is not None:
+            log( 'artwork read for several destinations: %s, reads saved: %s' % ( self.reads.reads, self.reads.shared ) )
+            self.reads.clear()
+        if self.fetcher is not None:
+            log( 'remote artwork downloaded: %s, not modified: %s, requests retried: %s' % ( self.fetcher.downloaded, self.fetcher.not_modified, self.fetcher.retried ) )
+            self.fetcher.save()
+            self.fetcher.close()
+        self.backend.close()
+
+    def _copy_failed( self, key, args, error ):
+        # runs in a copy worker thread
+        artwork, dest, arttype, item = args[:4]
+        self.ledger.failed( dest, arttype, artwork, item, str( error ) )
+        self.metrics.failed( error )
+        if self.fetcher is not None:
+            # the next download isn't conditional, whatever is left at dest may be incomplete
+            self.fetcher.forget( dest )
+
+    def _copy_target( self, artwork, dest, arttype, item, size=None, mtime=None ):
+        # runs in a copy worker thread, the image read for every destination is dropped after its last one
+        try:
+            return self._copy_file( artwork, dest, arttype, item, size, mtime )
+        finally:
+            self.reads.release( self._read_key( artwork, arttype ) )
+
+    def _read_key( self, artwork, arttype ):
+        # copies of the same image with the same output profile write the same data
+        profile = self.profiles.get( arttype )
+        return ( artwork, str( profile ) if profile is not None else None )
+
+    def _copy_file( self, artwork, dest, arttype, item, size=None, mtime=None ):
+        # runs in a copy worker thread
+        # returns False when the artwork at dest is unchanged since the last run
+        bundles = self.bundles if self._primary( dest ) else None
+        store = self.store if self._primary( dest ) else None
+        if self.journal is not None and dest in self.journal.copied and ( bundles is None or dest in bundles ):
+            # copied by the interrupted run this run resumes
+            if self.incremental == 'true':
+                self.manifest.seen( dest )
+            return False
+        profile = self.profiles.get( arttype )
+        # resized artwork is copied again when its profile changes
+        spec = str( profile ) if profile is not None else None
+        if size and self.incremental == 'true' and self.manifest.is_current( dest, artwork, size, mtime, spec ) and self._dest_exists( dest ):
+            # a saved plan knows the size and time the artwork had when it was planned,
+            # dest is skipped when the manifest says it was copied from that artwork
+            self.manifest.seen( dest )
+            return False
+        source = self._resolve( artwork )
+        # remote artwork is downloaded by the fetcher, the server tells whether it changed
+        url = remote_url( source ) if self.fetcher is not None else None
+        if self.incremental == 'true':
+            self.manifest.seen( dest )
+            if url is None:
+                stat = xbmcvfs.Stat( source )
+                size = stat.st_size()
+                mtime = stat.st_mtime()
+                if self.manifest.is_current( dest, artwork, size, mtime, spec ) and self._dest_exists( dest ):
+                    return False
+        # only the actual copies are paused or slowed down during playback
+        if not self.scheduler.wait():
+            return False
+        started = time.time()
+        data = None
+        validator = None
+        copiedbytes = None
+        # artwork that isn't a local file is read once for all the destinations it is copied to
+        shared = self.reads is not None and not is_local( source ) and self.reads.is_shared( ( artwork, spec ) )
+        if url is not None or profile is not None or bundles is not None or shared:
+            load = lambda: self._load( source, url, dest, profile, spec )
+            loaded = self.reads.read( ( artwork, spec ), load ) if self.reads is not None else load()
+            if loaded is None:
+                # not modified since it was downloaded to dest
+                return False
+            data, validator, downloaded = loaded
+            if url is not None:
+                size = downloaded
+                mtime = 0
+            if bundles is not None:
+                bundles.add( dest, data )
+            elif store is not None:
+                store.add_data( data, dest )
+            else:
+                # a link left by an earlier run would write the artwork into the original
+                unlink_shared( dest )
+                f = xbmcvfs.File( dest, 'w' )
+                try:
+                    written = f.write( bytearray( data ) )
+                finally:
+                    f.close()
+                if not written:
+                    raise IOError( 'write failed' )
+        elif self.linker is not None and self.linker.link( source, dest ):
+            # local artwork on the same filesystem shares its data with the original
+            pass
+        elif store is not None:
+            store.add( source, dest )
+        else:
+            # written to a temporary file and renamed, a link left by an earlier run is replaced instead of written through
+            copiedbytes = self.copier.copy( source, dest )
+        if copiedbytes is None:
+            copiedbytes = len( data ) if data is not None else size if size is not None else xbmcvfs.Stat( dest ).st_size()
+        self.scheduler.copied( copiedbytes )
+        self.metrics.copied( arttype, dest, copiedbytes, time.time() - started )
+        if self.incremental == 'true':
+            self.manifest.record( dest, arttype, artwork, size, mtime, item, spec )
+        self.ledger.succeeded( dest )
+        if validator is not None:
+            self.fetcher.remember( dest, validator )
+        if self.journal is not None:
+            entry = { 'type': arttype, 'source': artwork, 'item': item, 'profile': spec }
+            if self.incremental == 'true':
+                entry.update( size=size, mtime=mtime )
+            self.journal.copy_done( dest, entry )
+        return True
+
+    def _load( self, source, url, dest, profile, spec ):
+        # the data written to dest, its validator and the bytes downloaded, None when the download wasn't modified
+        data = None
+        validator = None
+        downloaded = None
+        if url is not None:
+            data, validator = self.fetcher.fetch( url, dest, spec, self._dest_exists( dest ) )
+            if data is None:
+                return None
+            downloaded = len( data )
+        if profile is not None:
+            data = self.resizer.resize( source, profile, data )
+        elif data is None:
+            data = read_file( source )
+        return data, validator, downloaded
+
+    def _dest_exists( self, dest ):
+        if self.bundles is not None and self._primary( dest ):
+            return dest in self.bundles
+        return xbmcvfs.exists( dest )
+
+    def _remove_artwork( self, dest ):
+        # deletes the artwork of a pruned manifest entry, True when it is gone
+        if self.bundles is not None and self._primary( dest ):
+            return self.bundles.remove( dest )
+        return not xbmcvfs.exists( dest ) or xbmcvfs.delete( dest )
+
+    def _resolve( self, artwork ):
+        started = time.time()
+        source = None
+        if self.texture_cache is not None:
+            # prefer the local copy in Kodi's texture cache over fetching the original again
+            source = self.texture_cache.resolve( artwork )
+        if source is None:
+            source = translatePath( artwork )
+        self.metrics.timed( 'resolve', started )
+        return source
+
+    def _estimate( self, entry ):
+        # the dry run only reads the size of the artwork, nothing is written
+        stat = xbmcvfs.Stat( self._resolve( entry.artwork ) )
+        entry.size = stat.st_size()
+        entry.mtime = stat.st_mtime()
+        if self.incremental == 'true':
+            profile = self.profiles.get( entry.arttype )
+            spec = str( profile ) if profile is not None else None
+            entry.current = self.manifest.is_current( entry.dest, entry.artwork, entry.size, entry.mtime, spec ) and self._dest_exists( entry.dest )
+
+    def _is_canceled( self ):
+        if self.dialog is not None and self.dialog.iscanceled():
+            return True
+        return self.is_canceled()
+
+    def _enabled_arttypes( self, arttypes ):
+        # art types the interrupted run this run resumes has completed are skipped
+        return [ arttype for arttype in arttypes if any( arttype[0] in destination.arttypes for destination in self.destinations ) and
+                 not ( self.journal is not None and arttype[0] in self.journal.completed ) ]
+
+    def _get_items( self, method, result, properties, targets, convert, filter_path=True, datefields=( "dateadded", ), delta=True ):
+        # request the union of the properties needed by all enabled art types at once
+        for arttype in targets:
+            if arttype[2] not in properties:
+                properties.append( arttype[2] )
+        rules = []
+        if filter_path:
+            rules.append( { "field": "path", "operator": "contains", "value": self.path } )
+        since = None
+        if delta:
+            since = self._since( targets )
+        if since is not None:
+            # only the items added since the last run
+            value = time.strftime( '%Y-%m-%d %H:%M:%S', time.localtime( since ) )
+            daterules = [ { "field": field, "operator": "greaterthan", "value": value } for field in datefields ]
+            if len( daterules ) == 1:
+                rules.append( daterules[0] )
+            else:
+                rules.append( { "or": daterules } )
+        # items are retrieved page by page and kept as compact records while they are copied
+        try:
+            items = self.backend.query( method, result, self._get_params( properties, rules ), self.page_size, convert )
+        except video_library.LibraryError as e:
+            if since is None:
+                log( e )
+                return None
+            # older versions can't filter on the date fields of every media type
+            log( 'delta query failed, querying all items: %s' % e )
+            return self._get_items( method, result, properties, targets, convert, filter_path, datefields, delta=False )
+        if since is not None:
+            log( '%s added since the last run: %s' % ( result, len( items ) ) )
+            self.deltaquery.extend( arttype[0] for arttype in targets )
+        return items
+
+    def _get_params( self, properties, rules ):
+        params = { "properties": properties }
+        if len( rules ) == 1:
+            params['filter'] = rules[0]
+        elif rules:
+            params['filter'] = { "and": rules }
+        return params
+
+    def _since( self, targets ):
+        # the start of the last run all targets were copied in, None when the whole library has to be queried
+        if self.delta_queries != 'true' or self.incremental != 'true' or self.service:
+            return None
+        since = None
+        for arttype in targets:
+            run = self.manifest.last_run( arttype[0] )
+            # the whole library is queried every few days, catching changed artwork of older items
+            if run is None or run.get( 'full' ) is None or self.started - run['full'] > self.full_reconcile_days * 86400:
+                return None
+            if since is None or run['started'] < since:
+                since = run['started']
+        return since
+
+    def _get_art( self, targets, item ):
+        return tuple( arttype[3]( item ) for arttype in targets )
+
+    def _tvshow_source( self, path ):
+        # a tv show folder belongs to the tv source with the longest matching path
+        source = self.tvshows_index.lookup( path )
+        if source is None:
+            return None
+        return self.library.source_names.index( source.name )
+
+    def _copy_items( self, targets, items ):
+        # the service plans and copies the items of one media type at a time
+        plan = Plan( self.directory )
+        planned = self._plan_items( plan, targets, items )
+        self._log_collisions( plan )
+        return self._execute_plan( plan ) and planned
+
+    def _plan_items( self, plan, targets, items ):
+        # resolve every enabled art type of an item in a single pass over the library items
+        group = plan.start( arttype[0] for arttype in targets )
+        label = ', '.join( LANGUAGE( arttype[1] ) for arttype in targets )
+        totalitems = len( items )
+        try:
+            for processeditems, item in enumerate( items, 1 ):
+                if self._is_canceled():
+                    return False
+                if self.dialog is not None:
+                    self.dialog.update( int( float( processeditems ) / float( max( totalitems, 1 ) ) * 100), label + ': ' + str( processeditems ) )
+                started = time.time()
+                filename = clean_filename( item.name + '.jpg' )
+                normalized = filename
+                if self.normalize_any:
+                    normalized = video_library._normalize_string(filename)
+                self.metrics.timed( 'naming', started )
+                for index, arttype in enumerate( targets ):
+                    artwork = item.art[index]
+                    if not artwork:
+                        continue
+                    profile = self.profiles.get( arttype[0] )
+                    # the same artwork is planned once for every destination of its art type
+                    for destination in self.destinations:
+                        if arttype[0] not in destination.arttypes:
+                            continue
+                        path = destination.folders[arttype[0]]
+                        split = None
+                        if item.source is not None and arttype[0] in destination.split:
+                            split = ( self.normalized_source_dirs if destination.normalize_names else self.source_dirs )[item.source]
+                            path = os.path.join( path, split )
+                        dest = os.path.join( path, normalized if destination.normalize_names else filename )
+                        if profile is not None and profile.format != 'jpg':
+                            dest = os.path.splitext( dest )[0] + '.' + profile.format
+                        entry = Entry( dest, artwork, arttype[0], item.key, split )
+                        # a second item with the same name and destination is a collision, it isn't copied
+                        if plan.add( group, entry ) and self.dry_run:
+                            self._estimate( entry )
+        except video_library.LibraryError as e:
+            # a page failed, this pass has not seen every item
+            log( e )
+            return False
+        group.complete = True
+        return True
+
+    def _execute_plan( self, plan ):
+        # copy the planned artwork group by group, returns False unless every group was planned and copied
+        labels = dict( ( arttype[0], arttype[1] ) for arttype in ALL_ARTTYPES )
+        totalentries = max( len( plan ), 1 )
+        processedentries = 0
+        copied = True
+        for group in plan.groups:
+            label = ', '.join( LANGUAGE( labels[arttype] ) for arttype in group.arttypes )
+            if self.reads is not None:
+                # images copied to more than one destination are kept in memory until their last copy
+                targets = {}
+                for entry in group.entries:
+                    key = self._read_key( entry.artwork, entry.arttype )
+                    targets[key] = targets.get( key, 0 ) + 1
+                for key, count in targets.items():
+                    if count > 1:
+                        self.reads.expect( key, count )
+            for entry in group.entries:
+                if self.engine.canceled():
+                    break
+                processedentries += 1
+                if self.dialog is not None:
+                    self.dialog.update( int( float( processedentries ) / float( totalentries ) * 100 ), label + ': ' + str( processedentries ) )
+                path = os.path.dirname( entry.dest )
+                if self.createddirs is not None and ( self.bundles is None or not self._primary( entry.dest ) ) and path not in self.createddirs:
+                    if not xbmcvfs.exists( path ):
+                        xbmcvfs.mkdirs( path )
+                    self.createddirs.add( path )
+                self.engine.submit( entry.arttype, entry.dest, entry.artwork, entry.dest, entry.arttype, entry.item, entry.size, entry.mtime )
+            # counts are only final once the workers are done with this group
+            if not self.engine.wait():
+                log('script cancelled')
+                return False
+            for arttype in group.arttypes:
+                log( '%s copied: %s, unchanged: %s, failed: %s' % ( ( arttype, ) + self.engine.results( arttype ) ) )
+            if not group.complete:
+                copied = False
+                continue
+            for arttype in group.arttypes:
+                self.completed.append( arttype )
+                if self.journal is not None:
+                    self.journal.arttype_done( arttype )
+        return copied
+
+    def _movie( self, targets, item ):
+        path = video_library._normalize_path( item['file'] )
+        source = None
+        if self.match_movies_sources:
+            started = time.time()
+            source = self.movies_content.get( path )
+            self.metrics.timed( 'source matching', started )
+        return video_library.Movie( item['movieid'], self._get_art( targets, item ), source, path, item['title'], item['year'] )
+
+    def _tvshow( self, targets, item ):
+        path = video_library._normalize_path( item['file'] )
+        source = None
+        if self.match_tvshows_sources:
+            started = time.time()
+            source = self._tvshow_source( path )
+            self.metrics.timed( 'source matching', started )
+        return video_library.TVShow( item['tvshowid'], self._get_art( targets, item ), source, path, item['title'] )
+
+    def _episode( self, targets, item ):
+        path = video_library._normalize_path( item['file'] )
+        source = None
+        if self.match_tvshows_sources:
+            started = time.time()
+            source = self.tvshows_content.get( path )
+            self.metrics.timed( 'source matching', started )
+        return video_library.Episode( item['episodeid'], self._get_art( targets, item ), source, path, item['showtitle'], item['season'], item['episode'], item['title'] )
+
+    def _musicvideo( self, targets, item ):
+        artist = item['artist'][0] if item['artist'] else None
+        return video_library.MusicVideo( item['musicvideoid'], self._get_art( targets, item ), None, artist, item['title'] )
+
+    def _artist( self, targets, item ):
+        return video_library.Artist( item['artistid'], self._get_art( targets, item ), None, item['label'] )
+
+    def _album( self, targets, item ):
+        artist = item['artist'][0] if item['artist'] else None
+        return video_library.Album( item['albumid'], self._get_art( targets, item ), None, artist, item['title'] )
+
+    def _plan_movieartwork( self, plan ):
+        targets = self._enabled_arttypes( MOVIE_ARTTYPES )
+        if not targets:
+            return
+        items = self._get_items( "VideoLibrary.GetMovies", "movies", list( MOVIE_PROPERTIES ), targets, lambda item: self._movie( targets, item ) )
+        if items is None:
+            return
+        self._plan_items( plan, targets, items )
+
+    def _plan_tvshowartwork( self, plan ):
+        targets = self._enabled_arttypes( TVSHOW_ARTTYPES )
+        seasontargets = self._enabled_arttypes( SEASON_ARTTYPES )
+        if not targets and not seasontargets:
+            return
+        # sources are resolved once per show and reused for its seasons
+        sources = {}
+        def convert( item ):
+            tvshow = self._tvshow( targets, item )
+            sources[tvshow.id] = tvshow.source
+            return tvshow
+        # seasons are named and placed after their show, every show is needed for them
+        items = self._get_items( "VideoLibrary.GetTVShows", "tvshows", list( TVSHOW_PROPERTIES ), targets, convert, delta=not seasontargets )
+        if items is None:
+            return
+        if targets:
+            self._plan_items( plan, targets, items )
+        else:
+            # only season thumbs are enabled, the shows are only read for their sources
+            try:
+                for item in items:
+                    pass
+            except video_library.LibraryError as e:
+                log( e )
+                return
+        if seasontargets and not self._is_canceled():
+            self._plan_items( plan, seasontargets, self._get_seasons( seasontargets, sources ) )
+
+    def _get_seasons( self, targets, sources, all_shows=True ):
+        properties = SEASON_PROPERTIES + [ arttype[2] for arttype in targets ]
+        seasons_by_tvshow = self.backend.get_seasons( list( sources ), properties, all_shows )
+        seasons = []
+        for tvshowid, source in sources.items():
+            for item in seasons_by_tvshow[tvshowid]:
+                seasons.append( video_library.Season( item['seasonid'], self._get_art( targets, item ), source, tvshowid, item['showtitle'], item['label'] ) )
+            del seasons_by_tvshow[tvshowid]
+        return seasons
+
+    def _plan_episodeartwork( self, plan ):
+        targets = self._enabled_arttypes( EPISODE_ARTTYPES )
+        if not targets:
+            return
+        items = self._get_items( "VideoLibrary.GetEpisodes", "episodes", list( EPISODE_PROPERTIES ), targets, lambda item: self._episode( targets, item ) )
+        if items is None:
+            return
+        self._plan_items( plan, targets, items )
+
+    def _plan_musicvideoartwork( self, plan ):
+        targets = self._enabled_arttypes( MUSICVIDEO_ARTTYPES )
+        if not targets:
+            return
+        items = self._get_items( "VideoLibrary.GetMusicVideos", "musicvideos", list( MUSICVIDEO_PROPERTIES ), targets, lambda item: self._musicvideo( targets, item ) )
+        if items is None:
+            return
+        self._plan_items( plan, targets, items )
+
+    def _plan_artistartwork( self, plan ):
+        targets = self._enabled_arttypes( ARTIST_ARTTYPES )
+        if not targets:
+            return
+        items = self._get_items( "AudioLibrary.GetArtists", "artists", list( ARTIST_PROPERTIES ), targets, lambda item: self._artist( targets, item ), filter_path=False, datefields=( "dateadded", "datemodified" ) )
+        if items is None:
+            return
+        self._plan_items( plan, targets, items )
+
+    def _plan_albumartwork( self, plan ):
+        targets = self._enabled_arttypes( ALBUM_ARTTYPES )
+        if not targets:
+            return
+        items = self._get_items( "AudioLibrary.GetAlbums", "albums", list( ALBUM_PROPERTIES ), targets, lambda item: self._album( targets, item ), filter_path=False, datefields=( "dateadded", "datemodified" ) )
+        if items is None:
+            return
+        self._plan_items( plan, targets, items )
+
+    def _sync_items( self ):
+        # only the artwork of the changed library items is copied, the files of removed
+        # items and files an updated item no longer has are deleted through the manifest
+        self._start_copy( self.is_canceled )
+        if self.match_movies_sources or self.match_tvshows_sources:
+            self._get_source_lookup()
+        for media, arttypes, properties, convert in ( ( 'movie', MOVIE_ARTTYPES, MOVIE_PROPERTIES, self._movie ),
+                                                      ( 'musicvideo', MUSICVIDEO_ARTTYPES, MUSICVIDEO_PROPERTIES, self._musicvideo ),
+                                                      ( 'artist', ARTIST_ARTTYPES, ARTIST_PROPERTIES, self._artist ),
+                                                      ( 'album', ALBUM_ARTTYPES, ALBUM_PROPERTIES, self._album ) ):
+            if self.engine.canceled():
+                break
+            if media in ( 'artist', 'album' ) and self.path != '':
+                continue
+            targets = self._enabled_arttypes( arttypes )
+            ids = self.updated.get( media )
+            if targets and ids:
+                items = self._get_details( media, ids, properties, targets, filter_path=media in ( 'movie', 'musicvideo' ) )
+                self._sync_artwork( targets, [ convert( targets, item ) for item in items ], media, ids )
+        if not self.engine.canceled():
+            self._sync_tvshowartwork()
+        removed = [ '%s:%s' % ( media, id ) for media, ids in self.removed.items() for id in ids ]
+        if removed and not self.engine.canceled():
+            log( 'artwork of removed items deleted: %s' % len( self.manifest.prune_items( removed ) ) )
+        self._finish_copy()
+        self.manifest.save()
+        self._save_ledger()
+
+    def _sync_tvshowartwork( self ):
+        targets = self._enabled_arttypes( TVSHOW_ARTTYPES )
+        seasontargets = self._enabled_arttypes( SEASON_ARTTYPES )
+        episodetargets = self._enabled_arttypes( EPISODE_ARTTYPES )
+        tvshowids = set( self.updated.get( 'tvshow', () ) )
+        # new episodes and seasons can come with new season artwork, the seasons
+        # of their shows are synced as a whole
+        seasonshows = set()
+        episodeids = self.updated.get( 'episode' )
+        if episodeids and ( episodetargets or seasontargets ):
+            items = self._get_details( 'episode', episodeids, EPISODE_PROPERTIES + [ "tvshowid" ], episodetargets )
+            seasonshows.update( item['tvshowid'] for item in items )
+            if episodetargets:
+                self._sync_artwork( episodetargets, [ self._episode( episodetargets, item ) for item in items ], 'episode', episodeids )
+        if seasontargets:
+            seasonshows.update( tvshowids )
+            seasonids = self.updated.get( 'season' )
+            if seasonids:
+                seasonshows.update( item['tvshowid'] for item in self._get_details( 'season', seasonids, [ "tvshowid" ], [], filter_path=False ) )
+        if not targets:
+            tvshowids = set()
+        if self.engine.canceled() or not ( tvshowids or seasonshows ):
+            return
+        # seasons are stored in the source of their show
+        tvshows = [ self._tvshow( targets, item ) for item in self._get_details( 'tvshow', tvshowids | seasonshows, TVSHOW_PROPERTIES, targets ) ]
+        if tvshowids:
+            self._sync_artwork( targets, [ tvshow for tvshow in tvshows if tvshow.id in tvshowids ], 'tvshow', tvshowids )
+        if seasonshows and not self.engine.canceled():
+            sources = dict( ( tvshow.id, tvshow.source ) for tvshow in tvshows if tvshow.id in seasonshows )
+            self._sync_artwork( seasontargets, self._get_seasons( seasontargets, sources, all_shows=False ), 'tvshow', seasonshows )
+
+    def _get_details( self, media, ids, properties, targets, filter_path=True ):
+        method, result, idkey = DETAILS[media]
+        properties = list( properties )
+        for arttype in targets:
+            if arttype[2] not in properties:
+                properties.append( arttype[2] )
+        filter_path = filter_path and self.path != ''
+        if filter_path and "file" not in properties:
+            properties.append( "file" )
+        queries = [ { "jsonrpc": "2.0", "method": method, "params": { idkey: id, "properties": properties } } for id in sorted( ids ) ]
+        items = []
+        for response in video_library.jsonrpc_batch( queries ):
+            # the item may have been removed again since the notification
+            item = ( response.get( 'result' ) or {} ).get( result )
+            if item is None:
+                continue
+            if filter_path and self.path not in item['file']:
+                continue
+            items.append( item )
+        return items
+
+    def _sync_artwork( self, targets, items, media, ids ):
+        if not self._copy_items( targets, items ):
+            return
+        # items that are no longer in the library or outside the custom folder lose their artwork
+        pruned = self.manifest.prune_items( [ '%s:%s' % ( media, id ) for id in ids ], [ arttype[0] for arttype in targets ] )
+        log( '%s artwork deleted: %s' % ( media, len( pruned ) ) )
 
 if ( __name__ == "__main__" ):
     log('script version %s started' % ADDONVERSION)
-    Main()
-log('script stopped')
+    # RunScript(script.artworkorganizer,retry) only copies the artwork that failed before,
+    # RunScript(script.artworkorganizer,dryrun) saves the plan of a run without copying anything
+    # and RunScript(script.artworkorganizer,execute[,path]) copies a saved plan
+    mode = sys.argv[1] if len( sys.argv ) > 1 else ''
+    plan = None
+    if mode == 'execute':
+        plan = sys.argv[2] if len( sys.argv ) > 2 else os.path.join( translatePath( ADDON.getAddonInfo('profile') ), 'plan.json' )
+    if acquire_lock():
+        try:
+            Main( retry=mode == 'retry', dry_run=mode == 'dryrun', plan=plan )
+        finally:
+            release_lock()
+    else:
+        log('artwork is already being copied, script run skipped', level=xbmc.LOGINFO)
+        xbmcgui.Dialog().notification( ADDONNAME, LANGUAGE(32056) )
+    log('script stopped')
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+
+"""Run the add-on outside Kodi against a Kodi on the network.
+
+    python headless/run.py --host kodi.lan --setting directory=/volume1/artwork
+    python headless/run.py --host kodi.lan --tcp-port 9090 --settings settings.xml dryrun
+    python headless/run.py --host kodi.lan --map /storage/videos=/volume1/videos execute
+
+The library is read through Kodi's JSON-RPC interface, over HTTP or the
+raw TCP interface, and artwork through its web server, on connections
+that stay open for the whole run. The copying, hashing and resizing run
+on this machine, a NAS or server with more cores than the Kodi box. The
+stand-in Kodi modules in this folder are put in front of the path, so
+the add-on runs unmodified.
+
+Kodi's web server has to be enabled, with remote control allowed when
+the TCP interface is used. The artwork directory has to be a local or
+mounted folder. Media folders that are mounted here as well can be
+mapped with --map, local artwork in them is then read, linked or cloned
+directly instead of going through the web server. With Kodi's userdata
+folder mounted (--userdata) the library is read from its SQLite
+databases and artwork from its texture cache.
+
+The modes are the arguments of RunScript(script.artworkorganizer,...):
+retry, dryrun and execute [plan file].
+"""
+
+import argparse
+import json
+import os
+import signal
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import xbmc
+import xbmcaddon
+from transport import HTTPTransport, TCPTransport, TransportError
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('mode', nargs='?', default='', choices=['', 'retry', 'dryrun', 'execute'])
+    parser.add_argument('plan', nargs='?', help='plan file copied by execute, plan.json in the profile by default')
+    parser.add_argument('--host', default='localhost', help='the Kodi box')
+    parser.add_argument('--http-port', type=int, default=8080, help='port of Kodi\'s web server')
+    parser.add_argument('--tcp-port', type=int, help='send JSON-RPC to the TCP interface (usually 9090) instead')
+    parser.add_argument('--user', help='user name of Kodi\'s web server')
+    parser.add_argument('--password', help='password of Kodi\'s web server')
+    parser.add_argument('--timeout', type=float, default=60, help='seconds before a request fails')
+    parser.add_argument('--profile', default=os.path.expanduser('~/.artworkorganizer'),
+                        help='folder of the manifest, journal and plans of this runner')
+    parser.add_argument('--userdata', help='Kodi\'s userdata folder, when it is mounted on this machine')
+    parser.add_argument('--settings', help='add-on settings.xml, as in Kodi\'s addon_data folder')
+    parser.add_argument('--setting', action='append', default=[], metavar='ID=VALUE',
+                        help='set an add-on setting, can be repeated')
+    parser.add_argument('--map', action='append', default=[], metavar='KODI=LOCAL',
+                        help='a media folder as Kodi sees it and where it is mounted here, can be repeated')
+    parser.add_argument('--verbose', action='store_true', help='print the debug log')
+    return parser.parse_args(argv)
+
+
+def setup(args):
+    xbmc.VERBOSE = args.verbose
+    xbmc.PROFILE = os.path.abspath(args.profile)
+    if not os.path.isdir(xbmc.PROFILE):
+        os.makedirs(xbmc.PROFILE)
+    xbmc.USERDATA = args.userdata
+    xbmc.PATH_MAP = [tuple(mapping.split('=', 1)) for mapping in args.map]
+    xbmc.WEB = HTTPTransport(args.host, args.http_port, args.user, args.password, args.timeout)
+    if args.tcp_port:
+        xbmc.TRANSPORT = TCPTransport(args.host, args.tcp_port, args.timeout)
+    else:
+        xbmc.TRANSPORT = xbmc.WEB
+    settings = xbmcaddon.load_defaults()
+    if args.settings:
+        settings.update(xbmcaddon.load_settings(args.settings))
+    settings.update(setting.split('=', 1) for setting in args.setting)
+    xbmcaddon.SETTINGS.clear()
+    xbmcaddon.SETTINGS.update(settings)
+
+
+def cancel(signum, frame):
+    # the first ctrl-c cancels the run like the cancel button, the next one stops right away
+    sys.stderr.write('cancelling, the next run resumes where this one stopped\n')
+    xbmc.ABORT.set()
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    setup(args)
+    if '://' in xbmcaddon.SETTINGS.get('directory', ''):
+        sys.stderr.write('the artwork directory has to be a local or mounted folder\n')
+        return 2
+    try:
+        response = json.loads(xbmc.executeJSONRPC('{"jsonrpc": "2.0", "method": "JSONRPC.Ping", "id": 1}'))
+    except (TransportError, ValueError) as e:
+        sys.stderr.write('cannot reach Kodi: %s\n' % e)
+        return 2
+    if response.get('result') != 'pong':
+        sys.stderr.write('unexpected answer from Kodi: %s\n' % response)
+        return 2
+    signal.signal(signal.SIGINT, cancel)
+
+    # imported once the stand-in modules are set up
+    import default
+    default.log('headless run against %s, version %s' % (args.host, default.ADDONVERSION), level=xbmc.LOGINFO)
+    plan = None
+    if args.mode == 'execute':
+        plan = args.plan or os.path.join(xbmc.PROFILE, 'plan.json')
+    try:
+        if not default.acquire_lock():
+            sys.stderr.write('artwork is already being copied by the script or the service in Kodi\n')
+            return 1
+        try:
+            default.Main(retry=args.mode == 'retry', dry_run=args.mode == 'dryrun', plan=plan)
+        finally:
+            default.release_lock()
+    except TransportError as e:
+        sys.stderr.write('lost the connection to Kodi: %s\n' % e)
+        return 1
+    finally:
+        xbmc.TRANSPORT.close()
+        xbmc.WEB.close()
+    return 1 if xbmc.ABORT.is_set() else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
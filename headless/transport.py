@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+"""Connections to a Kodi instance on the network.
+
+JSON-RPC goes either through the web server (POST /jsonrpc) or through
+the raw TCP interface on port 9090. Artwork is always read through the
+web server, /image/<url> serves any art url Kodi knows, so the web
+server has to be enabled in Kodi either way.
+
+Connections are kept open between requests. Every thread gets its own
+HTTP connection, the copy workers fetch artwork in parallel. The TCP
+interface is a single socket that requests take turns on.
+"""
+
+import base64
+import json
+import socket
+import threading
+
+try:  # python 3
+    import http.client as httplib
+except ImportError:  # python 2
+    import httplib
+
+
+class TransportError(Exception):
+    pass
+
+
+class HTTPTransport(object):
+
+    def __init__(self, host, port=8080, username=None, password=None, timeout=60):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.headers = {}
+        if username:
+            credentials = ('%s:%s' % (username, password or '')).encode('utf-8')
+            self.headers['Authorization'] = 'Basic ' + base64.b64encode(credentials).decode('ascii')
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = httplib.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self._local.connection = connection
+        return connection
+
+    def request(self, method, path, body=None, headers=None):
+        """Send a request, return (status, headers, body). A kept-alive connection the
+        server has closed meanwhile is opened again once."""
+        request_headers = dict(self.headers)
+        request_headers.update(headers or {})
+        for attempt in (1, 2):
+            connection = self._connection()
+            try:
+                connection.request(method, path, body, request_headers)
+                response = connection.getresponse()
+                data = response.read()
+                return response.status, dict((key.lower(), value) for key, value in response.getheaders()), data
+            except (httplib.HTTPException, socket.error) as e:
+                connection.close()
+                self._local.connection = None
+                if attempt == 2:
+                    raise TransportError('%s:%s: %s' % (self.host, self.port, e))
+
+    def send(self, request):
+        status, headers, data = self.request('POST', '/jsonrpc', request.encode('utf-8'),
+                                             {'Content-Type': 'application/json'})
+        if status != 200:
+            raise TransportError('JSON-RPC request failed with HTTP status %s' % status)
+        return data.decode('utf-8')
+
+    def close(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+class TCPTransport(object):
+
+    def __init__(self, host, port=9090, timeout=60):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._socket = None
+        self._buffer = ''
+        self._decoder = json.JSONDecoder()
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._socket is None:
+            self._socket = socket.create_connection((self.host, self.port), self.timeout)
+            self._buffer = ''
+        return self._socket
+
+    def send(self, request):
+        with self._lock:
+            try:
+                connection = self._connect()
+                connection.sendall(request.encode('utf-8'))
+                return self._receive(connection)
+            except (socket.error, ValueError) as e:
+                self.close()
+                raise TransportError('%s:%s: %s' % (self.host, self.port, e))
+
+    def _receive(self, connection):
+        # messages are json values without separators, notifications like
+        # VideoLibrary.OnUpdate arrive in between and are skipped
+        while True:
+            message = self._next_message()
+            if message is None:
+                data = connection.recv(65536)
+                if not data:
+                    raise socket.error('connection closed by Kodi')
+                self._buffer += data.decode('utf-8')
+                continue
+            text, value = message
+            if isinstance(value, dict) and 'method' in value and 'id' not in value:
+                continue
+            return text
+
+    def _next_message(self):
+        buffer = self._buffer.lstrip()
+        if not buffer:
+            self._buffer = ''
+            return None
+        try:
+            value, end = self._decoder.raw_decode(buffer)
+        except ValueError:
+            # incomplete, wait for more data
+            self._buffer = buffer
+            return None
+        self._buffer = buffer[end:]
+        return buffer[:end], value
+
+    def close(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+"""Kodi's xbmc module for the headless runner, backed by a Kodi on the network.
+
+JSON-RPC requests are sent through `TRANSPORT` (see transport.py) and
+special:// paths of the add-on profile are mapped to `PROFILE`. Kodi's
+own folders, the databases and the texture cache, are only found when its
+userdata folder is mounted on this machine (`USERDATA`). Without them the
+library is read through JSON-RPC and artwork is fetched from Kodi's web
+server, unless `PATH_MAP` maps it to a local path.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    from urllib.parse import unquote
+except ImportError:  # python 2
+    from urllib import unquote
+
+LOGDEBUG = 0
+LOGINFO = 1
+LOGWARNING = 2
+LOGERROR = 3
+LOGFATAL = 4
+
+ADDON_PROFILE = 'special://profile/addon_data/script.artworkorganizer/'
+
+TRANSPORT = None
+# HTTPTransport of Kodi's web server, artwork is fetched through it
+WEB = None
+PROFILE = os.path.expanduser('~/.artworkorganizer')
+# kodi's userdata folder mounted on this machine, or None
+USERDATA = None
+# [(path as Kodi sees it, the same path on this machine)]
+PATH_MAP = []
+VERBOSE = False
+# set by ctrl-c, cancels the run like the cancel button of the progress dialog
+ABORT = threading.Event()
+
+# special:// folders below the userdata folder
+SPECIAL_FOLDERS = {'userdata': '', 'profile': '', 'masterprofile': '', 'database': 'Database',
+                   'thumbnails': 'Thumbnails'}
+
+STRINGS = {20358: 'Season %d', 20381: 'Specials'}
+
+
+def log(msg, level=LOGDEBUG):
+    if VERBOSE or level >= LOGINFO:
+        sys.stderr.write(msg + '\n')
+
+
+def map_path(path):
+    """Return the local path of a path Kodi uses, None when no mapping applies."""
+    for kodi, local in PATH_MAP:
+        kodi = kodi.rstrip('/\\')
+        if path.startswith(kodi) and path[len(kodi):len(kodi) + 1] in ('', '/', '\\'):
+            rest = path[len(kodi):].replace('\\', '/').strip('/')
+            return os.path.join(local, *rest.split('/')) if rest else local
+    return None
+
+
+def _special_path(path):
+    folder, _, rest = path.partition('/')
+    folder = SPECIAL_FOLDERS.get(folder)
+    if USERDATA is None or folder is None:
+        # kodi's own folders are on the kodi box, nothing is found below this
+        return os.path.join(PROFILE, 'kodi', path)
+    return os.path.join(USERDATA, folder, *rest.split('/'))
+
+
+def translatePath(path):
+    if path.startswith(ADDON_PROFILE):
+        return os.path.join(PROFILE, path[len(ADDON_PROFILE):])
+    if path.startswith('special://'):
+        return _special_path(path[len('special://'):])
+    original = path
+    if path.startswith('image://'):
+        original = unquote(path[len('image://'):]).rstrip('/')
+    local = map_path(original)
+    if local is not None and os.path.exists(local):
+        return local
+    return path
+
+
+def executeJSONRPC(request):
+    return TRANSPORT.send(request)
+
+
+def getLocalizedString(id):
+    return STRINGS.get(id, '')
+
+
+def getInfoLabel(label):
+    return ''
+
+
+def getCondVisibility(condition):
+    return False
+
+
+def getGlobalIdleTime():
+    # the user's idle time isn't available over JSON-RPC, only playback counts
+    return sys.maxsize
+
+
+def sleep(milliseconds):
+    time.sleep(milliseconds / 1000.0)
+
+
+class Monitor(object):
+
+    def abortRequested(self):
+        return ABORT.is_set()
+
+    def waitForAbort(self, timeout=0):
+        return ABORT.wait(timeout or 0)
+
+
+class Player(object):
+
+    def isPlaying(self):
+        try:
+            response = json.loads(executeJSONRPC('{"jsonrpc": "2.0", "method": "Player.GetActivePlayers", "id": 1}'))
+        except Exception:
+            return False
+        return bool(response.get('result'))
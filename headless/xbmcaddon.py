@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+"""Kodi's xbmcaddon module for the headless runner.
+
+Settings start from the defaults in resources/settings.xml, the runner
+adds the values of a settings.xml copied from the Kodi box and the ones
+given on the command line. Strings are read from the English
+strings.po, they show up in the progress output and the dry run report.
+"""
+
+import io
+import os
+import re
+import xml.etree.ElementTree as ElementTree
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SETTINGS = {}
+INFO = {
+    'id': 'script.artworkorganizer',
+    'name': 'Artwork Organizer',
+    'version': ElementTree.parse(os.path.join(ROOT, 'addon.xml')).getroot().get('version'),
+    'profile': 'special://profile/addon_data/script.artworkorganizer/',
+    'path': ROOT,
+}
+_STRINGS = None
+
+
+def load_defaults():
+    """Return the default of every setting in resources/settings.xml."""
+    tree = ElementTree.parse(os.path.join(ROOT, 'resources', 'settings.xml'))
+    return dict((setting.get('id'), setting.get('default', '')) for setting in tree.iter('setting')
+                if setting.get('id'))
+
+
+def load_settings(path):
+    """Return the values of a userdata settings.xml, both the old and the version 2 layout."""
+    settings = {}
+    for setting in ElementTree.parse(path).getroot().iter('setting'):
+        if setting.get('id'):
+            value = setting.get('value')
+            settings[setting.get('id')] = value if value is not None else (setting.text or '')
+    return settings
+
+
+def _load_strings():
+    strings = {}
+    path = os.path.join(ROOT, 'resources', 'language', 'resource.language.en_gb', 'strings.po')
+    with io.open(path, encoding='utf-8') as f:
+        for id, text in re.findall(r'msgctxt "#(\d+)"\s*\nmsgid "(.*)"', f.read()):
+            strings[int(id)] = text.replace('\\"', '"')
+    return strings
+
+
+class Addon(object):
+
+    def __init__(self, id=None):
+        pass
+
+    def getAddonInfo(self, key):
+        return INFO[key]
+
+    def getSetting(self, key):
+        return SETTINGS.get(key, '')
+
+    def getSettingBool(self, key):
+        return SETTINGS.get(key, '') == 'true'
+
+    def getSettingInt(self, key):
+        return int(SETTINGS.get(key) or 0)
+
+    def setSetting(self, key, value):
+        SETTINGS[key] = value
+
+    def getLocalizedString(self, id):
+        global _STRINGS
+        if _STRINGS is None:
+            _STRINGS = _load_strings()
+        return _STRINGS.get(id, '')
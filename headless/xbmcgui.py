@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+"""Kodi's xbmcgui module for the headless runner, dialogs print to the terminal.
+
+Progress goes to stderr, at most once a second, the dry run report to
+stdout. Ctrl-c stands in for the cancel button.
+"""
+
+import json
+import sys
+import time
+
+import xbmc
+
+
+class Window(object):
+    """Window properties of this process, those of Kodi's home window are read from Kodi."""
+    _properties = {}
+
+    def __init__(self, id):
+        self._id = id
+
+    def getProperty(self, key):
+        value = self._properties.get((self._id, key))
+        if value is None and self._id == 10000:
+            # a run of the script or the service inside Kodi holds its lock there
+            request = {'jsonrpc': '2.0', 'method': 'XBMC.GetInfoLabels', 'id': 1,
+                       'params': {'labels': ['Window(Home).Property(%s)' % key]}}
+            labels = json.loads(xbmc.executeJSONRPC(json.dumps(request))).get('result', {})
+            value = labels.get('Window(Home).Property(%s)' % key)
+        return value or ''
+
+    def setProperty(self, key, value):
+        self._properties[(self._id, key)] = value
+
+    def clearProperty(self, key):
+        self._properties.pop((self._id, key), None)
+
+
+class DialogProgress(object):
+
+    def __init__(self):
+        self._heading = ''
+        self._printed = 0.0
+
+    def create(self, heading, message=''):
+        self._heading = heading
+        sys.stderr.write('%s\n' % heading)
+
+    def update(self, percent, message=''):
+        now = time.time()
+        if now - self._printed < 1.0 and percent < 100:
+            return
+        self._printed = now
+        sys.stderr.write('[%3d%%] %s\n' % (percent, ' '.join(message.split())))
+
+    def iscanceled(self):
+        return xbmc.ABORT.is_set()
+
+    def close(self):
+        pass
+
+
+class DialogProgressBG(DialogProgress):
+
+    def isFinished(self):
+        return False
+
+
+class Dialog(object):
+
+    def ok(self, heading, message):
+        sys.stderr.write('%s: %s\n' % (heading, message))
+        return True
+
+    def yesno(self, heading, message, *args, **kwargs):
+        return True
+
+    def notification(self, heading, message, *args, **kwargs):
+        sys.stderr.write('%s: %s\n' % (heading, message))
+
+    def textviewer(self, heading, text, *args, **kwargs):
+        sys.stdout.write('%s\n\n%s\n' % (heading, text))
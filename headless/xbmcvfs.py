@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+
+"""Kodi's xbmcvfs module for the headless runner.
+
+Local paths are files on this machine. Art urls, and any other path with
+a scheme, are read from Kodi's web server (/image/<url>), which serves
+the original of every art url Kodi knows. Only local paths can be
+written, the artwork directory has to be a local or mounted folder.
+"""
+
+import email.utils
+import io
+import json
+import os
+import shutil
+
+try:
+    from urllib.parse import quote
+except ImportError:  # python 2
+    from urllib import quote
+
+import xbmc
+from xbmc import translatePath
+
+# checked by the add-on before a run, kodi only writes it once media sources are added
+SOURCES_FILE = 'special://masterprofile/sources.xml'
+
+
+def _is_remote(path):
+    return '://' in path
+
+
+def _image_path(url):
+    if not url.startswith('image://'):
+        url = 'image://%s/' % quote(url, safe='')
+    return '/image/' + quote(url, safe='')
+
+
+def _fetch(url, method='GET'):
+    status, headers, data = xbmc.WEB.request(method, _image_path(url))
+    if status != 200:
+        raise IOError('%s: HTTP status %s' % (url, status))
+    return headers, data
+
+
+def _has_sources():
+    for media in ('video', 'music'):
+        response = json.loads(xbmc.executeJSONRPC(
+            '{"jsonrpc": "2.0", "method": "Files.GetSources", "params": {"media": "%s"}, "id": 1}' % media))
+        if response.get('result', {}).get('sources'):
+            return True
+    return False
+
+
+def exists(path):
+    if path == SOURCES_FILE:
+        return _has_sources()
+    path = translatePath(path)
+    if _is_remote(path):
+        return Stat(path)._found
+    return os.path.exists(path)
+
+
+def listdir(path):
+    path = translatePath(path)
+    dirs, files = [], []
+    for name in os.listdir(path):
+        if os.path.isdir(os.path.join(path, name)):
+            dirs.append(name)
+        else:
+            files.append(name)
+    return dirs, files
+
+
+def mkdir(path):
+    try:
+        os.mkdir(translatePath(path))
+        return True
+    except OSError:
+        return False
+
+
+def mkdirs(path):
+    try:
+        os.makedirs(translatePath(path))
+        return True
+    except OSError:
+        return False
+
+
+def rmdir(path, force=False):
+    try:
+        if force:
+            shutil.rmtree(translatePath(path))
+        else:
+            os.rmdir(translatePath(path))
+        return True
+    except OSError:
+        return False
+
+
+def copy(source, dest):
+    source = translatePath(source)
+    try:
+        if _is_remote(source):
+            data = _fetch(source)[1]
+            with open(translatePath(dest), 'wb') as f:
+                f.write(data)
+        else:
+            shutil.copyfile(source, translatePath(dest))
+        return True
+    except (IOError, OSError):
+        return False
+
+
+def delete(path):
+    try:
+        os.remove(translatePath(path))
+        return True
+    except OSError:
+        return False
+
+
+def rename(source, dest):
+    try:
+        os.replace(translatePath(source), translatePath(dest))
+        return True
+    except OSError:
+        return False
+
+
+class Stat(object):
+
+    def __init__(self, path):
+        path = translatePath(path)
+        self._found = False
+        self._size = 0
+        self._mtime = 0
+        try:
+            if _is_remote(path):
+                headers = _fetch(path, 'HEAD')[0]
+                self._size = int(headers.get('content-length') or 0)
+                modified = email.utils.parsedate_tz(headers.get('last-modified') or '')
+                if modified is not None:
+                    self._mtime = int(email.utils.mktime_tz(modified))
+            else:
+                stat = os.stat(path)
+                self._size = stat.st_size
+                self._mtime = int(stat.st_mtime)
+            self._found = True
+        except (IOError, OSError):
+            pass
+
+    def st_size(self):
+        return self._size
+
+    def st_mtime(self):
+        return self._mtime
+
+
+class File(object):
+
+    def __init__(self, path, mode='r'):
+        path = translatePath(path)
+        if _is_remote(path):
+            if mode == 'w':
+                raise IOError('%s: only local files can be written' % path)
+            self._file = io.BytesIO(_fetch(path)[1])
+        else:
+            self._file = open(path, 'wb' if mode == 'w' else 'rb')
+
+    def read(self, size=-1):
+        return self.readBytes(size).decode('utf-8')
+
+    def readBytes(self, size=-1):
+        if size and size > 0:
+            return bytearray(self._file.read(size))
+        return bytearray(self._file.read())
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self._file.write(data)
+        return True
+
+    def size(self):
+        position = self._file.tell()
+        size = self._file.seek(0, 2)
+        self._file.seek(position)
+        return size
+
+    def seek(self, offset, whence=0):
+        return self._file.seek(offset, whence)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+
+"""Art type folders written as uncompressed tar bundles.
+
+Writing thousands of small files to a network share costs a few round
+trips for every file. In bundle mode each art type folder is streamed
+into a single tar file instead, written sequentially, next to an index
+with the offset and size of every member so a single image can be read
+without scanning the archive:
+
+    EpisodeThumbs.tar       the first volume
+    EpisodeThumbs.001.tar   members appended by a later incremental run
+    EpisodeThumbs.json      {"volumes": [...], "members": {name: [volume, offset, size]}}
+
+A volume is never rewritten. Incremental runs append the new and changed
+artwork as a new volume and the index points to the latest copy of every
+member, the way appending to a tar file does. Volumes that no member
+refers to anymore are deleted.
+"""
+
+import json
+import os
+import re
+import tarfile
+import threading
+import time
+import xbmcvfs
+
+BLOCK = 512
+INDEX_VERSION = 1
+
+
+def is_bundle_file(filename, names):
+    """True when `filename` is a volume or index of the bundle of one of the folders in `names`."""
+    match = re.match(r'^(.+?)(\.\d{3})?\.tar$', filename) or re.match(r'^(.+)\.json$', filename)
+    return match is not None and match.group(1) in names
+
+
+def _write(f, data):
+    if not f.write(bytearray(data)):
+        raise IOError('write failed')
+
+
+class Bundle(object):
+
+    def __init__(self, directory, name):
+        self.directory = directory
+        self.name = name
+        self.path = os.path.join(directory, name + '.json')
+        # file names of the volumes, None for volumes that were deleted
+        self.volumes = []
+        self.members = {}
+        self.changed = False
+        self._file = None
+        self._offset = 0
+        self._load()
+
+    def _load(self):
+        if not xbmcvfs.exists(self.path):
+            return
+        try:
+            with xbmcvfs.File(self.path) as f:
+                data = json.loads(f.read())
+        except ValueError:
+            return
+        if data.get('version') != INDEX_VERSION:
+            return
+        self.volumes = data['volumes']
+        self.members = data['members']
+
+    def __contains__(self, member):
+        return member in self.members
+
+    def size(self, member):
+        entry = self.members.get(member)
+        return entry[2] if entry is not None else None
+
+    def add(self, member, data):
+        info = tarfile.TarInfo(member)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        # long names are stored in a pax header, the offset points past it to the data
+        header = info.tobuf(tarfile.PAX_FORMAT, 'utf-8', 'surrogateescape')
+        if self._file is None:
+            self._open_volume()
+        offset = self._offset + len(header)
+        padding = -len(data) % BLOCK
+        try:
+            _write(self._file, header)
+            _write(self._file, data)
+            if padding:
+                _write(self._file, b'\0' * padding)
+        except Exception:
+            # the offsets of this volume are unknown from here on, the next member starts a new one
+            self._file.close()
+            self._file = None
+            raise
+        self._offset = offset + len(data) + padding
+        self.members[member] = [len(self.volumes) - 1, offset, len(data)]
+        self.changed = True
+
+    def _open_volume(self):
+        number = len(self.volumes)
+        filename = '%s.tar' % self.name if number == 0 else '%s.%03d.tar' % (self.name, number)
+        self._file = xbmcvfs.File(os.path.join(self.directory, filename), 'w')
+        self._offset = 0
+        self.volumes.append(filename)
+
+    def remove(self, member):
+        if self.members.pop(member, None) is not None:
+            self.changed = True
+
+    def close(self):
+        if self._file is not None:
+            # end of archive marker
+            try:
+                _write(self._file, b'\0' * (2 * BLOCK))
+            finally:
+                self._file.close()
+                self._file = None
+        if not self.changed:
+            return
+        used = set(entry[0] for entry in self.members.values())
+        for number, filename in enumerate(self.volumes):
+            if filename is not None and number not in used:
+                xbmcvfs.delete(os.path.join(self.directory, filename))
+                self.volumes[number] = None
+        with xbmcvfs.File(self.path, 'w') as f:
+            f.write(json.dumps({'version': INDEX_VERSION, 'volumes': self.volumes, 'members': self.members}))
+        self.changed = False
+
+
+class BundleWriter(object):
+    """The bundles of the art type folders in `directory`, addressed by the
+    paths the artwork files would have had."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.bundles = {}
+        self.added = 0
+        self._lock = threading.Lock()
+
+    def _find(self, dest):
+        # <directory>/<art type folder>/<member>, members of split sources keep their subfolder
+        parts = re.split(r'[/\\]', dest[len(self.directory):].lstrip('/\\'))
+        name = parts[0]
+        if name not in self.bundles:
+            self.bundles[name] = Bundle(self.directory, name)
+        return self.bundles[name], '/'.join(parts[1:])
+
+    def __contains__(self, dest):
+        with self._lock:
+            bundle, member = self._find(dest)
+            return member in bundle
+
+    def size(self, dest):
+        with self._lock:
+            bundle, member = self._find(dest)
+            return bundle.size(member)
+
+    def add(self, dest, data):
+        # the copy workers share the volumes, they are written one member at a time
+        with self._lock:
+            bundle, member = self._find(dest)
+            bundle.add(member, data)
+            self.added += 1
+
+    def remove(self, dest):
+        with self._lock:
+            bundle, member = self._find(dest)
+            bundle.remove(member)
+        return True
+
+    def close(self):
+        with self._lock:
+            for bundle in self.bundles.values():
+                bundle.close()
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+"""Bounded pool of copy workers fed through a work queue.
+
+Copies to network shares are mostly latency bound, so several copies are
+kept in flight at once. The number of concurrent copies is limited per
+destination scheme (local paths, smb://, nfs://, ...).
+"""
+
+import threading
+
+try:  # Kodi v19 or newer
+    import queue
+except ImportError:  # Kodi v18 and older
+    import Queue as queue
+
+from lib.library import log
+
+COPIED = 0
+UNCHANGED = 1
+FAILED = 2
+
+
+def destination_scheme(path):
+    if '://' not in path:
+        return 'local'
+    return path.split('://', 1)[0].lower()
+
+
+class CopyEngine(object):
+
+    def __init__(self, copy, limits, is_canceled, queue_size=256, failed=None):
+        """
+        `copy` is called in a worker thread with the arguments of a job and
+        returns False when the destination was already up to date. `limits`
+        maps destination schemes to their number of concurrent copies,
+        schemes without a limit of their own are copied one at a time.
+        `is_canceled` is polled from the calling thread only. `failed` is
+        called in the worker thread with the key, the arguments and the
+        exception of a copy that failed.
+        """
+        self._copy = copy
+        self._failed = failed
+        self._is_canceled = is_canceled
+        self._queue = queue.Queue(queue_size)
+        self._semaphores = dict((scheme, threading.Semaphore(limit)) for scheme, limit in limits.items())
+        self._default_semaphore = threading.Semaphore(1)
+        self._canceled = threading.Event()
+        self._lock = threading.Lock()
+        self._results = {}
+        self._threads = []
+        for i in range(max([1] + list(limits.values()))):
+            thread = threading.Thread(target=self._work, name='artworkorganizer-copy-%d' % i)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                self._queue.task_done()
+                return
+            key, dest, args = job
+            try:
+                if not self._canceled.is_set():
+                    self._run(key, dest, args)
+            finally:
+                # wait() would never return for a job that isn't marked done
+                self._queue.task_done()
+
+    def _run(self, key, dest, args):
+        semaphore = self._semaphores.get(destination_scheme(dest), self._default_semaphore)
+        with semaphore:
+            try:
+                outcome = COPIED if self._copy(*args) else UNCHANGED
+            except Exception as e:
+                log('failed to copy %s: %s' % (key, e))
+                outcome = FAILED
+                if self._failed is not None:
+                    try:
+                        self._failed(key, args, e)
+                    except Exception as e:
+                        log('failed to record the failed copy %s: %s' % (key, e))
+        with self._lock:
+            self._results.setdefault(key, [0, 0, 0])[outcome] += 1
+
+    @property
+    def cancel_event(self):
+        """Set once the run is canceled, worker threads wait on it instead of polling `is_canceled`."""
+        return self._canceled
+
+    def canceled(self):
+        if not self._canceled.is_set() and self._is_canceled():
+            self._canceled.set()
+        return self._canceled.is_set()
+
+    def submit(self, key, dest, *args):
+        """Queue a copy to `dest`, counted under `key`. Returns False once canceled."""
+        while not self.canceled():
+            try:
+                self._queue.put((key, dest, args), timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def wait(self):
+        """Wait until every queued copy is done. Returns False if the run was canceled."""
+        all_tasks_done = self._queue.all_tasks_done
+        while True:
+            with all_tasks_done:
+                if not self._queue.unfinished_tasks:
+                    break
+                all_tasks_done.wait(0.1)
+            # pending copies are skipped by the workers from now on
+            self.canceled()
+        return not self.canceled()
+
+    def results(self, key):
+        """Return the (copied, unchanged, failed) counts of `key`."""
+        with self._lock:
+            return tuple(self._results.get(key, [0, 0, 0]))
+
+    def close(self):
+        for thread in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
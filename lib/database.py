@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+
+"""Read library items straight from Kodi's SQLite databases.
+
+Building the JSON of a large library and parsing it again is the slowest
+part of a run. When the video and music databases are local SQLite files
+they are read directly instead, read-only, page by page, with the art of
+a whole page fetched from the art table in a few queries. The items have
+the same fields as the JSON-RPC responses. Setups that share a MySQL
+database, and queries the databases can't answer, use JSON-RPC.
+"""
+
+import os
+import re
+import sqlite3
+import xml.etree.ElementTree as ElementTree
+import xbmc
+
+try:  # Kodi v19 or newer
+    from xbmcvfs import translatePath
+    from urllib.request import pathname2url
+except ImportError:  # Kodi v18 and older
+    from xbmc import translatePath
+    from urllib import pathname2url
+
+from lib.library import PAGE_SIZE, LibraryError, LibraryQuery, get_seasons, log
+
+VIDEO = 'video'
+MUSIC = 'music'
+DATABASES = ((VIDEO, 'MyVideos'), (MUSIC, 'MyMusic'))
+# ids bound per art query, sqlite before 3.32 allows 999 variables per statement
+ART_IDS = 900
+
+
+def find_database(name):
+    # the newest database version is the one in use
+    database_dir = translatePath('special://database')
+    pattern = re.compile(r'^%s(\d+)\.db$' % name)
+    versions = []
+    if os.path.isdir(database_dir):
+        for filename in os.listdir(database_dir):
+            match = pattern.match(filename)
+            if match:
+                versions.append((int(match.group(1)), filename))
+    if not versions:
+        return None
+    return os.path.join(database_dir, max(versions)[1])
+
+
+def connect(path):
+    # read-only, Kodi may write to the database while we read it. The path is quoted,
+    # a ? # or % in it is part of the file name and windows drive letters become a valid uri
+    return sqlite3.connect('file:%s?mode=ro' % pathname2url(path), uri=True, check_same_thread=False)
+
+
+def uses_mysql(database):
+    """True when advancedsettings.xml moves the `database` library to a MySQL server."""
+    path = translatePath('special://userdata/advancedsettings.xml')
+    if not os.path.exists(path):
+        return False
+    try:
+        root = ElementTree.parse(path).getroot()
+    except ElementTree.ParseError:
+        return False
+    return (root.findtext('%sdatabase/type' % database) or '').strip().lower() == 'mysql'
+
+
+def _file(path, filename):
+    # stacks hold the full paths of their parts
+    if filename.startswith('stack://'):
+        return filename
+    return (path or '') + filename
+
+
+def _year(premiered):
+    try:
+        return int(premiered[:4])
+    except (TypeError, ValueError):
+        return 0
+
+
+def _artists(artist):
+    return [name for name in (artist or '').split(' / ') if name]
+
+
+def _movie(row):
+    id, title, premiered, path, filename = row
+    return {'movieid': id, 'label': title, 'title': title, 'year': _year(premiered), 'file': _file(path, filename)}
+
+
+def _tvshow(row):
+    id, title, path = row
+    return {'tvshowid': id, 'label': title, 'title': title, 'file': path}
+
+
+def _episode(row):
+    id, title, season, episode, showtitle, tvshowid, path, filename = row
+    return {'episodeid': id, 'label': title, 'title': title, 'season': int(season or 0), 'episode': int(episode or 0),
+            'showtitle': showtitle, 'tvshowid': tvshowid, 'file': _file(path, filename)}
+
+
+def _musicvideo(row):
+    id, title, artist, path, filename = row
+    return {'musicvideoid': id, 'label': title, 'title': title, 'artist': _artists(artist), 'file': _file(path, filename)}
+
+
+def _artist(row):
+    id, artist = row
+    return {'artistid': id, 'label': artist, 'artist': artist}
+
+
+def _album(row):
+    id, title, artist = row
+    return {'albumid': id, 'label': title, 'title': title, 'artist': [artist] if artist else []}
+
+
+class Table(object):
+    __slots__ = ('database', 'media_type', 'view', 'id', 'columns', 'fields', 'to_item')
+
+    def __init__(self, database, media_type, view, id, columns, fields, to_item):
+        self.database = database
+        self.media_type = media_type
+        self.view = view
+        self.id = id
+        self.columns = columns
+        # JSON-RPC filter fields and the columns they are applied to
+        self.fields = fields
+        self.to_item = to_item
+
+
+VIDEO_FIELDS = {'path': 'strPath', 'dateadded': 'dateAdded'}
+MUSIC_FIELDS = {'dateadded': 'dateAdded', 'datemodified': 'dateModified'}
+
+TABLES = {
+    'VideoLibrary.GetMovies': Table(VIDEO, 'movie', 'movie_view', 'idMovie',
+                                    'c00, premiered, strPath, strFileName', VIDEO_FIELDS, _movie),
+    'VideoLibrary.GetTVShows': Table(VIDEO, 'tvshow', 'tvshow_view', 'idShow',
+                                     'c00, strPath', VIDEO_FIELDS, _tvshow),
+    'VideoLibrary.GetEpisodes': Table(VIDEO, 'episode', 'episode_view', 'idEpisode',
+                                      'c00, c12, c13, strTitle, idShow, strPath, strFileName', VIDEO_FIELDS, _episode),
+    'VideoLibrary.GetMusicVideos': Table(VIDEO, 'musicvideo', 'musicvideo_view', 'idMVideo',
+                                         'c00, c10, strPath, strFileName', VIDEO_FIELDS, _musicvideo),
+    'AudioLibrary.GetArtists': Table(MUSIC, 'artist', 'artist', 'idArtist',
+                                     'strArtist', MUSIC_FIELDS, _artist),
+    'AudioLibrary.GetAlbums': Table(MUSIC, 'album', 'album', 'idAlbum',
+                                    'strAlbum, (SELECT strArtist FROM album_artist WHERE album_artist.idAlbum = album.idAlbum '
+                                    'ORDER BY iOrder LIMIT 1)', MUSIC_FIELDS, _album),
+}
+
+
+def _where(table, rule):
+    """Translate a JSON-RPC filter into an SQL condition and its arguments."""
+    if rule is None:
+        return '1', []
+    for operator in ('and', 'or'):
+        if operator in rule:
+            conditions = [_where(table, subrule) for subrule in rule[operator]]
+            sql = (' %s ' % operator.upper()).join(condition for condition, args in conditions)
+            return '(%s)' % sql, [arg for condition, args in conditions for arg in args]
+    column = table.fields.get(rule['field'])
+    if column is None:
+        raise LibraryError('no %s column to filter %s on' % (rule['field'], table.view))
+    if rule['operator'] == 'contains':
+        return 'instr(%s, ?) > 0' % column, [rule['value']]
+    if rule['operator'] == 'greaterthan':
+        return '%s > ?' % column, [rule['value']]
+    raise LibraryError('unsupported filter operator %s' % rule['operator'])
+
+
+def _add_art(item, art):
+    # the fields JSON-RPC fills from the art of an item
+    item['art'] = art
+    item['fanart'] = art.get('fanart', '')
+    item['thumbnail'] = art.get('thumb') or art.get('poster', '')
+    return item
+
+
+def _get_art(connection, media_type, ids):
+    art = dict((id, {}) for id in ids)
+    ids = list(ids)
+    for start in range(0, len(ids), ART_IDS):
+        chunk = ids[start:start + ART_IDS]
+        sql = 'SELECT media_id, type, url FROM art WHERE media_type = ? AND media_id IN (%s)' % ','.join('?' * len(chunk))
+        for media_id, arttype, url in connection.execute(sql, [media_type] + chunk):
+            art[media_id][arttype] = wrap_image_url(url)
+    return art
+
+
+def wrap_image_url(url):
+    """Return the image:// url JSON-RPC reports for the art url `url`."""
+    if not url or url.startswith('image://'):
+        return url
+    # the same encoding as Kodi's CURL::Encode
+    encoded = ''.join(chr(byte) if chr(byte).isalnum() and byte < 128 or chr(byte) in '-_.!()~' else '%%%02x' % byte
+                      for byte in bytearray(url.encode('utf-8')))
+    return 'image://%s/' % encoded
+
+
+class DatabaseQuery(object):
+    """Items of a table, read page by page like a LibraryQuery."""
+
+    def __init__(self, connection, table, rule, page_size=PAGE_SIZE, convert=None, fallback=None):
+        # fallback returns the query to read instead when the first page fails
+        self._connection = connection
+        self._table = table
+        self._fallback = fallback
+        self._where, self._args = _where(table, rule)
+        self._page_size = page_size
+        self._convert = convert
+        try:
+            self._total = connection.execute('SELECT COUNT(*) FROM %s WHERE %s' % (table.view, self._where),
+                                             self._args).fetchone()[0]
+        except sqlite3.Error as e:
+            raise LibraryError('%s: %s' % (table.view, e))
+
+    def __len__(self):
+        return self._total
+
+    def __iter__(self):
+        table = self._table
+        sql = 'SELECT %s, %s FROM %s WHERE %s AND %s > ? ORDER BY %s LIMIT ?' % (
+            table.id, table.columns, table.view, self._where, table.id, table.id)
+        last = -1
+        while True:
+            try:
+                rows = self._connection.execute(sql, self._args + [last, self._page_size]).fetchall()
+                if not rows:
+                    return
+                art = _get_art(self._connection, table.media_type, [row[0] for row in rows])
+            except sqlite3.Error as e:
+                if last == -1 and self._fallback is not None:
+                    log('database query failed, using JSON-RPC: %s: %s' % (table.view, e))
+                    for item in self._fallback():
+                        yield item
+                    return
+                raise LibraryError('%s: %s' % (table.view, e))
+            for row in rows:
+                item = _add_art(table.to_item(row), art[row[0]])
+                yield self._convert(item) if self._convert is not None else item
+            last = rows[-1][0]
+
+
+class DatabaseBackend(object):
+    """Library items read from the local databases, JSON-RPC for everything else."""
+    name = 'database'
+
+    def __init__(self, connections):
+        self._connections = connections
+
+    def query(self, method, result, params, page_size=PAGE_SIZE, convert=None):
+        table = TABLES.get(method)
+        connection = self._connections.get(table.database) if table is not None else None
+        if connection is not None:
+            try:
+                return DatabaseQuery(connection, table, params.get('filter'), page_size, convert,
+                                     fallback=lambda: LibraryQuery(method, result, params, page_size, convert))
+            except LibraryError as e:
+                log('database query failed, using JSON-RPC: %s' % e)
+        return LibraryQuery(method, result, params, page_size, convert)
+
+    def get_seasons(self, tvshowids, properties, all_shows=True):
+        connection = self._connections.get(VIDEO)
+        if connection is not None and tvshowids:
+            try:
+                return self._get_seasons(connection, tvshowids)
+            except sqlite3.Error as e:
+                log('database query failed, using JSON-RPC: %s' % e)
+        return get_seasons(tvshowids, properties, all_shows)
+
+    def _get_seasons(self, connection, tvshowids):
+        seasons = dict((tvshowid, []) for tvshowid in tvshowids)
+        # season -1 holds the art shared by all seasons, JSON-RPC doesn't list it
+        rows = connection.execute('SELECT idSeason, idShow, season, name, showTitle FROM season_view '
+                                  'WHERE season >= 0 ORDER BY idShow, season').fetchall()
+        rows = [row for row in rows if row[1] in seasons]
+        art = _get_art(connection, 'season', [row[0] for row in rows])
+        for id, tvshowid, season, name, showtitle in rows:
+            if not name:
+                name = xbmc.getLocalizedString(20381) if season == 0 else xbmc.getLocalizedString(20358) % season
+            item = {'seasonid': id, 'tvshowid': tvshowid, 'season': season, 'label': name, 'showtitle': showtitle}
+            seasons[tvshowid].append(_add_art(item, art[id]))
+        return seasons
+
+    def close(self):
+        for connection in self._connections.values():
+            connection.close()
+        self._connections = {}
+
+
+def open_backend():
+    """Return a DatabaseBackend for the local databases, or None when none can be read."""
+    connections = {}
+    for database, name in DATABASES:
+        if uses_mysql(database):
+            log('%s library is stored in MySQL, using JSON-RPC' % database)
+            continue
+        path = find_database(name)
+        if path is None:
+            continue
+        try:
+            connection = connect(path)
+            connection.execute('SELECT 1 FROM art LIMIT 1').fetchall()
+        except sqlite3.Error as e:
+            log('failed to open %s: %s' % (path, e))
+            continue
+        connections[database] = connection
+    if not connections:
+        return None
+    return DatabaseBackend(connections)
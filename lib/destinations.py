@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+"""Destinations a run copies the artwork to.
+
+The artwork directory of the settings is the first destination. Further
+destinations are listed in destinations.json in the profile folder, each
+with its own art types and layout:
+
+    [{"directory": "/mnt/nas/backup/artwork",
+      "arttypes": ["moviefanart", "movieposters", "tvshowposters"],
+      "split_movies_sources": true,
+      "split_tvshows_sources": false,
+      "normalize_names": true}]
+
+Options that are left out are those of the artwork directory. The library
+is queried once for all destinations and each item is planned to every
+destination that copies its art type. The copies to each destination are
+separate jobs, copied in parallel within the limits of its scheme, while
+an image that has to be read into memory (downloaded, resized, read from
+a share) is read once for all of them.
+"""
+
+import json
+import os
+import threading
+import xbmcvfs
+
+from lib.library import log
+
+
+def _as_bool(value):
+    # the settings of the artwork directory are 'true' and 'false' strings
+    return value is True or value == 'true'
+
+
+def load_destinations(path):
+    """Return the options of the destinations listed in `path`, [] without any."""
+    if not xbmcvfs.exists(path):
+        return []
+    try:
+        with xbmcvfs.File(path) as f:
+            destinations = json.loads(f.read())
+    except ValueError as e:
+        log('failed to read %s: %s' % (path, e))
+        return []
+    if not isinstance(destinations, list):
+        log('%s has to be a list of destinations' % path)
+        return []
+    options = []
+    for destination in destinations:
+        if not isinstance(destination, dict) or not destination.get('directory'):
+            log('destination without a directory skipped: %s' % (destination,))
+            continue
+        options.append(destination)
+    return options
+
+
+class Destination(object):
+
+    def __init__(self, directory, arttypes, folders, split=(), normalize_names=False):
+        """
+        `arttypes` are the art types copied to `directory`, `folders` maps
+        them to the name of their folder and `split` are the art types
+        split into a folder per media source.
+        """
+        self.directory = directory
+        self.arttypes = set(arttypes)
+        self.folders = dict((arttype, os.path.join(directory, folders[arttype])) for arttype in self.arttypes)
+        self.split = set(split)
+        self.normalize_names = normalize_names
+
+    @classmethod
+    def from_options(cls, options, defaults, folders, split_arttypes):
+        """Build a destination from destinations.json, options it leaves out are taken from `defaults`.
+
+        `split_arttypes` returns the art types split by source for the
+        split_movies_sources and split_tvshows_sources options."""
+        def option(name):
+            return _as_bool(options.get(name, defaults[name]))
+        arttypes = [arttype for arttype in options.get('arttypes', defaults['arttypes']) if arttype in folders]
+        split = split_arttypes(option('split_movies_sources'), option('split_tvshows_sources'))
+        return cls(options['directory'], arttypes, folders, split, option('normalize_names'))
+
+    def contains(self, path):
+        return path.startswith(os.path.join(self.directory, ''))
+
+    def overlaps(self, other):
+        return self.directory == other.directory or self.contains(other.directory) or other.contains(self.directory)
+
+    def describe(self):
+        """The options of this destination, saved with the manifest."""
+        return {'directory': self.directory, 'arttypes': sorted(self.arttypes), 'split': sorted(self.split),
+                'normalize_names': self.normalize_names}
+
+
+class SharedReads(object):
+    """Images read into memory once for all the destinations they are copied to."""
+
+    def __init__(self):
+        self.reads = 0
+        self.shared = 0
+        self._lock = threading.Lock()
+        # key: [targets still to copy, lock of the read, data]
+        self._entries = {}
+
+    def expect(self, key, targets):
+        """Announce `targets` copies of the image `key`, before they are queued."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._entries[key] = [targets, threading.Lock(), None]
+            else:
+                entry[0] += targets
+
+    def is_shared(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def read(self, key, read):
+        """Return the data of `key`, the first target reads it with `read()`.
+
+        A result of None isn't kept, the next target reads it again."""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return read()
+        with entry[1]:
+            if entry[2] is not None:
+                with self._lock:
+                    self.shared += 1
+                return entry[2]
+            data = read()
+            entry[2] = data
+            with self._lock:
+                self.reads += 1
+            return data
+
+    def release(self, key):
+        """A target of `key` is done, the data is dropped after the last one."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry[0] -= 1
+            if entry[0] <= 0:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+
+"""Copy artwork files without going through Kodi's VFS where possible.
+
+xbmcvfs.copy reads and writes through Kodi's VFS in small blocks. When
+both the artwork and its destination are plain paths on this machine,
+local disks or mounted shares, the kernel copies the data itself with
+copy_file_range (which clones on filesystems that support it) or
+sendfile, without passing it through Python. Anything else, an smb://
+destination or a source Kodi has to fetch, is copied through
+xbmcvfs.File in large blocks.
+
+Every copy is written to a temporary file next to the destination and
+renamed over it, an interrupted copy never leaves a partial image and a
+link left by an earlier run is replaced instead of written through.
+Copies to a local or mounted path keep the modification time of the
+original. Kodi can't set the time of a file on an smb:// or nfs:// share,
+there incremental runs rely on the size and time of the original they
+keep in the manifest, not on the copy.
+"""
+
+import errno
+import os
+import threading
+import xbmcvfs
+
+try:  # Kodi v19 or newer
+    from xbmcvfs import translatePath
+except ImportError:  # Kodi v18 and older
+    from xbmc import translatePath
+
+# bytes per read and write of a buffered copy
+CHUNK_SIZE = 1024 * 1024
+
+# errors of copy_file_range and sendfile for files they can't copy, across filesystems on
+# older kernels, filesystems without support, sendfile to a file outside linux, ...
+UNSUPPORTED = set(getattr(errno, name) for name in ('EXDEV', 'EINVAL', 'ENOSYS', 'EOPNOTSUPP', 'ENOTSUP', 'ENOTSOCK', 'EBADF')
+                  if hasattr(errno, name))
+
+
+def is_local(path):
+    return '://' not in path and os.path.isabs(path)
+
+
+class FileCopier(object):
+
+    def __init__(self, chunk_size=CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        # copies per method, zero copy is copy_file_range or sendfile
+        self.zero_copy = 0
+        self.buffered = 0
+        self.vfs = 0
+        self._kernel = hasattr(os, 'copy_file_range') or hasattr(os, 'sendfile')
+        self._lock = threading.Lock()
+
+    def copy(self, source, dest):
+        """Copy the file at `source` to `dest` and return its size, raises IOError when it fails."""
+        tmp = '%s.%s.tmp' % (dest, threading.current_thread().ident)
+        if is_local(source) and is_local(dest):
+            return self._copy_local(source, dest, tmp)
+        return self._copy_vfs(source, dest, tmp)
+
+    def _copy_local(self, source, dest, tmp):
+        try:
+            with open(source, 'rb') as src:
+                stat = os.fstat(src.fileno())
+                with open(tmp, 'wb') as dst:
+                    counter = 'buffered'
+                    size = stat.st_size
+                    if self._kernel and self._kernel_copy(src.fileno(), dst.fileno(), size):
+                        counter = 'zero_copy'
+                    else:
+                        # the kernel copy may have stopped part way, start over
+                        src.seek(0)
+                        dst.seek(0)
+                        dst.truncate()
+                        size = self._copy_chunks(src.read, dst.write)
+            os.utime(tmp, (stat.st_atime, stat.st_mtime))
+            os.replace(tmp, dest)
+        except (IOError, OSError):
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self._count(counter)
+        return size
+
+    def _kernel_copy(self, src, dst, size):
+        # False when neither call works for these files, other errors are raised
+        for name in ('copy_file_range', 'sendfile'):
+            call = getattr(os, name, None)
+            if call is None:
+                continue
+            copied = 0
+            try:
+                while copied < size:
+                    if name == 'copy_file_range':
+                        count = call(src, dst, size - copied)
+                    else:
+                        count = call(dst, src, copied, size - copied)
+                    if count == 0:
+                        break
+                    copied += count
+            except OSError as e:
+                if copied or e.errno not in UNSUPPORTED:
+                    raise
+                continue
+            if copied == size:
+                return True
+            # the file changed while it was copied
+            return False
+        return False
+
+    def _copy_vfs(self, source, dest, tmp):
+        src = xbmcvfs.File(source)
+        try:
+            dst = xbmcvfs.File(tmp, 'w')
+            try:
+                size = self._copy_chunks(lambda count: bytes(src.readBytes(count)), lambda data: self._write(dst, data))
+                if not size:
+                    # a source kodi can't read looks like an empty file
+                    raise IOError('empty or unreadable artwork')
+            finally:
+                dst.close()
+        except Exception:
+            xbmcvfs.delete(tmp)
+            raise
+        finally:
+            src.close()
+        self._keep_mtime(source, tmp)
+        # a share may refuse to rename over an existing file
+        if not xbmcvfs.rename(tmp, dest):
+            xbmcvfs.delete(dest)
+            if not xbmcvfs.rename(tmp, dest):
+                xbmcvfs.delete(tmp)
+                raise IOError('rename failed')
+        self._count('vfs')
+        return size
+
+    def _keep_mtime(self, source, tmp):
+        # only possible when the copy is a file on this machine, special:// paths included
+        path = translatePath(tmp)
+        if not is_local(path):
+            return
+        mtime = xbmcvfs.Stat(source).st_mtime()
+        if mtime:
+            try:
+                os.utime(path, (mtime, mtime))
+            except OSError:
+                pass
+
+    def _write(self, f, data):
+        if not f.write(bytearray(data)):
+            raise IOError('write failed')
+
+    def _copy_chunks(self, read, write):
+        # returns the number of bytes copied
+        copied = 0
+        while True:
+            data = read(self.chunk_size)
+            if not data:
+                return copied
+            write(data)
+            copied += len(data)
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+
+"""Fetch remote artwork over pooled HTTP connections.
+
+Scraped artwork that isn't in the texture cache is an http(s) url, Kodi
+opens a new connection for every file and downloads it again on every
+run. The fetcher keeps idle connections per host for the copy workers to
+reuse, limits the requests in flight per host and retries failed
+requests with a growing delay.
+
+The ETag and Last-Modified header of every downloaded image are kept per
+destination file. A later run sends them along and the server answers
+304 Not Modified for images that didn't change, which aren't downloaded
+again. They are only sent while the destination file exists and was
+written from the same url and output profile.
+"""
+
+import json
+import threading
+import xbmcvfs
+
+try:  # Kodi v19 or newer
+    import http.client as httplib
+    from urllib.parse import unquote_plus, urljoin, urlsplit
+except ImportError:  # Kodi v18 and older
+    import httplib
+    from urllib import unquote_plus
+    from urlparse import urljoin, urlsplit
+
+from lib.library import log
+from lib.texturecache import unwrap_image_url
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+REDIRECT_STATUS = (301, 302, 303, 307, 308)
+MAX_REDIRECTS = 5
+# longest a retry waits, also for servers asking for a longer Retry-After
+MAX_BACKOFF = 30.0
+
+
+class FetchError(IOError):
+    pass
+
+
+def remote_url(source):
+    """Return the http(s) url of an art url, or None when it isn't remote."""
+    url = unwrap_image_url(source)
+    if url.startswith('http://') or url.startswith('https://'):
+        return url
+    return None
+
+
+def _split_options(url):
+    # kodi urls carry request headers after a |, url|User-Agent=...&Referer=...
+    url, _, options = url.partition('|')
+    headers = {}
+    for option in options.split('&') if options else []:
+        name, _, value = option.partition('=')
+        if name:
+            headers[unquote_plus(name)] = unquote_plus(value)
+    return url, headers
+
+
+class HostPool(object):
+
+    def __init__(self, scheme, netloc, connections, timeout):
+        self.scheme = scheme
+        self.netloc = netloc
+        self.timeout = timeout
+        self.slots = threading.Semaphore(connections)
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Return an idle connection or a new one, and whether it was used before."""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        if self.scheme == 'https':
+            return httplib.HTTPSConnection(self.netloc, timeout=self.timeout), False
+        return httplib.HTTPConnection(self.netloc, timeout=self.timeout), False
+
+    def put(self, connection):
+        with self._lock:
+            self._idle.append(connection)
+
+    def close(self):
+        with self._lock:
+            for connection in self._idle:
+                connection.close()
+            self._idle = []
+
+
+class Fetcher(object):
+
+    def __init__(self, path, connections=4, retries=3, backoff=0.5, timeout=30, user_agent=None, canceled=None):
+        """
+        `path` is the file the validators are kept in, `connections` the
+        number of requests in flight per host. Failed requests are tried
+        `retries` more times, after `backoff` seconds, doubled every time.
+        `canceled` is the threading.Event of the copy engine, a retry
+        waiting for its turn gives up once it is set.
+        """
+        self.path = path
+        self.connections = connections
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.user_agent = user_agent
+        self.canceled = canceled or threading.Event()
+        self.downloaded = 0
+        self.not_modified = 0
+        self.retried = 0
+        self._pools = {}
+        self._lock = threading.Lock()
+        # dest: [url, etag, last modified, tag]
+        self.validators = {}
+        if xbmcvfs.exists(self.path):
+            try:
+                with xbmcvfs.File(self.path) as f:
+                    self.validators = json.loads(f.read())
+            except ValueError:
+                pass
+
+    def fetch(self, url, dest, tag=None, conditional=True):
+        """Download `url`, return (data, validator), or (None, None) when the
+        image at `dest` is still current. `tag` tells apart the outputs of the
+        same url, the resize profile for instance, and `conditional` is False
+        when `dest` doesn't exist."""
+        headers = {}
+        validator = self.validators.get(dest)
+        if conditional and validator is not None and validator[0] == url and validator[3] == tag:
+            if validator[1]:
+                headers['If-None-Match'] = validator[1]
+            if validator[2]:
+                headers['If-Modified-Since'] = validator[2]
+        status, response_headers, data = self._request(url, headers)
+        if status == 304:
+            with self._lock:
+                self.not_modified += 1
+            return None, None
+        if status != 200:
+            raise FetchError('HTTP status %s' % status)
+        with self._lock:
+            self.downloaded += 1
+        return data, [url, response_headers.get('etag'), response_headers.get('last-modified'), tag]
+
+    def remember(self, dest, validator):
+        """Keep the validator of the image written to `dest`, called once it is written."""
+        if validator[1] or validator[2]:
+            self.validators[dest] = validator
+        else:
+            self.validators.pop(dest, None)
+
+    def forget(self, dest):
+        self.validators.pop(dest, None)
+
+    def _request(self, url, headers):
+        url, options = _split_options(url)
+        options.update(headers)
+        headers = options
+        if self.user_agent and 'User-Agent' not in headers:
+            headers['User-Agent'] = self.user_agent
+        for redirect in range(MAX_REDIRECTS + 1):
+            status, response_headers, data = self._send(url, headers)
+            if status not in REDIRECT_STATUS or not response_headers.get('location'):
+                return status, response_headers, data
+            url = urljoin(url, response_headers['location'])
+        raise FetchError('too many redirects')
+
+    def _send(self, url, headers):
+        parts = urlsplit(url)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        pool = self._pool(parts.scheme, parts.netloc)
+        attempt = 0
+        while True:
+            error = None
+            with pool.slots:
+                connection, reused = pool.get()
+                try:
+                    connection.request('GET', path, headers=headers)
+                    response = connection.getresponse()
+                    data = response.read()
+                except (httplib.HTTPException, IOError) as e:
+                    connection.close()
+                    if reused:
+                        # the server closed the idle connection meanwhile, not a failed attempt
+                        continue
+                    error = e
+                else:
+                    if response.will_close:
+                        connection.close()
+                    else:
+                        pool.put(connection)
+                    response_headers = dict((name.lower(), value) for name, value in response.getheaders())
+                    if response.status not in RETRY_STATUS:
+                        return response.status, response_headers, data
+                    error = FetchError('HTTP status %s' % response.status)
+            if attempt >= self.retries or self.canceled.is_set():
+                raise error
+            delay = self.backoff * 2 ** attempt
+            if isinstance(error, FetchError):
+                delay = max(delay, self._retry_after(response_headers))
+            attempt += 1
+            with self._lock:
+                self.retried += 1
+            log('retrying %s in %.1fs: %s' % (url, min(delay, MAX_BACKOFF), error))
+            if self.canceled.wait(min(delay, MAX_BACKOFF)):
+                raise error
+
+    def _retry_after(self, headers):
+        try:
+            return float(headers.get('retry-after') or 0)
+        except ValueError:
+            # an http date, the regular backoff applies
+            return 0
+
+    def _pool(self, scheme, netloc):
+        key = (scheme, netloc)
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = self._pools[key] = HostPool(scheme, netloc, self.connections, self.timeout)
+            return pool
+
+    def save(self):
+        with xbmcvfs.File(self.path, 'w') as f:
+            f.write(json.dumps(self.validators))
+
+    def close(self):
+        with self._lock:
+            for pool in self._pools.values():
+                pool.close()
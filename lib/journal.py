@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+"""Checkpoint journal of a run and ledger of the artwork that failed to copy.
+
+The journal is appended to while a run copies artwork, one line per
+copied file and one per completed art type, and removed when the run
+finishes. A journal that is still there belongs to a run that was
+cancelled or interrupted, the next run resumes from it instead of
+starting over.
+
+The ledger keeps every file that failed to copy, with the reason, until
+a later run copies it. A retry run only copies the files in the ledger.
+"""
+
+import json
+import os
+import threading
+import time
+import xbmcvfs
+
+# journal lines written between syncs to disk, every line is flushed right away
+SYNC_INTERVAL = 500
+
+
+class Journal(object):
+
+    def __init__(self, path, directory):
+        self.path = path
+        self.directory = directory
+        # files copied and art types completed by the interrupted run
+        self.copied = {}
+        self.completed = set()
+        self._lock = threading.Lock()
+        self._file = None
+        self._unsynced = 0
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            records = []
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # the last line of a run that was killed can be incomplete
+                    continue
+        if not records or records[0].get('directory') != self.directory:
+            # the interrupted run copied to another destination, start over
+            os.remove(self.path)
+            return
+        for record in records[1:]:
+            if 'completed' in record:
+                self.completed.add(record['completed'])
+            else:
+                self.copied[record.pop('dest')] = record
+
+    @property
+    def resumed(self):
+        return bool(self.copied or self.completed)
+
+    def _write(self, record, sync=False):
+        with self._lock:
+            if self._file is None:
+                new = not os.path.exists(self.path)
+                # appended to, a run that is interrupted again keeps what it resumed from
+                self._file = open(self.path, 'a')
+                if new:
+                    self._file.write(json.dumps({'directory': self.directory}) + '\n')
+            self._file.write(json.dumps(record) + '\n')
+            self._file.flush()
+            self._unsynced += 1
+            if sync or self._unsynced >= SYNC_INTERVAL:
+                os.fsync(self._file.fileno())
+                self._unsynced = 0
+
+    def copy_done(self, dest, entry):
+        record = dict(entry)
+        record['dest'] = dest
+        self._write(record)
+
+    def arttype_done(self, arttype):
+        self._write({'completed': arttype}, sync=True)
+
+    def close(self, finished):
+        """Close the journal, a finished run removes it."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        if finished and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class FailureLedger(object):
+    # failed() and succeeded() are called from the copy workers, they only
+    # do single dict operations which are atomic in CPython
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if xbmcvfs.exists(self.path):
+            try:
+                with xbmcvfs.File(self.path) as f:
+                    self.entries = json.loads(f.read())
+            except ValueError:
+                pass
+
+    def failed(self, dest, arttype, artwork, item, reason):
+        attempts = self.entries.get(dest, {}).get('attempts', 0)
+        self.entries[dest] = {'type': arttype, 'artwork': artwork, 'item': item, 'reason': reason,
+                              'attempts': attempts + 1, 'time': time.time()}
+
+    def succeeded(self, dest):
+        self.entries.pop(dest, None)
+
+    def prune(self, arttypes, started):
+        """Forget failures of the given art types that did not fail again since `started`.
+
+        A complete run of an art type tried every file it still has, older
+        failures belong to items that are no longer in the library."""
+        for dest, entry in list(self.entries.items()):
+            if entry['type'] in arttypes and entry['time'] < started:
+                del self.entries[dest]
+
+    def save(self):
+        with xbmcvfs.File(self.path, 'w') as f:
+            f.write(json.dumps(self.entries))
@@ -20,6 +20,7 @@ import xbmc, xbmcgui, xbmcaddon, xbmcvfs
 from collections import namedtuple
 import unicodedata
 import json
+import time
 
 try:  # Kodi v19 or newer
     from urllib.parse import unquote
@@ -28,6 +29,9 @@ except ImportError:  # Kodi v18 and older
 
 Source = namedtuple('Source', ['name', 'path'])
 
+# number of library items requested per query
+PAGE_SIZE = 1000
+
 ADDON = xbmcaddon.Addon()
 ADDONID = ADDON.getAddonInfo('id')
 ADDONNAME = ADDON.getAddonInfo('name')
@@ -35,13 +39,208 @@ ADDONVERSION = ADDON.getAddonInfo('version')
 LANGUAGE = ADDON.getLocalizedString
 
 def log(txt, level=xbmc.LOGDEBUG):
-    if isinstance (txt,str):
-        txt = txt.decode("utf-8")
-    message = u'%s: %s' % (ADDONID, txt)
-    xbmc.log(msg=message.encode("utf-8"), level=level)
+    message = '%s: %s' % (ADDONID, txt)
+    xbmc.log(msg=message, level=level)
+
+# called after every request with the query, the seconds until the response arrived,
+# the bytes sent and received and the seconds spent parsing it, see lib/metrics.py
+rpc_listener = None
 
 def jsonrpc(query):
-    return json.loads(xbmc.executeJSONRPC(json.dumps(query, encoding='utf-8')))
+    request = json.dumps(query)
+    if rpc_listener is None:
+        return json.loads(xbmc.executeJSONRPC(request))
+    started = time.time()
+    response = xbmc.executeJSONRPC(request)
+    received = time.time()
+    result = json.loads(response)
+    rpc_listener(query, received - started, len(request), len(response), time.time() - received)
+    return result
+
+
+def jsonrpc_batch(queries, batch_size=100):
+    """Send queries as JSON-RPC batch arrays, return the responses in query order."""
+    responses = []
+    for start in range(0, len(queries), batch_size):
+        batch = [dict(query, id=start + i) for i, query in enumerate(queries[start:start + batch_size])]
+        response = jsonrpc(batch)
+        if not isinstance(response, list):
+            # a single error object, the request as a whole was rejected
+            response = [jsonrpc(query) for query in batch]
+        by_id = dict((item.get('id'), item) for item in response)
+        responses.extend(by_id.get(query['id'], {}) for query in batch)
+    return responses
+
+
+class LibraryError(Exception):
+    pass
+
+
+class LibraryQuery(object):
+    """Items of a library query, retrieved page by page.
+
+    Only a single page of the response is held in memory at a time. The
+    first page is requested right away, `len()` is the total number of
+    items Kodi reported for the query. `convert` turns the json item into
+    the record that is yielded instead.
+    """
+
+    def __init__(self, method, result, params, page_size=PAGE_SIZE, convert=None):
+        self.method = method
+        self.result = result
+        self.params = params
+        self.page_size = page_size
+        self.convert = convert
+        self.total = 0
+        self._first_page = self._fetch(0)
+
+    def _fetch(self, start):
+        params = dict(self.params, limits={"start": start, "end": start + self.page_size})
+        query = {"jsonrpc": "2.0", "method": self.method, "params": params, "id": 1}
+        response = jsonrpc(query)
+        if response.get('result') is None:
+            raise LibraryError('%s failed: %s' % (self.method, response.get('error')))
+        self.total = response['result'].get('limits', {}).get('total', 0)
+        return response['result'].get(self.result, [])
+
+    def __len__(self):
+        return self.total
+
+    def __iter__(self):
+        page = self._first_page
+        self._first_page = None
+        if page is None:
+            page = self._fetch(0)
+        start = 0
+        while page:
+            if self.convert is not None:
+                page = [self.convert(item) for item in page]
+            for item in page:
+                yield item
+            start += len(page)
+            if start >= self.total:
+                break
+            page = self._fetch(start)
+
+
+class SourceNames(object):
+    """Interned media source names, items refer to their source by index."""
+
+    def __init__(self):
+        self.names = []
+        self._indexes = {}
+
+    def index(self, name):
+        index = self._indexes.get(name)
+        if index is None:
+            index = self._indexes[name] = len(self.names)
+            self.names.append(name)
+        return index
+
+    def __getitem__(self, index):
+        return self.names[index]
+
+    def __len__(self):
+        return len(self.names)
+
+
+class MediaItem(object):
+    """Compact record of a library item.
+
+    `art` holds the art urls that were requested for the item, in the
+    order they were requested, and `source` the index of its media source
+    name, or None. Subclasses add the fields their file name is built from
+    and the library type of the item, as used in library notifications.
+    """
+    __slots__ = ('id', 'art', 'source')
+    type = None
+
+    def __init__(self, id, art, source, *values):
+        self.id = id
+        self.art = art
+        self.source = source
+        for field, value in zip(self.__slots__, values):
+            setattr(self, field, value)
+
+    @property
+    def key(self):
+        """Key of the library item, the copied artwork is recorded under it."""
+        return '%s:%s' % (self.type, self.id)
+
+
+class Movie(MediaItem):
+    __slots__ = ('path', 'title', 'year')
+    type = 'movie'
+
+    @property
+    def name(self):
+        return self.title + ' (' + str(self.year) + ')'
+
+
+class TVShow(MediaItem):
+    __slots__ = ('path', 'title')
+    type = 'tvshow'
+
+    @property
+    def name(self):
+        return self.title
+
+
+class Season(MediaItem):
+    __slots__ = ('tvshowid', 'showtitle', 'label')
+    type = 'season'
+
+    @property
+    def key(self):
+        # seasons are copied and removed along with their show
+        return 'tvshow:%s' % self.tvshowid
+
+    @property
+    def name(self):
+        return self.showtitle + ' - ' + self.label
+
+
+class Episode(MediaItem):
+    __slots__ = ('path', 'showtitle', 'season', 'episode', 'title')
+    type = 'episode'
+
+    @property
+    def name(self):
+        episodenumber = "s%.2d%.2d" % (int(self.season), int(self.episode))
+        return self.showtitle + ' - ' + episodenumber + ' - ' + self.title
+
+
+class MusicVideo(MediaItem):
+    __slots__ = ('artist', 'title')
+    type = 'musicvideo'
+
+    @property
+    def name(self):
+        # musicvideos can end up in the database without an artistname
+        if self.artist:
+            return self.artist + ' - ' + self.title
+        return self.title
+
+
+class Artist(MediaItem):
+    __slots__ = ('label',)
+    type = 'artist'
+
+    @property
+    def name(self):
+        return self.label
+
+
+class Album(MediaItem):
+    __slots__ = ('artist', 'title')
+    type = 'album'
+
+    @property
+    def name(self):
+        # albums without an album artist are listed with an empty artist list
+        if self.artist:
+            return self.artist + ' - ' + self.title
+        return self.title
 
 
 def _unstack(paths):
@@ -68,44 +267,78 @@ def _normalize_string(name):
     return unicodedata.normalize('NFKD', name).encode('ascii','ignore').decode('utf-8')
 
 
-def get_movies():
-    query = {
-        "jsonrpc": "2.0",
-        "method": "VideoLibrary.GetMovies",
-        "params": {"properties": ["file"]},
-        "id": 1
-    }
-    items = jsonrpc(query)['result'].get('movies', [])
+def get_movies(page_size=PAGE_SIZE, backend=None):
+    items = (backend or JSONRPC).query("VideoLibrary.GetMovies", "movies", {"properties": ["file"]}, page_size)
     return list(map(_normalize_path, _unstack((item['file'] for item in items))))
 
 
-def get_tvshows():
-    query = {
-        "jsonrpc": "2.0",
-        "method": "VideoLibrary.GetTVShows",
-        "params": {"properties": ["file"]},
-        "id": 1
-    }
-    items = jsonrpc(query)['result'].get('tvshows', [])
+def get_tvshows(page_size=PAGE_SIZE, backend=None):
+    items = (backend or JSONRPC).query("VideoLibrary.GetTVShows", "tvshows", {"properties": ["file"]}, page_size)
     return [_normalize_path(item['file']) for item in items]
 
 
-def get_episodes():
+def get_episodes(page_size=PAGE_SIZE, backend=None):
+    items = (backend or JSONRPC).query("VideoLibrary.GetEpisodes", "episodes", {"properties": ["file"]}, page_size)
+    return list(map(_normalize_path, _unstack((item['file'] for item in items))))
+
+
+def get_seasons(tvshowids, properties, all_shows=True):
+    """Return the seasons of the given tv shows grouped by tvshowid.
+
+    With `all_shows` the seasons of the whole library are requested at
+    once, which is cheaper than a query per show unless only a few shows
+    are needed.
+    """
+    properties = list(properties)
+    if 'tvshowid' not in properties:
+        properties.append('tvshowid')
+    seasons = dict((tvshowid, []) for tvshowid in tvshowids)
+    if not seasons:
+        return seasons
     query = {
         "jsonrpc": "2.0",
-        "method": "VideoLibrary.GetEpisodes",
-        "params": {"properties": ["file"]},
+        "method": "VideoLibrary.GetSeasons",
+        "params": {"properties": properties},
         "id": 1
     }
-    items = jsonrpc(query)['result'].get('episodes', [])
-    return list(map(_normalize_path, _unstack((item['file'] for item in items))))
+    if all_shows:
+        # without a tvshowid GetSeasons returns the seasons of all shows at once
+        response = jsonrpc(query)
+        if response.get('result') is not None:
+            for item in response['result'].get('seasons', []):
+                if item['tvshowid'] in seasons:
+                    seasons[item['tvshowid']].append(item)
+            return seasons
+    # older versions require a tvshowid, send one query per show in batches
+    queries = [dict(query, params={"properties": properties, "tvshowid": tvshowid}) for tvshowid in tvshowids]
+    for tvshowid, response in zip(tvshowids, jsonrpc_batch(queries)):
+        if response.get('result') is not None:
+            seasons[tvshowid] = response['result'].get('seasons', [])
+    return seasons
+
+
+class JSONRPCBackend(object):
+    """Library items retrieved through JSON-RPC, see lib.database for the alternative."""
+    name = 'json-rpc'
+
+    def query(self, method, result, params, page_size=PAGE_SIZE, convert=None):
+        return LibraryQuery(method, result, params, page_size, convert)
+
+    def get_seasons(self, tvshowids, properties, all_shows=True):
+        return get_seasons(tvshowids, properties, all_shows)
+
+    def close(self):
+        pass
 
 
-def get_sources():
+JSONRPC = JSONRPCBackend()
+
+
+def get_sources(media="video"):
     query = {
         "jsonrpc": "2.0",
         "method": "Files.GetSources",
-        "params": {"media": "video"},
+        "params": {"media": media},
         "id": 1
     }
     response = jsonrpc(query)
@@ -117,77 +350,214 @@ def get_sources():
     return sources
 
 
+SOURCE_TYPES = ["video",
+                "music",
+                "pictures",
+                "files",
+                "programs"]
+
+
 def get_all_sources():
-    source_types = [ "video",
-                     "music",
-                     "pictures",
-                     "files",
-                     "programs"]
     sources = []
-    for source_type in source_types:
-        query = {
-            "jsonrpc": "2.0",
-            "method": "Files.GetSources",
-            "params": {"media": "{}".format(source_type)},
-            "id": 1
-        }
-        response = jsonrpc(query)
-        for item in response['result'].get('sources', []):
-            paths = _unstack_multipath(item['file'])
-            for path in paths:
-                sources.append(Source(item['label'], _normalize_path(path)))
+    for source_type in SOURCE_TYPES:
+        sources.extend(get_sources(source_type))
     return sources
 
 
-def _identify_source_content():
-    movie_content = get_movies()
-    tv_content = get_tvshows() + get_episodes()
-
-    movie_sources = []
-    tv_sources = []
-
-    new_movie_content = []
-    new_tv_content = []
-
-    MediaContent = namedtuple('MediaContent', ['path', 'source'])
-    is_movie_source = "false"
-    is_tv_source = "false"
-    for source in get_sources():
-        for m_file_path in movie_content:
-            if m_file_path.startswith(source.path + '/'):
-                if source not in movie_sources:
-                    movie_sources.append(source)
-                if MediaContent(m_file_path, source.name ) not in new_movie_content:
-                    new_movie_content.append(MediaContent(m_file_path, source.name ))
-                is_movie_source = "true"
-        for tv_file_path in tv_content:
-            if tv_file_path.startswith(source.path + '/'):
-                tv_sources.append(source)
-                new_tv_content.append(MediaContent(tv_file_path, source.name))
-                is_tv_source = "true"
-        if is_movie_source == "true":
-            is_movie_source = "false"
+class SourceIndex(object):
+    """Path prefix trie assigning paths to the media source with the longest matching path."""
+
+    def __init__(self, sources=()):
+        self._root = {}
+        for source in sources:
+            self.add(source)
+
+    def add(self, source):
+        node = self._root
+        for segment in _normalize_path(source.path).split('/'):
+            node = node.setdefault(segment, {})
+        # segments are always strings, None can't clash with a child
+        node[None] = source
+
+    def lookup(self, path):
+        """Return the source containing `path`, or None if it isn't inside any source."""
+        node = self._root
+        found = None
+        # a path only belongs to a source when it is below the source path
+        for segment in _normalize_path(path).split('/')[:-1]:
+            node = node.get(segment)
+            if node is None:
+                break
+            found = node.get(None, found)
+        return found
+
+
+class SourceLookup(SourceIndex):
+    """Content map that looks up the source of a path when it is asked for.
+
+    Used instead of the content maps of a snapshot when only a few paths
+    are needed, those require every path of the library. Every source name
+    is registered in `names` up front.
+    """
+
+    def __init__(self, sources, names):
+        SourceIndex.__init__(self, sources)
+        self._names = names
+        for source in sources:
+            names.index(source.name)
+
+    def get(self, path, default=None):
+        source = self.lookup(path)
+        if source is None:
+            return default
+        return self._names.index(source.name)
+
+
+def _assign_sources(index, paths, names):
+    content = {}
+    sources = set()
+    for path in paths:
+        source = index.lookup(path)
+        if source is not None:
+            content[path] = names.index(source.name)
+            sources.add(source)
+    return content, sources
+
+
+def _identify_source_content(snapshot=None):
+    if snapshot is None:
+        snapshot = get_snapshot()
+    all_sources = snapshot.get_sources()
+    index = SourceIndex(all_sources)
+    names = snapshot.source_names
+    movie_content, movie_sources = _assign_sources(index, snapshot.movies, names)
+    tv_content, tv_sources = _assign_sources(index, snapshot.tvshows + snapshot.episodes, names)
+
+    for source in all_sources:
+        if source in movie_sources:
             log("source '%s' identified as movie source" % source.path)
-        elif is_tv_source == "true":
-            is_tv_source = "false"
+        elif source in tv_sources:
             log("source '%s' identified as tv source" % source.path)
         else:
             log("source '%s' does not contain any known content. "
                           "assuming content not set." % source.path)
-    return movie_sources, tv_sources, dict(new_movie_content), dict(new_tv_content)
+    # keep the order of sources.xml, a multipath source is listed once per path
+    movie_sources = [source for source in _unique(all_sources) if source in movie_sources]
+    tv_sources = [source for source in _unique(all_sources) if source in tv_sources]
+    return movie_sources, tv_sources, movie_content, tv_content
+
+
+def _unique(items):
+    seen = set()
+    for item in items:
+        if item not in seen:
+            seen.add(item)
+            yield item
+
+
+class LibrarySnapshot(object):
+    """Library sources and content of a single run.
+
+    Every query is sent on first use only and its result is kept until
+    `invalidate` is called. The content maps refer to the source of each
+    path by its index in `source_names`. Library items are read through
+    `backend`, media sources always through JSON-RPC.
+    """
+
+    def __init__(self, page_size=PAGE_SIZE, backend=None):
+        self.page_size = page_size
+        self.backend = backend or JSONRPC
+        self._cache = {}
+
+    def invalidate(self):
+        self._cache.clear()
+
+    def _get(self, key, fetch, *args):
+        if key not in self._cache:
+            self._cache[key] = fetch(*args)
+        return self._cache[key]
+
+    @property
+    def movies(self):
+        return self._get('movies', get_movies, self.page_size, self.backend)
+
+    @property
+    def tvshows(self):
+        return self._get('tvshows', get_tvshows, self.page_size, self.backend)
+
+    @property
+    def episodes(self):
+        return self._get('episodes', get_episodes, self.page_size, self.backend)
+
+    def get_sources(self, media="video"):
+        return self._get(('sources', media), get_sources, media)
+
+    @property
+    def all_sources(self):
+        sources = []
+        for source_type in SOURCE_TYPES:
+            sources.extend(self.get_sources(source_type))
+        return sources
+
+    @property
+    def source_names(self):
+        return self._get('source_names', SourceNames)
+
+    @property
+    def _source_content(self):
+        return self._get('source_content', _identify_source_content, self)
+
+    @property
+    def movie_sources(self):
+        return self._source_content[0]
+
+    @property
+    def tv_sources(self):
+        return self._source_content[1]
+
+    @property
+    def movie_content(self):
+        return self._source_content[2]
+
+    @property
+    def tv_content(self):
+        return self._source_content[3]
+
+    @property
+    def tv_index(self):
+        return self._get('tv_index', SourceIndex, self.tv_sources)
+
+    @property
+    def video_lookup(self):
+        return self._get('video_lookup', SourceLookup, self.get_sources(), self.source_names)
+
+
+_snapshot = None
+
+
+def get_snapshot():
+    global _snapshot
+    if _snapshot is None:
+        _snapshot = LibrarySnapshot()
+    return _snapshot
+
+
+def invalidate():
+    if _snapshot is not None:
+        _snapshot.invalidate()
 
 
 def get_movie_sources():
-    return _identify_source_content()[0]
+    return get_snapshot().movie_sources
 
 
 def get_tv_sources():
-    return _identify_source_content()[1]
+    return get_snapshot().tv_sources
 
 
 def get_movie_content():
-    return _identify_source_content()[2]
+    return get_snapshot().movie_content
 
 
 def get_tv_content():
-    return _identify_source_content()[3]
+    return get_snapshot().tv_content
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+"""Link artwork into the artwork directory instead of copying it.
+
+When local artwork, fanart.jpg next to the media or a cached texture,
+is on the same filesystem as the artwork directory the named file can
+share the data of the original: a hard link, or a copy-on-write clone on
+filesystems that support it (btrfs, XFS, ...). Symbolic links are an
+optional last resort, they also work across filesystems but break when
+the original is moved. Artwork that can't be linked is copied.
+"""
+
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+
+from lib.texturecache import unwrap_image_url
+
+# linux ioctl that clones the extents of one file into another
+FICLONE = 0x40049409
+
+
+def local_path(source):
+    """Return the local file of an art url, or None for remote and embedded artwork."""
+    path = unwrap_image_url(source)
+    if '://' in path or not os.path.isabs(path):
+        return None
+    return path
+
+
+def unlink_shared(dest):
+    """Remove `dest` when it is a link, writing to it would change the original as well."""
+    if '://' in dest:
+        return
+    try:
+        if os.path.islink(dest) or os.stat(dest).st_nlink > 1:
+            os.remove(dest)
+    except OSError:
+        pass
+
+
+class Linker(object):
+
+    def __init__(self, symlinks=False):
+        self.symlinks = symlinks
+        self.hardlinked = 0
+        self.cloned = 0
+        self.symlinked = 0
+        self.copied = 0
+        self._devices = {}
+        self._lock = threading.Lock()
+
+    def _device(self, directory):
+        # the destination folders are few, the device of each is looked up once
+        with self._lock:
+            device = self._devices.get(directory)
+        if device is None:
+            device = os.stat(directory).st_dev
+            with self._lock:
+                self._devices[directory] = device
+        return device
+
+    def link(self, source, dest):
+        """Link `dest` to the artwork at `source`, False when it has to be copied instead."""
+        path = local_path(source)
+        if path is None or '://' in dest:
+            return self._copy()
+        try:
+            same_device = os.stat(path).st_dev == self._device(os.path.dirname(dest))
+        except OSError:
+            return self._copy()
+        tmp = '%s.%s.tmp' % (dest, threading.current_thread().ident)
+        if same_device and self._hardlink(path, tmp):
+            counter = 'hardlinked'
+        elif same_device and self._clone(path, tmp):
+            counter = 'cloned'
+        elif self.symlinks and self._symlink(path, tmp):
+            counter = 'symlinked'
+        else:
+            return self._copy()
+        os.replace(tmp, dest)
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+        return True
+
+    def _copy(self):
+        with self._lock:
+            self.copied += 1
+        return False
+
+    def _hardlink(self, path, tmp):
+        try:
+            os.link(path, tmp)
+        except (OSError, AttributeError):
+            return False
+        return True
+
+    def _clone(self, path, tmp):
+        if fcntl is None:
+            return False
+        try:
+            with open(path, 'rb') as src:
+                with open(tmp, 'wb') as dst:
+                    fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except (IOError, OSError):
+            # not supported by the filesystem
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return False
+        return True
+
+    def _symlink(self, path, tmp):
+        try:
+            os.symlink(path, tmp)
+        except (OSError, AttributeError, NotImplementedError):
+            return False
+        return True
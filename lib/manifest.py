@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+"""Persisted record of the artwork copied by previous runs.
+
+Every copied file is stored with the art url it was copied from and the
+size and mtime that url had at the time, and the key of the library item
+it belongs to. A later run only copies artwork whose record is missing or
+no longer matches, and prunes the files of library items that are gone.
+The time of the last completed run of each art type is kept as well, a
+run only has to query the items added since then.
+
+Artwork copied to further destinations is recorded in the manifest of the
+artwork directory. When the destinations change, the records of those
+that were removed are dropped without deleting anything, and the next
+runs query the whole library.
+"""
+
+import json
+import os
+import xbmcvfs
+
+MANIFEST_VERSION = 1
+
+
+def _delete(dest):
+    return not xbmcvfs.exists(dest) or xbmcvfs.delete(dest)
+
+
+class Manifest(object):
+    # seen() and record() are called from the copy workers, they only do
+    # single set and dict operations which are atomic in CPython
+
+    def __init__(self, path, directory, remove=None, destinations=None):
+        self.path = path
+        self.directory = directory
+        # the options of the further destinations, as saved with the manifest
+        self.destinations = destinations or []
+        # deletes the artwork at a destination, True when it is gone
+        self.remove = remove or _delete
+        self.entries = {}
+        self.runs = {}
+        self._seen = set()
+        self._load()
+
+    def _load(self):
+        if not xbmcvfs.exists(self.path):
+            return
+        try:
+            with xbmcvfs.File(self.path) as f:
+                data = json.loads(f.read())
+        except ValueError:
+            return
+        # a manifest written for another destination describes files we
+        # must never touch, start over instead
+        if data.get('version') != MANIFEST_VERSION or data.get('directory') != self.directory:
+            return
+        self.entries = data.get('entries', {})
+        self.runs = data.get('runs', {})
+        if data.get('destinations', []) != self.destinations:
+            # a destination that was added or changed has none of the artwork of earlier runs yet
+            directories = [os.path.join(directory, '') for directory in
+                           [self.directory] + [destination['directory'] for destination in self.destinations]]
+            self.entries = dict((dest, entry) for dest, entry in self.entries.items()
+                                if any(dest.startswith(directory) for directory in directories))
+            self.runs = {}
+
+    def save(self):
+        data = {'version': MANIFEST_VERSION, 'directory': self.directory, 'entries': self.entries, 'runs': self.runs}
+        if self.destinations:
+            data['destinations'] = self.destinations
+        with xbmcvfs.File(self.path, 'w') as f:
+            f.write(json.dumps(data))
+
+    def seen(self, dest):
+        self._seen.add(dest)
+
+    def is_current(self, dest, source, size, mtime, profile=None):
+        entry = self.entries.get(dest)
+        return entry is not None and entry['source'] == source and \
+            entry['size'] == size and entry['mtime'] == mtime and entry.get('profile') == profile
+
+    def record(self, dest, arttype, source, size, mtime, item=None, profile=None):
+        entry = {'type': arttype, 'source': source, 'size': size, 'mtime': mtime, 'item': item}
+        if profile is not None:
+            # the output profile the artwork was resized with
+            entry['profile'] = profile
+        self.entries[dest] = entry
+
+    def _prune(self, match):
+        pruned = []
+        for dest, entry in list(self.entries.items()):
+            if dest not in self._seen and match(entry):
+                if self.remove(dest):
+                    del self.entries[dest]
+                    pruned.append(dest)
+        return pruned
+
+    def prune(self, arttypes):
+        """Delete the files of the given art types that were not seen this run."""
+        return self._prune(lambda entry: entry['type'] in arttypes)
+
+    def prune_items(self, items, arttypes=None):
+        """Delete the files of the given library items that were not seen this run.
+
+        Only files of `arttypes` are deleted, or of every art type if it is None.
+        """
+        items = set(items)
+        return self._prune(lambda entry: entry.get('item') in items and
+                           (arttypes is None or entry['type'] in arttypes))
+
+    def last_run(self, arttype):
+        """Return the start times of the last completed run of `arttype` and
+        of its last run over the whole library, as {'started', 'full'}, or None.
+        'full' is None until a run over the whole library completed."""
+        return self.runs.get(arttype)
+
+    def finished(self, arttype, started, full):
+        """Record a completed run of `arttype` that started at `started`."""
+        previous = self.runs.get(arttype, {})
+        self.runs[arttype] = {'started': started, 'full': started if full else previous.get('full')}
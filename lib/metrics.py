@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+
+"""Measurements of a run, written to metrics.json in the profile folder.
+
+    phases      wall time of each phase of the run
+    rpc         JSON-RPC requests per method: latency histogram, bytes sent
+                and received, time spent parsing the responses
+    timers      calls and time of the hot operations of the run, source
+                matching, naming and resolving art urls
+    copies      files, bytes and worker time per art type and destination
+                scheme, with the throughput of the copy phase
+    failures    copies that failed, per reason
+    memory      peak resident memory of the process
+
+Inside Kodi the process is Kodi itself, its peak memory includes
+everything else Kodi did. With profiling enabled the run also runs under
+cProfile, the stats of the main thread and the copy workers are merged
+into profile.prof (python -m pstats profile.prof).
+"""
+
+import cProfile
+import json
+import pstats
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+from lib.copier import destination_scheme
+
+# upper bounds of the latency histogram buckets in milliseconds
+RPC_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+RPC_LABELS = ['<=%dms' % bound for bound in RPC_BUCKETS] + ['>%dms' % RPC_BUCKETS[-1]]
+
+
+def failure_reason(error):
+    # messages of os errors name the file, the reason itself is the same for every file
+    reason = getattr(error, 'strerror', None) or str(error)
+    return '%s: %s' % (type(error).__name__, reason) if reason else type(error).__name__
+
+
+def _rpc_method(query):
+    if isinstance(query, list):
+        return 'batch %s' % (query[0].get('method') if query else '')
+    return query.get('method')
+
+
+class Metrics(object):
+
+    def __init__(self, profiling=False):
+        self.started = time.time()
+        self.phases = []
+        self.rpc = {}
+        self.timers = {}
+        self.copies = {}
+        self.failures = {}
+        self._phase = None
+        self._lock = threading.Lock()
+        self._profiler = None
+        self._profilers = []
+        self._local = threading.local()
+        if profiling:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def phase(self, name):
+        """Start the phase `name`, the phase before it ends."""
+        now = time.time()
+        if self._phase is not None:
+            self.phases.append([self._phase[0], now - self._phase[1]])
+        self._phase = (name, now) if name is not None else None
+
+    def finish(self):
+        self.phase(None)
+        if self._profiler is not None:
+            self._profiler.disable()
+
+    def rpc_done(self, query, seconds, sent, received, parse_seconds):
+        method = _rpc_method(query)
+        milliseconds = seconds * 1000
+        bucket = len(RPC_BUCKETS)
+        for index, bound in enumerate(RPC_BUCKETS):
+            if milliseconds <= bound:
+                bucket = index
+                break
+        with self._lock:
+            stats = self.rpc.get(method)
+            if stats is None:
+                stats = self.rpc[method] = {'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'parse_seconds': 0.0,
+                                            'bytes_sent': 0, 'bytes_received': 0,
+                                            'histogram': [0] * (len(RPC_BUCKETS) + 1)}
+            stats['calls'] += 1
+            stats['seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+            stats['parse_seconds'] += parse_seconds
+            stats['bytes_sent'] += sent
+            stats['bytes_received'] += received
+            stats['histogram'][bucket] += 1
+
+    def timed(self, name, started):
+        """Add the time since `started` to the timer `name`."""
+        seconds = time.time() - started
+        with self._lock:
+            timer = self.timers.get(name)
+            if timer is None:
+                timer = self.timers[name] = [0, 0.0]
+            timer[0] += 1
+            timer[1] += seconds
+
+    def copied(self, arttype, dest, size, seconds):
+        key = (arttype, destination_scheme(dest))
+        with self._lock:
+            copies = self.copies.get(key)
+            if copies is None:
+                copies = self.copies[key] = [0, 0, 0.0]
+            copies[0] += 1
+            copies[1] += size
+            copies[2] += seconds
+
+    def failed(self, error):
+        reason = failure_reason(error)
+        with self._lock:
+            self.failures[reason] = self.failures.get(reason, 0) + 1
+
+    def profiled(self, func):
+        """Return `func` running under a profiler of the calling thread while profiling is on."""
+        if self._profiler is None:
+            return func
+
+        def run(*args, **kwargs):
+            profiler = getattr(self._local, 'profiler', None)
+            if profiler is None:
+                profiler = self._local.profiler = cProfile.Profile()
+                with self._lock:
+                    self._profilers.append(profiler)
+            try:
+                if profiler:
+                    profiler.enable()
+            except ValueError:
+                # python 3.12 and newer profile every thread with the profiler of the main thread
+                profiler = self._local.profiler = False
+            if not profiler:
+                return func(*args, **kwargs)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.disable()
+        return run
+
+    def report(self):
+        seconds = time.time() - self.started
+        copy_seconds = sum(phase[1] for phase in self.phases if phase[0] == 'copy')
+        arttypes = {}
+        schemes = {}
+        for (arttype, scheme), (files, size, worker_seconds) in self.copies.items():
+            for totals, key in ((arttypes, arttype), (schemes, scheme)):
+                total = totals.setdefault(key, {'files': 0, 'bytes': 0, 'worker_seconds': 0.0})
+                total['files'] += files
+                total['bytes'] += size
+                total['worker_seconds'] += worker_seconds
+        for totals in (arttypes, schemes):
+            for total in totals.values():
+                # the rate of the copy phase as a whole, the workers copy in parallel
+                total['files_per_sec'] = round(total['files'] / copy_seconds, 1) if copy_seconds else None
+                total['bytes_per_sec'] = int(total['bytes'] / copy_seconds) if copy_seconds else None
+                total['worker_seconds'] = round(total['worker_seconds'], 3)
+        rpc = {}
+        for method, stats in self.rpc.items():
+            stats = dict(stats)
+            stats['histogram'] = [[label, count] for label, count in zip(RPC_LABELS, stats['histogram'])]
+            for key in ('seconds', 'max_seconds', 'parse_seconds'):
+                stats[key] = round(stats[key], 4)
+            rpc[method] = stats
+        return {'started': int(self.started), 'seconds': round(seconds, 3),
+                'phases': [[name, round(phase_seconds, 3)] for name, phase_seconds in self.phases],
+                'rpc': rpc,
+                'timers': dict((name, {'calls': calls, 'seconds': round(timer_seconds, 4)})
+                               for name, (calls, timer_seconds) in self.timers.items()),
+                'copies': {'arttypes': arttypes, 'destinations': schemes},
+                'failures': self.failures,
+                'memory': {'peak_rss_kb': self._peak_rss()}}
+
+    def _peak_rss(self):
+        if resource is None:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # bytes on macos, kilobytes everywhere else
+        return peak // 1024 if sys.platform == 'darwin' else peak
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=1, sort_keys=True)
+
+    def save_profile(self, path):
+        """Write the merged profiler stats, False when profiling is off."""
+        if self._profiler is None:
+            return False
+        stats = pstats.Stats(self._profiler)
+        for profiler in self._profilers:
+            try:
+                stats.add(profiler)
+            except TypeError:
+                # a worker profiler that never ran has no stats
+                pass
+        stats.dump_stats(path)
+        return True
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+"""Copy plan of a run, built before any artwork is copied.
+
+A run first resolves every library item to the artwork files it copies,
+then copies them. Entries are grouped by the art types resolved together,
+an art type only counts as completed when its whole group was planned and
+copied. Two items that resolve to the same file are reported as a
+collision and only the first one is copied.
+
+A plan can be written to disk, by a dry run for instance, and copied by a
+later run. Destinations are stored relative to the artwork directory so
+the run that copies it may use another path to the same directory.
+"""
+
+import json
+import os
+import re
+import time
+
+
+class Entry(object):
+    __slots__ = ('dest', 'artwork', 'arttype', 'item', 'split', 'size', 'mtime', 'current')
+
+    def __init__(self, dest, artwork, arttype, item, split=None, size=None, current=False, mtime=None):
+        self.dest = dest
+        self.artwork = artwork
+        self.arttype = arttype
+        # key of the library item and the media source directory it is split into
+        self.item = item
+        self.split = split
+        # expected bytes, modification time of the artwork and whether the destination
+        # is up to date, known for estimated plans only
+        self.size = size
+        self.mtime = mtime
+        self.current = current
+
+
+class Group(object):
+    __slots__ = ('arttypes', 'entries', 'complete')
+
+    def __init__(self, arttypes):
+        self.arttypes = arttypes
+        self.entries = []
+        # False when planning was cancelled or a page of library items failed
+        self.complete = False
+
+
+class Plan(object):
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.groups = []
+        # (dest, item planned first, item that was skipped)
+        self.collisions = []
+        self._dests = {}
+
+    def __len__(self):
+        return sum(len(group.entries) for group in self.groups)
+
+    def start(self, arttypes):
+        group = Group(list(arttypes))
+        self.groups.append(group)
+        return group
+
+    def add(self, group, entry):
+        """Add `entry` to `group`, False when another item already uses its destination."""
+        item = self._dests.get(entry.dest)
+        if item is not None:
+            if item != entry.item:
+                self.collisions.append((entry.dest, item, entry.item))
+            return False
+        self._dests[entry.dest] = entry.item
+        group.entries.append(entry)
+        return True
+
+    def totals(self):
+        """Return {arttype: [files, bytes, files up to date, bytes up to date]}."""
+        totals = {}
+        for group in self.groups:
+            for arttype in group.arttypes:
+                totals[arttype] = [0, 0, 0, 0]
+            for entry in group.entries:
+                total = totals[entry.arttype]
+                total[0] += 1
+                total[1] += entry.size or 0
+                if entry.current:
+                    total[2] += 1
+                    total[3] += entry.size or 0
+        return totals
+
+    def save(self, path):
+        data = {'directory': self.directory, 'created': int(time.time()),
+                'groups': [{'arttypes': group.arttypes, 'complete': group.complete,
+                            'entries': [self._dump(entry) for entry in group.entries]} for group in self.groups],
+                'collisions': [self._relative(dest) for dest, first, skipped in self.collisions]}
+        with open(path, 'w') as f:
+            json.dump(data, f)
+
+    @classmethod
+    def load(cls, path, directory):
+        """Read a saved plan, its destinations are placed in `directory`."""
+        with open(path) as f:
+            data = json.load(f)
+        plan = cls(directory)
+        for saved in data['groups']:
+            group = plan.start(saved['arttypes'])
+            group.complete = saved['complete']
+            for entry in saved['entries']:
+                plan.add(group, Entry(plan._absolute(entry['dest']), entry['source'], entry['type'], entry['item'],
+                                      entry.get('split'), entry.get('bytes'), entry.get('current', False), entry.get('mtime')))
+        return plan
+
+    def _dump(self, entry):
+        data = {'dest': self._relative(entry.dest), 'source': entry.artwork, 'type': entry.arttype, 'item': entry.item}
+        if entry.split is not None:
+            data['split'] = entry.split
+        if entry.size is not None:
+            data.update(bytes=entry.size, mtime=entry.mtime, current=entry.current)
+        return data
+
+    def _relative(self, dest):
+        return dest[len(self.directory):].lstrip('/\\') if dest.startswith(self.directory) else dest
+
+    def _absolute(self, dest):
+        if '://' in dest or os.path.isabs(dest):
+            return dest
+        return os.path.join(self.directory, *re.split(r'[/\\]', dest))
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+"""Scale artwork down to the size it is displayed at.
+
+An output profile limits the dimensions of an art type and sets the JPEG
+quality and optionally another output format. Images that already fit
+their profile are copied unchanged. Resizing needs the Python Imaging
+Library (script.module.pil), without it all artwork is copied as is.
+"""
+
+import io
+import threading
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+HAS_PIL = Image is not None
+
+from lib.library import log
+from lib.store import read_file
+
+# output formats by file extension
+FORMATS = {'jpg': 'JPEG', 'png': 'PNG', 'webp': 'WEBP'}
+DEFAULT_QUALITY = 85
+
+
+class Profile(object):
+    __slots__ = ('width', 'height', 'quality', 'format')
+
+    def __init__(self, width, height, quality=DEFAULT_QUALITY, format='jpg'):
+        self.width = width
+        self.height = height
+        self.quality = quality
+        self.format = format
+
+    def __str__(self):
+        return '%dx%d:%d:%s' % (self.width, self.height, self.quality, self.format)
+
+
+def parse_profiles(text):
+    """Parse comma separated 'name:WIDTHxHEIGHT[:QUALITY[:FORMAT]]' profiles.
+
+    The name is an art type, or the end of the names of several art types
+    such as 'fanart' or 'posters'.
+    """
+    profiles = {}
+    for entry in text.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        fields = [field.strip().lower() for field in entry.split(':')]
+        try:
+            width, height = [int(value) for value in fields[1].split('x')]
+            quality = int(fields[2]) if len(fields) > 2 and fields[2] else DEFAULT_QUALITY
+        except (IndexError, ValueError):
+            raise ValueError('invalid resize profile: %s' % entry)
+        format = fields[3] if len(fields) > 3 and fields[3] else 'jpg'
+        if format == 'jpeg':
+            format = 'jpg'
+        if format not in FORMATS:
+            raise ValueError('unsupported resize format: %s' % format)
+        profiles[fields[0]] = Profile(width, height, min(max(quality, 1), 100), format)
+    return profiles
+
+
+def find_profile(profiles, arttype):
+    # a profile for the art type itself wins over one shared with other art types
+    if arttype in profiles:
+        return profiles[arttype]
+    for name, profile in profiles.items():
+        if arttype.endswith(name):
+            return profile
+    return None
+
+
+class Resizer(object):
+    """Resizes artwork in the copy workers and counts the bytes saved."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.resized = 0
+        self.fitting = 0
+        self.bytes_saved = 0
+
+    def resize(self, source, profile, data=None):
+        """Return the image at `source` scaled down and encoded to fit
+        `profile`, or the original image when it already fits. `data` is
+        the image when it was already read from `source`."""
+        if data is None:
+            data = read_file(source)
+        if not data:
+            raise IOError('empty or unreadable artwork')
+        try:
+            image = Image.open(io.BytesIO(data))
+            width, height = image.size
+            fits = width <= profile.width and height <= profile.height
+            if fits and image.format == FORMATS[profile.format]:
+                with self._lock:
+                    self.fitting += 1
+                return data
+            if not fits:
+                # keeps the aspect ratio
+                image.thumbnail((profile.width, profile.height), Image.LANCZOS)
+            if profile.format == 'jpg' and image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            output = io.BytesIO()
+            image.save(output, FORMATS[profile.format], quality=profile.quality, optimize=True)
+        except Exception as e:
+            log('failed to resize %s, copying the original: %s' % (source, e))
+            return data
+        resized = output.getvalue()
+        with self._lock:
+            self.resized += 1
+            self.bytes_saved += len(data) - len(resized)
+        return resized
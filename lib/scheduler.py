@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+"""Slow the copy workers down while Kodi plays something.
+
+A full run saturates the disk and the network, which makes playback on
+the same box stutter. While something plays, or optionally while the
+menus are in use, the workers either pause or copy within a budget of
+files and bytes per second. They go back to full speed as soon as Kodi
+is idle again. The run itself isn't interrupted, it just takes longer.
+
+The player is asked at most once a second, copies while idle only pay
+for a clock read.
+"""
+
+import threading
+import time
+import xbmc
+
+FULL_SPEED = 0
+PAUSE = 1
+THROTTLE = 2
+
+# seconds between checks of the player, also the longest a paused worker sleeps at once
+CHECK_INTERVAL = 1.0
+
+
+class PlaybackScheduler(object):
+
+    def __init__(self, mode, bytes_per_sec, files_per_sec, user_idle=0, canceled=None):
+        # `canceled` is the threading.Event of the copy engine, the progress dialog
+        # can only be asked from the thread that created it
+        self.mode = mode
+        self.bytes_per_sec = bytes_per_sec
+        self.files_per_sec = files_per_sec
+        # seconds since the last key press below which Kodi counts as busy, 0 to only check playback
+        self.user_idle = user_idle
+        self.canceled = canceled or threading.Event()
+        self.paused_seconds = 0.0
+        self.throttled = 0
+        self._player = xbmc.Player()
+        self._lock = threading.Lock()
+        self._checked = 0.0
+        self._busy = False
+        # earliest start of the next copy while throttled
+        self._next = 0.0
+
+    def busy(self):
+        now = time.time()
+        with self._lock:
+            if now - self._checked < CHECK_INTERVAL:
+                return self._busy
+            self._checked = now
+        busy = self._player.isPlaying() or (self.user_idle > 0 and xbmc.getGlobalIdleTime() < self.user_idle)
+        with self._lock:
+            self._busy = busy
+        return busy
+
+    def wait(self):
+        """Block a copy worker until it may copy its next file, False when the run was cancelled."""
+        if self.mode == FULL_SPEED:
+            return True
+        while self.busy():
+            if self.canceled.is_set():
+                return False
+            if self.mode == PAUSE:
+                self._sleep(CHECK_INTERVAL)
+                with self._lock:
+                    self.paused_seconds += CHECK_INTERVAL
+                continue
+            with self._lock:
+                now = time.time()
+                start = max(now, self._next)
+                if self.files_per_sec:
+                    self._next = start + 1.0 / self.files_per_sec
+                self.throttled += 1
+            return self._sleep(start - now)
+        return True
+
+    def copied(self, size):
+        """Charge `size` copied bytes to the budget, the next copy starts once they are paid for."""
+        if self.mode != THROTTLE or not self.bytes_per_sec or not self._busy:
+            return
+        with self._lock:
+            self._next = max(self._next, time.time()) + float(size) / self.bytes_per_sec
+
+    def _sleep(self, seconds):
+        # a cancelled run wakes the worker right away instead of waiting for the budget
+        return not self.canceled.wait(max(seconds, 0))
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+"""Content-addressed artwork store.
+
+Every unique image is written once to <directory>/.store/<hash[:2]>/<hash>
+and the named files in the artwork folders are links to it, so artwork
+that is shared by several items or art types takes up space only once.
+"""
+
+import hashlib
+import os
+import shutil
+import threading
+import xbmcvfs
+
+STORE_DIR = '.store'
+
+
+def read_file(source):
+    f = xbmcvfs.File(source)
+    try:
+        return bytes(f.readBytes())
+    finally:
+        f.close()
+
+
+class ArtworkStore(object):
+
+    def __init__(self, directory, symlinks=False):
+        self.path = os.path.join(directory, STORE_DIR)
+        self.symlinks = symlinks
+        self._lock = threading.Lock()
+        # hashes of the sources already read this run
+        self._hashes = {}
+        self.stored = 0
+        self.linked = 0
+        self.bytes_saved = 0
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+    def _object_path(self, digest):
+        return os.path.join(self.path, digest[:2], digest)
+
+    def add(self, source, dest):
+        """Store the image at `source` and link `dest` to it."""
+        with self._lock:
+            digest = self._hashes.get(source)
+        data = None
+        if digest is None:
+            data = read_file(source)
+            if not data:
+                raise IOError('empty or unreadable artwork')
+            digest = hashlib.sha1(data).hexdigest()
+            with self._lock:
+                self._hashes[source] = digest
+        self._add(digest, dest, data, source)
+
+    def add_data(self, data, dest):
+        """Store the image `data` and link `dest` to it."""
+        self._add(hashlib.sha1(data).hexdigest(), dest, data)
+
+    def _add(self, digest, dest, data, source=None):
+        path = self._object_path(digest)
+        stored = False
+        if not os.path.exists(path):
+            if data is None:
+                data = read_file(source)
+            if not os.path.isdir(os.path.dirname(path)):
+                try:
+                    os.makedirs(os.path.dirname(path))
+                except OSError:
+                    pass
+            # another worker may store the same image, the rename is atomic
+            tmp = '%s.%s.tmp' % (path, threading.current_thread().ident)
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+            stored = True
+        linked = self._link(path, dest)
+        with self._lock:
+            if stored:
+                self.stored += 1
+            elif linked:
+                self.linked += 1
+                self.bytes_saved += os.path.getsize(path)
+
+    def _link(self, path, dest):
+        tmp = '%s.%s.tmp' % (dest, threading.current_thread().ident)
+        try:
+            os.link(path, tmp)
+        except OSError:
+            if not self.symlinks:
+                # no hard links on this filesystem, fall back to a plain copy
+                shutil.copyfile(path, tmp)
+                os.replace(tmp, dest)
+                return False
+            os.symlink(path, tmp)
+        os.replace(tmp, dest)
+        return True
+
+    def collect_garbage(self):
+        """Remove stored images that no named file links to anymore."""
+        removed = 0
+        # symlinks don't show up in the link count of the stored image
+        if self.symlinks:
+            return removed
+        for root, dirs, files in os.walk(self.path):
+            for filename in files:
+                path = os.path.join(root, filename)
+                if os.stat(path).st_nlink == 1:
+                    os.remove(path)
+                    removed += 1
+        return removed
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+"""Resolve art urls to the copies in Kodi's local texture cache.
+
+Kodi keeps every image it has displayed in special://thumbnails and
+records the original url of each cached image in the texture database
+(`texture.url` -> `texture.cachedurl`). Copying that local file avoids
+fetching remote artwork again.
+"""
+
+import os
+import sqlite3
+import threading
+import xbmcvfs
+
+try:  # Kodi v19 or newer
+    from xbmcvfs import translatePath
+    from urllib.parse import unquote
+except ImportError:  # Kodi v18 and older
+    from xbmc import translatePath
+    from urllib import unquote
+
+from lib.library import log
+from lib.database import connect, find_database
+
+
+def unwrap_image_url(url):
+    """Return the original url of an image:// art url."""
+    if url.startswith('image://'):
+        url = unquote(url[len('image://'):])
+        if url.endswith('/'):
+            url = url[:-1]
+    return url
+
+
+class TextureCache(object):
+
+    def __init__(self, database=None, thumbnails=None):
+        if database is None:
+            database = find_database('Textures')
+        self.thumbnails = thumbnails or translatePath('special://thumbnails')
+        self._lock = threading.Lock()
+        self._connection = None
+        if database is not None:
+            try:
+                self._connection = connect(database)
+            except sqlite3.Error as e:
+                log('failed to open texture database %s: %s' % (database, e))
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, url):
+        """Return the local cached file of `url`, or None if it isn't cached."""
+        if self._connection is None:
+            return None
+        # wrapped urls of special images (embedded art, video thumbs) are stored as is
+        with self._lock:
+            try:
+                row = self._connection.execute('SELECT cachedurl FROM texture WHERE url IN (?, ?) LIMIT 1',
+                                               (unwrap_image_url(url), url)).fetchone()
+            except sqlite3.Error as e:
+                log('texture database lookup failed: %s' % e)
+                row = None
+            if row is not None:
+                path = os.path.join(self.thumbnails, row[0])
+                if xbmcvfs.exists(path):
+                    self.hits += 1
+                    return path
+            self.misses += 1
+        return None
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
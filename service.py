@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+"""Keep the copied artwork in sync with the library in the background.
+
+Library update and remove notifications are collected until the library
+has been quiet for a while, so a scan that adds hundreds of episodes
+results in a single sync of just those items.
+"""
+
+import json
+import time
+import xbmc
+
+import lib.library as video_library
+from default import ADDON, ADDONVERSION, Main, acquire_lock, log, release_lock
+
+NOTIFICATIONS = ('VideoLibrary.OnUpdate', 'VideoLibrary.OnRemove',
+                 'AudioLibrary.OnUpdate', 'AudioLibrary.OnRemove')
+MEDIA_TYPES = ('movie', 'tvshow', 'season', 'episode', 'musicvideo', 'artist', 'album')
+
+# seconds without notifications before the changes are synced
+DEFAULT_DELAY = 30
+
+
+class LibraryMonitor(xbmc.Monitor):
+
+    def __init__(self):
+        xbmc.Monitor.__init__(self)
+        self.updated = {}
+        self.removed = {}
+        self.changed = None
+
+    def onNotification(self, sender, method, data):
+        if method not in NOTIFICATIONS:
+            return
+        try:
+            data = json.loads(data)
+        except ValueError:
+            return
+        if not isinstance(data, dict):
+            return
+        # video notifications wrap the item, audio notifications don't
+        item = data.get('item', data)
+        media = item.get('type')
+        if media not in MEDIA_TYPES or item.get('id') is None:
+            return
+        if method.endswith('OnUpdate'):
+            # watched state changes don't touch the artwork
+            if 'playcount' in data and not data.get('added'):
+                return
+            self.updated.setdefault(media, set()).add(item['id'])
+            self.removed.get(media, set()).discard(item['id'])
+        else:
+            self.removed.setdefault(media, set()).add(item['id'])
+            self.updated.get(media, set()).discard(item['id'])
+        self.changed = time.time()
+
+    def pending(self, delay):
+        """True once changes have been collected and the library was quiet for `delay` seconds."""
+        if self.changed is None or time.time() - self.changed < delay:
+            return False
+        # a running scan sends more notifications, wait for it to finish
+        return not xbmc.getCondVisibility('Library.IsScanning')
+
+    def take(self):
+        updated, removed = self.updated, self.removed
+        self.updated, self.removed, self.changed = {}, {}, None
+        return updated, removed
+
+
+def run():
+    log('service version %s started' % ADDONVERSION)
+    monitor = LibraryMonitor()
+    while not monitor.waitForAbort(1):
+        if ADDON.getSetting('service') != 'true':
+            # changes made while the service is disabled are left to a script run
+            monitor.take()
+            continue
+        if monitor.pending(int(ADDON.getSetting('service_delay') or DEFAULT_DELAY)):
+            # the changes stay pending while a script run copies artwork
+            if not acquire_lock():
+                continue
+            updated, removed = monitor.take()
+            # media sources may have changed since the last sync
+            video_library.invalidate()
+            log('syncing artwork of %s updated and %s removed items' % (
+                sum(len(ids) for ids in updated.values()), sum(len(ids) for ids in removed.values())))
+            try:
+                Main(updated=updated, removed=removed, is_canceled=monitor.abortRequested)
+            finally:
+                release_lock()
+    log('service stopped')
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of the tar bundles, members are read back through the offsets of the index.
+
+    python -m pytest tests
+"""
+
+import json
+import os
+import shutil
+import sys
+import tarfile
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), 'benchmarks', 'fakekodi'))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import xbmc
+import xbmcvfs
+from lib.bundle import BundleWriter, is_bundle_file
+
+LONG_NAME = 'Movies/%s (2000).jpg' % ('A very long movie title ' * 8)
+
+
+class BundleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='artworkorganizer-test-')
+        xbmc.ROOT = self.root
+        self.directory = os.path.join(self.root, 'artwork', '')
+        os.makedirs(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def dest(self, member):
+        return os.path.join(self.directory, 'MovieFanart', *member.split('/'))
+
+    def index(self):
+        with open(os.path.join(self.directory, 'MovieFanart.json')) as f:
+            return json.load(f)
+
+    def read(self, member):
+        # the way a reader of the bundle finds a member, without scanning the archive
+        index = self.index()
+        volume, offset, size = index['members'][member]
+        with open(os.path.join(self.directory, index['volumes'][volume]), 'rb') as f:
+            f.seek(offset)
+            return f.read(size)
+
+    def write(self, members):
+        writer = BundleWriter(self.directory)
+        for member, data in members:
+            writer.add(self.dest(member), data)
+        writer.close()
+        return writer
+
+    def test_round_trip(self):
+        members = [('Movie (2000).jpg', b'fanart' * 100), ('Empty (2001).jpg', b''), (LONG_NAME, b'x' * 513)]
+        self.write(members)
+        for member, data in members:
+            self.assertEqual(self.read(member), data)
+        # members of one run are appended to the same volume, which is a regular tar file
+        self.assertEqual(self.index()['volumes'], ['MovieFanart.tar'])
+        with tarfile.open(os.path.join(self.directory, 'MovieFanart.tar')) as tar:
+            self.assertEqual(tar.getnames(), [member for member, data in members])
+            self.assertEqual(tar.extractfile(LONG_NAME).read(), b'x' * 513)
+
+    def test_size(self):
+        writer = self.write([('Movie (2000).jpg', b'fanart')])
+        self.assertEqual(writer.size(self.dest('Movie (2000).jpg')), 6)
+        self.assertIsNone(writer.size(self.dest('Missing (2000).jpg')))
+        self.assertNotIn(self.dest('Missing (2000).jpg'), writer)
+        # a bundle that was never written has no members either
+        self.assertIsNone(writer.size(os.path.join(self.directory, 'MoviePosters', 'Movie (2000).jpg')))
+
+    def test_new_volume(self):
+        self.write([('Movie (2000).jpg', b'old'), ('Other (2001).jpg', b'other')])
+        # a later run appends a volume, the index points to the latest copy of a member
+        self.write([('Movie (2000).jpg', b'new')])
+        self.assertEqual(self.index()['volumes'], ['MovieFanart.tar', 'MovieFanart.001.tar'])
+        self.assertEqual(self.read('Movie (2000).jpg'), b'new')
+        self.assertEqual(self.read('Other (2001).jpg'), b'other')
+
+    def test_unused_volume_deleted(self):
+        self.write([('Movie (2000).jpg', b'old')])
+        self.write([('Movie (2000).jpg', b'new')])
+        self.assertEqual(self.index()['volumes'], [None, 'MovieFanart.001.tar'])
+        self.assertFalse(os.path.exists(os.path.join(self.directory, 'MovieFanart.tar')))
+        writer = BundleWriter(self.directory)
+        writer.remove(self.dest('Movie (2000).jpg'))
+        writer.close()
+        self.assertEqual(self.index(), {'version': 1, 'volumes': [None, None], 'members': {}})
+
+    def test_failed_write_starts_new_volume(self):
+        writer = BundleWriter(self.directory)
+        writer.add(self.dest('Movie (2000).jpg'), b'fanart')
+        write = xbmcvfs.File.write
+        xbmcvfs.File.write = lambda f, data: False
+        try:
+            self.assertRaises(IOError, writer.add, self.dest('Broken (2001).jpg'), b'broken')
+        finally:
+            xbmcvfs.File.write = write
+        writer.add(self.dest('Other (2002).jpg'), b'other')
+        writer.close()
+        self.assertEqual(self.index()['volumes'], ['MovieFanart.tar', 'MovieFanart.001.tar'])
+        self.assertEqual(self.read('Movie (2000).jpg'), b'fanart')
+        self.assertEqual(self.read('Other (2002).jpg'), b'other')
+        self.assertNotIn('Broken (2001).jpg', self.index()['members'])
+
+    def test_is_bundle_file(self):
+        names = ['MovieFanart']
+        for filename in ('MovieFanart.tar', 'MovieFanart.001.tar', 'MovieFanart.json'):
+            self.assertTrue(is_bundle_file(filename, names))
+        for filename in ('MoviePosters.tar', 'MovieFanart.jpg', 'Movie (2000).json'):
+            self.assertFalse(is_bundle_file(filename, names))
+
+
+if __name__ == '__main__':
+    unittest.main()
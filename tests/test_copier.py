@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of the pool of copy workers.
+
+    python -m pytest tests
+"""
+
+import os
+import sys
+import threading
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), 'benchmarks', 'fakekodi'))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from lib.copier import CopyEngine
+
+
+class CopyEngineTest(unittest.TestCase):
+
+    def engine(self, copy, failed=None, is_canceled=lambda: False):
+        engine = CopyEngine(copy, {'local': 2}, is_canceled, failed=failed)
+        self.addCleanup(engine.close)
+        return engine
+
+    def wait(self, engine):
+        # wait() in a thread of its own, a hanging wait fails the test instead of the run
+        done = []
+        thread = threading.Thread(target=lambda: done.append(engine.wait()))
+        thread.daemon = True
+        thread.start()
+        thread.join(5)
+        self.assertEqual(done, [True])
+
+    def copy(self, source, dest):
+        if source == 'broken':
+            raise IOError('read failed')
+        return source != 'unchanged'
+
+    def test_results(self):
+        engine = self.engine(self.copy)
+        for source in ('a', 'b', 'unchanged', 'broken'):
+            engine.submit('moviefanart', '/artwork/%s.jpg' % source, source, '/artwork/%s.jpg' % source)
+        self.wait(engine)
+        self.assertEqual(engine.results('moviefanart'), (2, 1, 1))
+        self.assertEqual(engine.results('movieposters'), (0, 0, 0))
+
+    def test_failed(self):
+        failures = []
+        engine = self.engine(self.copy, lambda key, args, e: failures.append((key, args, str(e))))
+        engine.submit('moviefanart', '/artwork/a.jpg', 'broken', '/artwork/a.jpg')
+        self.wait(engine)
+        self.assertEqual(failures, [('moviefanart', ('broken', '/artwork/a.jpg'), 'read failed')])
+
+    def test_failed_callback_raises(self):
+        def failed(key, args, e):
+            raise ValueError('ledger is broken')
+        engine = self.engine(self.copy, failed)
+        for source in ('broken', 'a', 'broken', 'b'):
+            engine.submit('moviefanart', '/artwork/%s.jpg' % source, source, '/artwork/%s.jpg' % source)
+        # the workers survive and every job is marked done
+        self.wait(engine)
+        self.assertEqual(engine.results('moviefanart'), (2, 0, 2))
+
+    def test_canceled(self):
+        engine = self.engine(self.copy, is_canceled=lambda: True)
+        self.assertFalse(engine.submit('moviefanart', '/artwork/a.jpg', 'a', '/artwork/a.jpg'))
+        self.assertFalse(engine.wait())
+        self.assertEqual(engine.results('moviefanart'), (0, 0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
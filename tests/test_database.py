@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of the SQLite library backend against a fixture of Kodi's schema.
+
+    python -m pytest tests
+"""
+
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), 'benchmarks', 'fakekodi'))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import xbmc
+from lib import database
+from lib.library import LibraryError
+
+# the tables and columns of the views the backend reads, as in MyVideos and MyMusic
+VIDEO_SCHEMA = '''
+CREATE TABLE art (art_id INTEGER PRIMARY KEY, media_id INTEGER, media_type TEXT, type TEXT, url TEXT);
+CREATE TABLE movie_view (idMovie INTEGER PRIMARY KEY, c00 TEXT, premiered TEXT, strPath TEXT, strFileName TEXT, dateAdded TEXT);
+CREATE TABLE tvshow_view (idShow INTEGER PRIMARY KEY, c00 TEXT, strPath TEXT, dateAdded TEXT);
+CREATE TABLE episode_view (idEpisode INTEGER PRIMARY KEY, c00 TEXT, c12 TEXT, c13 TEXT, strTitle TEXT, idShow INTEGER,
+                           strPath TEXT, strFileName TEXT, dateAdded TEXT);
+CREATE TABLE musicvideo_view (idMVideo INTEGER PRIMARY KEY, c00 TEXT, c10 TEXT, strPath TEXT, strFileName TEXT, dateAdded TEXT);
+CREATE TABLE season_view (idSeason INTEGER PRIMARY KEY, idShow INTEGER, season INTEGER, name TEXT, showTitle TEXT);
+'''
+MUSIC_SCHEMA = '''
+CREATE TABLE art (art_id INTEGER PRIMARY KEY, media_id INTEGER, media_type TEXT, type TEXT, url TEXT);
+CREATE TABLE artist (idArtist INTEGER PRIMARY KEY, strArtist TEXT, dateAdded TEXT, dateModified TEXT);
+CREATE TABLE album (idAlbum INTEGER PRIMARY KEY, strAlbum TEXT, dateAdded TEXT, dateModified TEXT);
+CREATE TABLE album_artist (idArtist INTEGER, idAlbum INTEGER, strArtist TEXT, iOrder INTEGER);
+'''
+
+
+class FakeLibrary(object):
+    # answers the JSON-RPC queries of the fallback
+    def __init__(self, movies):
+        self.movies = movies
+        self.queries = []
+
+    def handle(self, query):
+        self.queries.append(query['method'])
+        return {'id': 1, 'result': {'movies': self.movies, 'limits': {'total': len(self.movies)}}}
+
+
+class DatabaseTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='artworkorganizer-test-')
+        xbmc.ROOT = self.root
+        os.makedirs(os.path.join(self.root, 'database'))
+        self.video = os.path.join(self.root, 'database', 'MyVideos121.db')
+        self.music = os.path.join(self.root, 'database', 'MyMusic83.db')
+        with sqlite3.connect(self.video) as connection:
+            connection.executescript(VIDEO_SCHEMA)
+        with sqlite3.connect(self.music) as connection:
+            connection.executescript(MUSIC_SCHEMA)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def add_movies(self, count):
+        with sqlite3.connect(self.video) as connection:
+            for id in range(1, count + 1):
+                connection.execute('INSERT INTO movie_view VALUES (?, ?, ?, ?, ?, ?)',
+                                   (id, 'Movie %d' % id, '2001-05-04', '/movies/', 'movie%d.mkv' % id, '2020-01-01 00:00:00'))
+                connection.execute('INSERT INTO art (media_id, media_type, type, url) VALUES (?, ?, ?, ?)',
+                                   (id, 'movie', 'fanart', 'http://example.com/fanart %d.jpg' % id))
+                connection.execute('INSERT INTO art (media_id, media_type, type, url) VALUES (?, ?, ?, ?)',
+                                   (id, 'movie', 'poster', '/art/poster%d.jpg' % id))
+
+    def test_movies(self):
+        self.add_movies(3)
+        backend = database.open_backend()
+        params = {'properties': ['file', 'title', 'year', 'fanart', 'thumbnail', 'art']}
+        movies = list(backend.query('VideoLibrary.GetMovies', 'movies', params))
+        self.assertEqual(len(movies), 3)
+        movie = movies[0]
+        self.assertEqual(movie['title'], 'Movie 1')
+        self.assertEqual(movie['year'], 2001)
+        self.assertEqual(movie['file'], '/movies/movie1.mkv')
+        self.assertEqual(movie['fanart'], 'image://http%3a%2f%2fexample.com%2ffanart%201.jpg/')
+        self.assertEqual(movie['art']['poster'], 'image://%2fart%2fposter1.jpg/')
+        # without a thumb the poster is the thumbnail, like JSON-RPC reports it
+        self.assertEqual(movie['thumbnail'], movie['art']['poster'])
+        backend.close()
+
+    def test_filter(self):
+        self.add_movies(3)
+        with sqlite3.connect(self.video) as connection:
+            connection.execute("UPDATE movie_view SET strPath = '/other/', dateAdded = '2024-01-01 00:00:00' WHERE idMovie = 2")
+        backend = database.open_backend()
+        rule = {'and': [{'field': 'path', 'operator': 'contains', 'value': '/other/'},
+                        {'field': 'dateadded', 'operator': 'greaterthan', 'value': '2023-01-01 00:00:00'}]}
+        movies = list(backend.query('VideoLibrary.GetMovies', 'movies', {'properties': ['file'], 'filter': rule}))
+        self.assertEqual([movie['movieid'] for movie in movies], [2])
+        backend.close()
+
+    def test_page_within_variable_limit(self):
+        # sqlite builds before 3.32 bind at most 999 variables per statement
+        self.add_movies(1500)
+        backend = database.open_backend()
+        if hasattr(backend._connections[database.VIDEO], 'setlimit'):
+            backend._connections[database.VIDEO].setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+        movies = list(backend.query('VideoLibrary.GetMovies', 'movies', {'properties': ['file']}, page_size=1000))
+        self.assertEqual(len(movies), 1500)
+        self.assertTrue(all(movie['fanart'] for movie in movies))
+        backend.close()
+
+    def test_failed_first_page_uses_jsonrpc(self):
+        self.add_movies(2)
+        xbmc.LIBRARY = FakeLibrary([{'movieid': 7, 'title': 'From Kodi'}])
+        backend = database.open_backend()
+        query = backend.query('VideoLibrary.GetMovies', 'movies', {'properties': ['file']})
+        # the view changes between counting and reading the first page
+        with sqlite3.connect(self.video) as connection:
+            connection.execute('DROP TABLE movie_view')
+        self.assertEqual([movie['movieid'] for movie in query], [7])
+        self.assertEqual(xbmc.LIBRARY.queries, ['VideoLibrary.GetMovies'])
+        backend.close()
+
+    def test_failed_later_page_raises(self):
+        self.add_movies(3)
+        backend = database.open_backend()
+        query = iter(backend.query('VideoLibrary.GetMovies', 'movies', {'properties': ['file']}, page_size=2))
+        next(query)
+        with sqlite3.connect(self.video) as connection:
+            connection.execute('DROP TABLE movie_view')
+        # items of the first page were already used, the query can't start over
+        self.assertRaises(LibraryError, list, query)
+        backend.close()
+
+    def test_seasons(self):
+        with sqlite3.connect(self.video) as connection:
+            connection.executemany('INSERT INTO season_view VALUES (?, ?, ?, ?, ?)',
+                                   [(1, 10, -1, 'All seasons', 'Show'), (2, 10, 1, 'Season 1', 'Show'),
+                                    (3, 11, 1, 'Season 1', 'Other')])
+            connection.execute("INSERT INTO art (media_id, media_type, type, url) VALUES (2, 'season', 'thumb', '/s1.jpg')")
+        backend = database.open_backend()
+        seasons = backend.get_seasons([10], ['thumbnail'])
+        self.assertEqual(list(seasons), [10])
+        self.assertEqual([season['seasonid'] for season in seasons[10]], [2])
+        self.assertEqual(seasons[10][0]['thumbnail'], 'image://%2fs1.jpg/')
+        backend.close()
+
+    def test_albums(self):
+        with sqlite3.connect(self.music) as connection:
+            connection.execute("INSERT INTO album VALUES (1, 'Album', '', '')")
+            connection.execute("INSERT INTO album VALUES (2, 'No Artist', '', '')")
+            connection.execute("INSERT INTO album_artist VALUES (1, 1, 'Band', 0)")
+        backend = database.open_backend()
+        albums = list(backend.query('AudioLibrary.GetAlbums', 'albums', {'properties': ['title', 'artist']}))
+        self.assertEqual([album['artist'] for album in albums], [['Band'], []])
+        backend.close()
+
+    def test_newest_database(self):
+        shutil.copy(self.video, os.path.join(self.root, 'database', 'MyVideos99.db'))
+        self.assertEqual(database.find_database('MyVideos'), self.video)
+
+    def test_path_needs_quoting(self):
+        # a userdata folder whose name isn't a valid uri as it is
+        root = os.path.join(self.root, 'Kodi #2 100%?')
+        os.makedirs(os.path.join(root, 'database'))
+        for path in (self.video, self.music):
+            shutil.copy(path, os.path.join(root, 'database'))
+        xbmc.ROOT = root
+        self.video = os.path.join(root, 'database', 'MyVideos121.db')
+        self.add_movies(2)
+        backend = database.open_backend()
+        self.assertEqual(sorted(backend._connections), [database.MUSIC, database.VIDEO])
+        movies = list(backend.query('VideoLibrary.GetMovies', 'movies', {'properties': ['file']}))
+        self.assertEqual(len(movies), 2)
+        backend.close()
+
+    def test_mysql_uses_jsonrpc(self):
+        os.makedirs(os.path.join(self.root, 'userdata'))
+        with open(os.path.join(self.root, 'userdata', 'advancedsettings.xml'), 'w') as f:
+            f.write('<advancedsettings><videodatabase><type>mysql</type></videodatabase>'
+                    '<musicdatabase><type>mysql</type></musicdatabase></advancedsettings>')
+        self.assertIsNone(database.open_backend())
+
+
+if __name__ == '__main__':
+    unittest.main()
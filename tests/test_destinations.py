@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of further destinations, on their own and in a run against a synthetic library.
+
+    python -m pytest tests
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), 'benchmarks', 'fakekodi'))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), 'benchmarks'))
+
+import xbmc
+import xbmcaddon
+from synthetic import SyntheticLibrary
+from lib.destinations import Destination, SharedReads
+
+FOLDERS = {'moviefanart': 'MovieFanart', 'movieposters': 'MoviePosters'}
+
+
+class DestinationTest(unittest.TestCase):
+
+    def test_from_options(self):
+        defaults = {'arttypes': ['moviefanart'], 'split_movies_sources': 'true', 'split_tvshows_sources': 'false',
+                    'normalize_names': 'false'}
+        split = lambda movies, tvshows: ['moviefanart', 'movieposters'] if movies else []
+        destination = Destination.from_options({'directory': '/nas/art', 'arttypes': ['movieposters', 'unknown'],
+                                                'split_movies_sources': False}, defaults, FOLDERS, split)
+        self.assertEqual(destination.folders, {'movieposters': os.path.join('/nas/art', 'MoviePosters')})
+        self.assertEqual(destination.describe(), {'directory': '/nas/art', 'arttypes': ['movieposters'], 'split': [],
+                                                  'normalize_names': False})
+
+    def test_overlaps(self):
+        art = Destination('/nas/art', [], FOLDERS)
+        self.assertTrue(art.overlaps(Destination('/nas/art/backup', [], FOLDERS)))
+        self.assertTrue(Destination('/nas', [], FOLDERS).overlaps(art))
+        self.assertFalse(art.overlaps(Destination('/nas/artwork', [], FOLDERS)))
+
+    def test_shared_reads(self):
+        reads = SharedReads()
+        reads.expect('fanart', 2)
+        calls = []
+        read = lambda: calls.append(1) or b'data'
+        self.assertEqual(reads.read('fanart', read), b'data')
+        self.assertEqual(reads.read('fanart', read), b'data')
+        self.assertEqual((len(calls), reads.reads, reads.shared), (1, 1, 1))
+        reads.release('fanart')
+        reads.release('fanart')
+        self.assertFalse(reads.is_shared('fanart'))
+
+
+class SourcesTest(unittest.TestCase):
+    # destinations that are, contain or lie inside a media source are left out of the run
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='artworkorganizer-test-')
+        xbmc.ROOT = self.root
+        self.profile = os.path.join(self.root, 'profile', 'addon_data', 'script.artworkorganizer')
+        for path in (self.profile, os.path.join(self.root, 'masterprofile')):
+            os.makedirs(path)
+        open(os.path.join(self.root, 'masterprofile', 'sources.xml'), 'w').close()
+        xbmc.LIBRARY = SyntheticLibrary(self.root, sources=2, movies=4, tvshows=1, episodes=2, musicvideos=0,
+                                        artists=0, albums=0, art_files=4, art_size=100)
+        xbmc.LIBRARY.sources['video'].append({'label': 'NAS', 'file': os.path.join(self.root, 'nas', 'movies', '')})
+        xbmcaddon.SETTINGS.clear()
+        xbmcaddon.SETTINGS.update({'directory': os.path.join(self.root, 'artwork', ''), 'moviefanart': 'true',
+                                   'incremental': 'true'})
+
+    def tearDown(self):
+        xbmcaddon.SETTINGS.clear()
+        xbmc.LIBRARY = None
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def run_addon(self, directories):
+        with open(os.path.join(self.profile, 'destinations.json'), 'w') as f:
+            json.dump([{'directory': directory} for directory in directories], f)
+        import default
+        import lib.library as video_library
+        video_library.invalidate()
+        default.Main()
+        with open(os.path.join(self.profile, 'manifest.json')) as f:
+            return json.load(f)
+
+    def files(self, *path):
+        directory = os.path.join(self.root, *path)
+        return sorted(name for path, dirs, files in os.walk(directory) for name in files)
+
+    def test_destinations_in_sources(self):
+        inside = os.path.join(self.root, 'nas', 'movies', 'artwork')
+        containing = os.path.join(self.root, 'nas')
+        backup = os.path.join(self.root, 'backup')
+        manifest = self.run_addon([inside, containing, backup])
+        # only the destination outside the media sources is copied to and saved with the manifest
+        self.assertEqual([destination['directory'] for destination in manifest['destinations']], [backup])
+        self.assertEqual(self.files('nas'), [])
+        self.assertEqual(len(self.files('backup')), 4)
+        self.assertEqual(self.files('backup'), self.files('artwork'))
+        self.assertTrue(all(dest.startswith(os.path.join(self.root, 'artwork')) or dest.startswith(backup)
+                            for dest in manifest['entries']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of the file copier, on local paths and through the VFS.
+
+    python -m pytest tests
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), 'benchmarks', 'fakekodi'))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import xbmc
+from lib.fastcopy import FileCopier
+
+MTIME = 1500000000
+
+
+class FileCopierTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='artworkorganizer-test-')
+        xbmc.ROOT = self.root
+        os.makedirs(os.path.join(self.root, 'art'))
+        os.makedirs(os.path.join(self.root, 'dest'))
+        self.source = os.path.join(self.root, 'art', 'fanart.jpg')
+        with open(self.source, 'wb') as f:
+            f.write(b'fanart' * 1000)
+        os.utime(self.source, (MTIME, MTIME))
+        self.copier = FileCopier(chunk_size=4096)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def assertCopied(self, dest):
+        with open(dest, 'rb') as f:
+            self.assertEqual(f.read(), b'fanart' * 1000)
+        self.assertEqual(int(os.stat(dest).st_mtime), MTIME)
+        # no temporary file is left next to the copy
+        self.assertEqual(os.listdir(os.path.dirname(dest)), [os.path.basename(dest)])
+
+    def test_local(self):
+        dest = os.path.join(self.root, 'dest', 'Movie (2000).jpg')
+        self.assertEqual(self.copier.copy(self.source, dest), 6000)
+        self.assertCopied(dest)
+        self.assertEqual(self.copier.zero_copy + self.copier.buffered, 1)
+
+    def test_replaces_link(self):
+        dest = os.path.join(self.root, 'dest', 'Movie (2000).jpg')
+        other = os.path.join(self.root, 'art', 'other.jpg')
+        with open(other, 'wb') as f:
+            f.write(b'other')
+        os.symlink(other, dest)
+        self.copier.copy(self.source, dest)
+        self.assertFalse(os.path.islink(dest))
+        with open(other, 'rb') as f:
+            self.assertEqual(f.read(), b'other')
+
+    def test_vfs(self):
+        # a special:// destination goes through the VFS and still keeps the time of the original
+        self.assertEqual(self.copier.copy('special://art/fanart.jpg', 'special://dest/Movie (2000).jpg'), 6000)
+        self.assertCopied(os.path.join(self.root, 'dest', 'Movie (2000).jpg'))
+        self.assertEqual(self.copier.vfs, 1)
+
+    def test_vfs_unreadable(self):
+        open(os.path.join(self.root, 'art', 'empty.jpg'), 'wb').close()
+        self.assertRaises(IOError, self.copier.copy, 'special://art/empty.jpg', 'special://dest/Movie (2000).jpg')
+        self.assertEqual(os.listdir(os.path.join(self.root, 'dest')), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of the remote artwork fetcher against an in-process web server.
+
+    python -m pytest tests
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+try:  # python 3
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:  # python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), 'benchmarks', 'fakekodi'))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import xbmc
+from lib.fetcher import FetchError, Fetcher, remote_url
+
+IMAGE = b'\xff\xd8\xff\xe0 fanart'
+ETAG = '"fanart-1"'
+LAST_MODIFIED = 'Sat, 01 Jan 2022 00:00:00 GMT'
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class ArtworkHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.headers.get('If-None-Match'),
+                                     self.headers.get('If-Modified-Since'), self.headers.get('User-Agent')))
+        if self.path == '/fanart.jpg':
+            if self.headers.get('If-None-Match') == ETAG:
+                return self.answer(304)
+            return self.answer(200, IMAGE, {'ETag': ETAG})
+        if self.path == '/poster.jpg':
+            if self.headers.get('If-Modified-Since') == LAST_MODIFIED:
+                return self.answer(304)
+            return self.answer(200, IMAGE, {'Last-Modified': LAST_MODIFIED})
+        if self.path == '/busy.jpg':
+            # rate limited once, then served
+            self.server.busy += 1
+            if self.server.busy == 1:
+                return self.answer(429, headers={'Retry-After': '1'})
+            return self.answer(200, IMAGE)
+        if self.path == '/down.jpg':
+            return self.answer(503)
+        if self.path == '/moved.jpg':
+            return self.answer(302, headers={'Location': '/fanart.jpg'})
+        if self.path == '/loop.jpg':
+            return self.answer(301, headers={'Location': '/loop.jpg'})
+        self.answer(404)
+
+    def answer(self, status, data=b'', headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if status != 304:
+            self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FetcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='artworkorganizer-test-')
+        xbmc.ROOT = self.root
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), ArtworkHandler)
+        self.server.requests = []
+        self.server.busy = 0
+        threading.Thread(target=self.server.serve_forever).start()
+        self.base = 'http://127.0.0.1:%d' % self.server.server_address[1]
+        self.canceled = threading.Event()
+        self.fetcher = self.new_fetcher()
+
+    def tearDown(self):
+        self.fetcher.close()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def new_fetcher(self):
+        return Fetcher(os.path.join(self.root, 'validators.json'), retries=2, backoff=0.01, timeout=5,
+                       user_agent='script.artworkorganizer/test', canceled=self.canceled)
+
+    def fetch(self, path, dest='/art/fanart.jpg', tag=None, conditional=True):
+        data, validator = self.fetcher.fetch(self.base + path, dest, tag, conditional)
+        if data is not None:
+            self.fetcher.remember(dest, validator)
+        return data
+
+    def test_remote_url(self):
+        self.assertEqual(remote_url('image://http%3a%2f%2fexample.com%2ffanart.jpg/'), 'http://example.com/fanart.jpg')
+        self.assertIsNone(remote_url('image://%2fart%2ffanart.jpg/'))
+
+    def test_etag(self):
+        self.assertEqual(self.fetch('/fanart.jpg'), IMAGE)
+        self.assertIsNone(self.fetch('/fanart.jpg'))
+        self.assertEqual(self.server.requests[1][1], ETAG)
+        self.assertEqual((self.fetcher.downloaded, self.fetcher.not_modified), (1, 1))
+        # the validators of the last run are sent by the next one
+        self.fetcher.save()
+        self.fetcher.close()
+        self.fetcher = self.new_fetcher()
+        self.assertIsNone(self.fetch('/fanart.jpg'))
+        self.assertEqual(self.server.requests[0][3], 'script.artworkorganizer/test')
+
+    def test_last_modified(self):
+        self.fetch('/poster.jpg')
+        self.assertIsNone(self.fetch('/poster.jpg'))
+        self.assertEqual(self.server.requests[1][2], LAST_MODIFIED)
+
+    def test_unconditional(self):
+        self.fetch('/fanart.jpg')
+        # a missing destination, or another output profile, is downloaded again
+        self.assertEqual(self.fetch('/fanart.jpg', conditional=False), IMAGE)
+        self.assertEqual(self.fetch('/fanart.jpg', tag='720p'), IMAGE)
+        self.assertEqual([request[1] for request in self.server.requests], [None, None, None])
+
+    def test_retry_after(self):
+        started = time.time()
+        self.assertEqual(self.fetch('/busy.jpg'), IMAGE)
+        # the server asked for a longer delay than the backoff
+        self.assertGreaterEqual(time.time() - started, 1.0)
+        self.assertEqual(self.fetcher.retried, 1)
+
+    def test_retries_exhausted(self):
+        self.assertRaises(FetchError, self.fetch, '/down.jpg')
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_cancel_stops_backoff(self):
+        self.fetcher.backoff = 20
+        threading.Timer(0.2, self.canceled.set).start()
+        started = time.time()
+        self.assertRaises(FetchError, self.fetch, '/down.jpg')
+        self.assertLess(time.time() - started, 5)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_redirect(self):
+        self.assertEqual(self.fetch('/moved.jpg'), IMAGE)
+        self.assertEqual([request[0] for request in self.server.requests], ['/moved.jpg', '/fanart.jpg'])
+        # the validator belongs to the requested url
+        self.assertIsNone(self.fetch('/moved.jpg'))
+
+    def test_too_many_redirects(self):
+        self.assertRaises(FetchError, self.fetch, '/loop.jpg')
+
+    def test_not_found(self):
+        self.assertRaises(FetchError, self.fetch, '/missing.jpg')
+
+
+if __name__ == '__main__':
+    unittest.main()
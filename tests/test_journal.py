@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of resuming interrupted runs and of retrying the artwork that failed to copy.
+
+    python -m pytest tests
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), 'benchmarks', 'fakekodi'))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), 'benchmarks'))
+
+import xbmc
+import xbmcaddon
+import xbmcgui
+from synthetic import SyntheticLibrary
+from lib.fastcopy import FileCopier
+from lib.journal import FailureLedger, Journal
+
+
+class JournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='artworkorganizer-test-')
+        xbmc.ROOT = self.root
+        self.path = os.path.join(self.root, 'journal.jsonl')
+        self.directory = os.path.join(self.root, 'artwork', '')
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_resume(self):
+        journal = Journal(self.path, self.directory)
+        self.assertFalse(journal.resumed)
+        journal.copy_done('/artwork/a.jpg', {'type': 'moviefanart', 'source': '/art/a.jpg'})
+        journal.arttype_done('moviefanart')
+        journal.close(False)
+        # the last line of a run that was killed may be cut off
+        with open(self.path, 'a') as f:
+            f.write('{"dest": "/artwork/b.j')
+        journal = Journal(self.path, self.directory)
+        self.assertTrue(journal.resumed)
+        self.assertEqual(journal.copied, {'/artwork/a.jpg': {'type': 'moviefanart', 'source': '/art/a.jpg'}})
+        self.assertEqual(journal.completed, set(['moviefanart']))
+        journal.close(True)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_other_directory(self):
+        journal = Journal(self.path, self.directory)
+        journal.arttype_done('moviefanart')
+        journal.close(False)
+        # the interrupted run copied somewhere else, nothing is resumed
+        self.assertFalse(Journal(self.path, os.path.join(self.root, 'other', '')).resumed)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_ledger(self):
+        path = os.path.join(self.root, 'failures.json')
+        ledger = FailureLedger(path)
+        ledger.failed('/artwork/a.jpg', 'moviefanart', '/art/a.jpg', 'movie:1', 'read failed')
+        ledger.failed('/artwork/a.jpg', 'moviefanart', '/art/a.jpg', 'movie:1', 'read failed')
+        ledger.failed('/artwork/b.jpg', 'movieposters', '/art/b.jpg', 'movie:2', 'read failed')
+        ledger.save()
+        ledger = FailureLedger(path)
+        self.assertEqual(ledger.entries['/artwork/a.jpg']['attempts'], 2)
+        ledger.succeeded('/artwork/b.jpg')
+        self.assertEqual(list(ledger.entries), ['/artwork/a.jpg'])
+        # a complete run of the art type forgets failures it didn't see again
+        ledger.prune(['movieposters'], ledger.entries['/artwork/a.jpg']['time'] + 1)
+        self.assertEqual(list(ledger.entries), ['/artwork/a.jpg'])
+        ledger.prune(['moviefanart'], ledger.entries['/artwork/a.jpg']['time'] + 1)
+        self.assertEqual(ledger.entries, {})
+
+
+class RunTest(unittest.TestCase):
+    # runs against a synthetic library with a copier that can be interrupted or made to fail
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='artworkorganizer-test-')
+        xbmc.ROOT = self.root
+        self.profile = os.path.join(self.root, 'profile', 'addon_data', 'script.artworkorganizer')
+        for path in (self.profile, os.path.join(self.root, 'masterprofile')):
+            os.makedirs(path)
+        open(os.path.join(self.root, 'masterprofile', 'sources.xml'), 'w').close()
+        xbmc.LIBRARY = SyntheticLibrary(self.root, sources=2, movies=6, tvshows=1, episodes=2, musicvideos=0,
+                                        artists=0, albums=0, art_files=6, art_size=100)
+        self.directory = os.path.join(self.root, 'artwork', '')
+        xbmcaddon.SETTINGS.clear()
+        # a single copy worker, the run is interrupted after a known number of copies
+        xbmcaddon.SETTINGS.update({'directory': self.directory, 'moviefanart': 'true', 'movieposters': 'true',
+                                   'copy_threads_local': '1'})
+        self.copies = []
+        self.cancel_after = None
+        self.failing = set()
+        self.copy = FileCopier.copy
+        self.iscanceled = xbmcgui.DialogProgress.iscanceled
+        FileCopier.copy = lambda copier, source, dest: self.copy_file(copier, source, dest)
+        xbmcgui.DialogProgress.iscanceled = lambda dialog: self.cancel_after is not None and len(self.copies) >= self.cancel_after
+
+    def tearDown(self):
+        FileCopier.copy = self.copy
+        xbmcgui.DialogProgress.iscanceled = self.iscanceled
+        xbmcaddon.SETTINGS.clear()
+        xbmc.LIBRARY = None
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def copy_file(self, copier, source, dest):
+        if os.path.basename(dest) in self.failing:
+            raise IOError('read failed')
+        self.copies.append(dest)
+        size = self.copy(copier, source, dest)
+        if len(self.copies) == self.cancel_after:
+            # long enough for the run to see the cancel before the next copy starts
+            time.sleep(0.5)
+        return size
+
+    def run_addon(self, **kwargs):
+        import default
+        import lib.library as video_library
+        video_library.invalidate()
+        del self.copies[:]
+        default.Main(**kwargs)
+
+    def files(self):
+        return sorted(os.path.relpath(os.path.join(path, name), self.directory)
+                      for path, dirs, files in os.walk(self.directory) for name in files)
+
+    def test_resume(self):
+        self.cancel_after = 3
+        self.run_addon()
+        copied = list(self.copies)
+        journal = os.path.join(self.profile, 'journal.jsonl')
+        self.assertTrue(os.path.exists(journal))
+        with open(journal) as f:
+            journaled = [record['dest'] for record in map(json.loads, f) if 'dest' in record]
+        # every file the interrupted run copied is in its journal
+        self.assertTrue(set(copied) <= set(journaled))
+        self.assertLess(len(self.files()), 12)
+        self.cancel_after = None
+        self.run_addon()
+        # the resumed run copies the rest, nothing twice, and doesn't delete what was copied before
+        self.assertEqual(len(self.files()), 12)
+        self.assertEqual(set(self.copies) & set(journaled), set())
+        self.assertEqual(len(set(journaled)) + len(self.copies), 12)
+        self.assertFalse(os.path.exists(journal))
+        for dest in journaled:
+            self.assertGreater(os.path.getsize(dest), 0)
+
+    def test_retry(self):
+        self.failing = set(['Movie 1 (1951).jpg'])
+        self.run_addon()
+        with open(os.path.join(self.profile, 'failures.json')) as f:
+            failures = json.load(f)
+        self.assertEqual(sorted(os.path.relpath(dest, self.directory) for dest in failures),
+                         [os.path.join('MovieFanart', 'Movie 1 (1951).jpg'), os.path.join('MoviePosters', 'Movie 1 (1951).jpg')])
+        self.assertEqual(len(self.files()), 10)
+        # still failing, the attempts are counted and nothing else is copied
+        self.run_addon(retry=True)
+        self.assertEqual(self.copies, [])
+        with open(os.path.join(self.profile, 'failures.json')) as f:
+            self.assertEqual([entry['attempts'] for entry in json.load(f).values()], [2, 2])
+        # only the failed files are copied again
+        self.failing = set()
+        self.run_addon(retry=True)
+        self.assertEqual(sorted(self.copies), sorted(failures))
+        self.assertEqual(len(self.files()), 12)
+        with open(os.path.join(self.profile, 'failures.json')) as f:
+            self.assertEqual(json.load(f), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of the manifest of incremental runs, on its own and across runs against a synthetic library.
+
+    python -m pytest tests
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), 'benchmarks', 'fakekodi'))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), 'benchmarks'))
+
+import xbmc
+import xbmcaddon
+from synthetic import SyntheticLibrary
+from lib.manifest import Manifest
+
+
+class ManifestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='artworkorganizer-test-')
+        xbmc.ROOT = self.root
+        self.path = os.path.join(self.root, 'manifest.json')
+        self.directory = os.path.join(self.root, 'artwork', '')
+        self.removed = []
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def manifest(self, directory=None, destinations=None):
+        return Manifest(self.path, directory or self.directory, self.remove, destinations)
+
+    def remove(self, dest):
+        self.removed.append(dest)
+        return not dest.endswith('locked.jpg')
+
+    def dest(self, name):
+        return os.path.join(self.directory, 'MovieFanart', name)
+
+    def test_is_current(self):
+        manifest = self.manifest()
+        manifest.record(self.dest('a.jpg'), 'moviefanart', '/art/a.jpg', 100, 1500000000, 'movie:1')
+        manifest.record(self.dest('b.jpg'), 'moviefanart', '/art/b.jpg', 100, 1500000000, 'movie:2', '720p')
+        self.assertTrue(manifest.is_current(self.dest('a.jpg'), '/art/a.jpg', 100, 1500000000))
+        # another source, size, time or output profile is copied again
+        self.assertFalse(manifest.is_current(self.dest('a.jpg'), '/art/c.jpg', 100, 1500000000))
+        self.assertFalse(manifest.is_current(self.dest('a.jpg'), '/art/a.jpg', 101, 1500000000))
+        self.assertFalse(manifest.is_current(self.dest('a.jpg'), '/art/a.jpg', 100, 1500000001))
+        self.assertFalse(manifest.is_current(self.dest('a.jpg'), '/art/a.jpg', 100, 1500000000, '720p'))
+        self.assertTrue(manifest.is_current(self.dest('b.jpg'), '/art/b.jpg', 100, 1500000000, '720p'))
+        self.assertFalse(manifest.is_current(self.dest('missing.jpg'), '/art/a.jpg', 100, 1500000000))
+
+    def test_save_and_load(self):
+        manifest = self.manifest()
+        manifest.record(self.dest('a.jpg'), 'moviefanart', '/art/a.jpg', 100, 1500000000, 'movie:1')
+        manifest.finished('moviefanart', 1000, True)
+        manifest.save()
+        manifest = self.manifest()
+        self.assertTrue(manifest.is_current(self.dest('a.jpg'), '/art/a.jpg', 100, 1500000000))
+        self.assertEqual(manifest.last_run('moviefanart'), {'started': 1000, 'full': 1000})
+        # a manifest of another artwork directory is never used
+        self.assertEqual(self.manifest(os.path.join(self.root, 'other', '')).entries, {})
+
+    def test_prune(self):
+        manifest = self.manifest()
+        for name, arttype, item in (('a.jpg', 'moviefanart', 'movie:1'), ('b.jpg', 'moviefanart', 'movie:2'),
+                                    ('locked.jpg', 'moviefanart', 'movie:3'), ('c.jpg', 'movieposters', 'movie:2')):
+            manifest.record(self.dest(name), arttype, '/art/' + name, 100, 0, item)
+        manifest.seen(self.dest('a.jpg'))
+        # files of other art types are kept, as are records of files that couldn't be deleted
+        self.assertEqual(manifest.prune(['moviefanart']), [self.dest('b.jpg')])
+        self.assertEqual(sorted(manifest.entries), [self.dest('a.jpg'), self.dest('c.jpg'), self.dest('locked.jpg')])
+        self.assertEqual(self.removed, [self.dest('b.jpg'), self.dest('locked.jpg')])
+
+    def test_prune_items(self):
+        manifest = self.manifest()
+        manifest.record(self.dest('a.jpg'), 'moviefanart', '/art/a.jpg', 100, 0, 'movie:1')
+        manifest.record(self.dest('b.jpg'), 'movieposters', '/art/b.jpg', 100, 0, 'movie:1')
+        manifest.record(self.dest('c.jpg'), 'moviefanart', '/art/c.jpg', 100, 0, 'movie:2')
+        self.assertEqual(manifest.prune_items(['movie:1'], ['moviefanart']), [self.dest('a.jpg')])
+        self.assertEqual(manifest.prune_items(['movie:1']), [self.dest('b.jpg')])
+        self.assertEqual(list(manifest.entries), [self.dest('c.jpg')])
+
+    def test_delta_without_full_run(self):
+        manifest = self.manifest()
+        manifest.finished('moviefanart', 1000, False)
+        self.assertEqual(manifest.last_run('moviefanart'), {'started': 1000, 'full': None})
+        manifest.finished('moviefanart', 2000, True)
+        manifest.finished('moviefanart', 3000, False)
+        self.assertEqual(manifest.last_run('moviefanart'), {'started': 3000, 'full': 2000})
+
+    def test_destinations_changed(self):
+        backup = os.path.join(self.root, 'backup')
+        manifest = self.manifest(destinations=[{'directory': backup}])
+        manifest.record(self.dest('a.jpg'), 'moviefanart', '/art/a.jpg', 100, 0, 'movie:1')
+        manifest.record(os.path.join(backup, 'MovieFanart', 'a.jpg'), 'moviefanart', '/art/a.jpg', 100, 0, 'movie:1')
+        manifest.finished('moviefanart', 1000, True)
+        manifest.save()
+        # the records of a removed destination are dropped, its files are kept, and the library is queried again
+        manifest = self.manifest()
+        self.assertEqual(list(manifest.entries), [self.dest('a.jpg')])
+        self.assertIsNone(manifest.last_run('moviefanart'))
+        self.assertEqual(self.removed, [])
+
+
+class IncrementalTest(unittest.TestCase):
+    # runs that only query the items added since the last run, with a run over the whole library every few days
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='artworkorganizer-test-')
+        xbmc.ROOT = self.root
+        self.profile = os.path.join(self.root, 'profile', 'addon_data', 'script.artworkorganizer')
+        for path in (self.profile, os.path.join(self.root, 'masterprofile')):
+            os.makedirs(path)
+        open(os.path.join(self.root, 'masterprofile', 'sources.xml'), 'w').close()
+        xbmc.LIBRARY = SyntheticLibrary(self.root, sources=2, movies=4, tvshows=1, episodes=2, musicvideos=0,
+                                        artists=0, albums=0, art_files=4, art_size=100)
+        self.directory = os.path.join(self.root, 'artwork', '')
+        xbmcaddon.SETTINGS.clear()
+        xbmcaddon.SETTINGS.update({'directory': self.directory, 'moviefanart': 'true', 'incremental': 'true',
+                                   'delta_queries': 'true', 'full_reconcile_days': '7'})
+
+    def tearDown(self):
+        xbmcaddon.SETTINGS.clear()
+        xbmc.LIBRARY = None
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def run_addon(self):
+        import default
+        import lib.library as video_library
+        video_library.invalidate()
+        xbmc.LIBRARY._filtered = {}
+        default.Main()
+        with open(os.path.join(self.profile, 'manifest.json')) as f:
+            return json.load(f)
+
+    def files(self):
+        return sorted(name for path, dirs, files in os.walk(self.directory) for name in files)
+
+    def test_delta_then_full_reconcile(self):
+        manifest = self.run_addon()
+        self.assertEqual(len(self.files()), 4)
+        full = manifest['runs']['moviefanart']['full']
+        # a movie is removed from the library, a delta run only sees the items added since the last run
+        removed = xbmc.LIBRARY.items['movies'].pop()
+        manifest = self.run_addon()
+        self.assertEqual(len(self.files()), 4)
+        self.assertEqual(manifest['runs']['moviefanart']['full'], full)
+        # once the last full run is older than full_reconcile_days the whole library is queried and pruned
+        xbmcaddon.SETTINGS['full_reconcile_days'] = '0'
+        manifest = self.run_addon()
+        self.assertEqual(len(self.files()), 3)
+        self.assertNotIn('%s (%s).jpg' % (removed['title'], removed['year']), self.files())
+        self.assertGreater(manifest['runs']['moviefanart']['full'], full)
+        self.assertEqual(len(manifest['entries']), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of copy plans, on their own and saved by a dry run and copied by a later run.
+
+    python -m pytest tests
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), 'benchmarks', 'fakekodi'))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), 'benchmarks'))
+
+import xbmc
+import xbmcaddon
+from synthetic import SyntheticLibrary
+from lib.plan import Entry, Plan
+
+
+class PlanTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='artworkorganizer-test-')
+        self.directory = os.path.join(self.root, 'artwork', '')
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def dest(self, *path):
+        return os.path.join(self.directory, *path)
+
+    def test_collisions(self):
+        plan = Plan(self.directory)
+        group = plan.start(['moviefanart'])
+        self.assertTrue(plan.add(group, Entry(self.dest('MovieFanart', 'Movie (2000).jpg'), '/art/1.jpg', 'moviefanart', 'movie:1')))
+        # the same item planned twice isn't a collision, another item with the same file name is
+        self.assertFalse(plan.add(group, Entry(self.dest('MovieFanart', 'Movie (2000).jpg'), '/art/1.jpg', 'moviefanart', 'movie:1')))
+        self.assertFalse(plan.add(group, Entry(self.dest('MovieFanart', 'Movie (2000).jpg'), '/art/2.jpg', 'moviefanart', 'movie:2')))
+        self.assertEqual(plan.collisions, [(self.dest('MovieFanart', 'Movie (2000).jpg'), 'movie:1', 'movie:2')])
+        self.assertEqual(len(plan), 1)
+
+    def test_save_and_load(self):
+        plan = Plan(self.directory)
+        group = plan.start(['moviefanart', 'movieposters'])
+        group.complete = True
+        plan.add(group, Entry(self.dest('MovieFanart', 'Movie (2000).jpg'), '/art/1.jpg', 'moviefanart', 'movie:1',
+                              size=100, current=True, mtime=1500000000))
+        plan.add(group, Entry(self.dest('MoviePosters', 'Movies', 'Movie (2000).jpg'), '/art/2.jpg', 'movieposters', 'movie:1',
+                              split='Movies', size=200))
+        path = os.path.join(self.root, 'plan.json')
+        plan.save(path)
+        with open(path) as f:
+            self.assertEqual(json.load(f)['groups'][0]['entries'][0]['dest'], os.path.join('MovieFanart', 'Movie (2000).jpg'))
+        # the run that copies the plan may reach the artwork directory through another path
+        loaded = Plan.load(path, '/mnt/artwork')
+        group = loaded.groups[0]
+        self.assertTrue(group.complete)
+        self.assertEqual(group.arttypes, ['moviefanart', 'movieposters'])
+        first, second = group.entries
+        self.assertEqual(first.dest, os.path.join('/mnt/artwork', 'MovieFanart', 'Movie (2000).jpg'))
+        self.assertEqual((first.size, first.mtime, first.current), (100, 1500000000, True))
+        self.assertEqual((second.split, second.size, second.mtime, second.current), ('Movies', 200, None, False))
+        self.assertEqual(loaded.totals(), {'moviefanart': [1, 100, 1, 100], 'movieposters': [1, 200, 0, 0]})
+
+
+class ExecuteTest(unittest.TestCase):
+    # a dry run saves the plan, RunScript(script.artworkorganizer,execute) copies it
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='artworkorganizer-test-')
+        xbmc.ROOT = self.root
+        self.profile = os.path.join(self.root, 'profile', 'addon_data', 'script.artworkorganizer')
+        for path in (self.profile, os.path.join(self.root, 'masterprofile')):
+            os.makedirs(path)
+        open(os.path.join(self.root, 'masterprofile', 'sources.xml'), 'w').close()
+        xbmc.LIBRARY = SyntheticLibrary(self.root, sources=2, movies=4, tvshows=1, episodes=2, musicvideos=0,
+                                        artists=0, albums=0, art_files=4, art_size=100)
+        self.directory = os.path.join(self.root, 'artwork', '')
+        xbmcaddon.SETTINGS.clear()
+        xbmcaddon.SETTINGS.update({'directory': self.directory, 'moviefanart': 'true', 'incremental': 'true'})
+        self.planfile = os.path.join(self.profile, 'plan.json')
+
+    def tearDown(self):
+        xbmcaddon.SETTINGS.clear()
+        xbmc.LIBRARY = None
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def run_addon(self, **kwargs):
+        import default
+        import lib.library as video_library
+        video_library.invalidate()
+        default.Main(**kwargs)
+
+    def files(self):
+        return sorted(name for path, dirs, files in os.walk(self.directory) for name in files)
+
+    def entries(self):
+        with open(self.planfile) as f:
+            return json.load(f)['groups'][0]['entries']
+
+    def test_execute(self):
+        self.run_addon(dry_run=True)
+        self.assertEqual(self.files(), [])
+        self.assertEqual(len(self.entries()), 4)
+        self.assertFalse(any(entry['current'] for entry in self.entries()))
+        self.run_addon(plan=self.planfile)
+        self.assertEqual(len(self.files()), 4)
+
+    def test_unknown_size(self):
+        # a source that can't be stat'ed, an uncached image:// url for instance, is planned with 0 bytes
+        self.run_addon(dry_run=True)
+        with open(self.planfile) as f:
+            data = json.load(f)
+        data['groups'][0]['entries'][0]['bytes'] = 0
+        with open(self.planfile, 'w') as f:
+            json.dump(data, f)
+        self.run_addon(plan=self.planfile)
+        self.assertEqual(len(self.files()), 4)
+
+    def test_stale_plan(self):
+        self.run_addon()
+        self.run_addon(dry_run=True)
+        self.assertTrue(all(entry['current'] for entry in self.entries()))
+        # artwork removed after the dry run is copied again, the rest is left alone
+        removed = os.path.join(self.directory, self.entries()[0]['dest'])
+        kept = os.path.join(self.directory, self.entries()[1]['dest'])
+        os.remove(removed)
+        os.utime(kept, (0, 0))
+        self.run_addon(plan=self.planfile)
+        self.assertTrue(os.path.exists(removed))
+        self.assertEqual(os.stat(kept).st_mtime, 0)
+
+    def test_replaced_artwork(self):
+        self.run_addon()
+        dest = os.path.join(self.directory, 'MovieFanart', 'Movie 0 (1950).jpg')
+        with open(dest, 'rb') as f:
+            copied = f.read()
+        # the artwork is replaced by another image of the same size before the dry run
+        source = [path for path in xbmc.LIBRARY.art if open(path, 'rb').read() == copied][0]
+        with open(source, 'wb') as f:
+            f.write(b'x' * len(copied))
+        os.utime(source, (1000000000, 1000000000))
+        self.run_addon(dry_run=True)
+        self.run_addon(plan=self.planfile)
+        with open(dest, 'rb') as f:
+            self.assertEqual(f.read(), b'x' * len(copied))
+
+
+if __name__ == '__main__':
+    unittest.main()
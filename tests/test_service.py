@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of the library notifications collected by the service and of the lock shared with script runs.
+
+    python -m pytest tests
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), 'benchmarks', 'fakekodi'))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import xbmc
+import xbmcgui
+import default
+from service import LibraryMonitor
+
+
+class MonitorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.monitor = LibraryMonitor()
+        self.scanning = False
+        self.getCondVisibility = getattr(xbmc, 'getCondVisibility', None)
+        xbmc.getCondVisibility = lambda condition: condition == 'Library.IsScanning' and self.scanning
+
+    def tearDown(self):
+        if self.getCondVisibility is None:
+            del xbmc.getCondVisibility
+        else:
+            xbmc.getCondVisibility = self.getCondVisibility
+
+    def notify(self, method, data):
+        self.monitor.onNotification('xbmc', method, json.dumps(data))
+
+    def test_filtering(self):
+        self.notify('VideoLibrary.OnUpdate', {'item': {'type': 'movie', 'id': 1}})
+        self.notify('AudioLibrary.OnUpdate', {'type': 'album', 'id': 2})
+        # other notifications, media types and items without an id are ignored
+        self.notify('VideoLibrary.OnScanFinished', {'item': {'type': 'movie', 'id': 3}})
+        self.notify('VideoLibrary.OnUpdate', {'item': {'type': 'song', 'id': 4}})
+        self.notify('VideoLibrary.OnUpdate', {'item': {'type': 'movie'}})
+        self.notify('VideoLibrary.OnUpdate', [1, 2])
+        self.monitor.onNotification('xbmc', 'VideoLibrary.OnUpdate', 'not json')
+        self.assertEqual(self.monitor.take(), ({'movie': set([1]), 'album': set([2])}, {}))
+        self.assertIsNone(self.monitor.changed)
+
+    def test_playcount(self):
+        # a watched state change doesn't touch the artwork, an item added as watched does
+        self.notify('VideoLibrary.OnUpdate', {'item': {'type': 'episode', 'id': 1}, 'playcount': 1})
+        self.assertIsNone(self.monitor.changed)
+        self.notify('VideoLibrary.OnUpdate', {'item': {'type': 'episode', 'id': 2}, 'playcount': 1, 'added': True})
+        self.assertEqual(self.monitor.take(), ({'episode': set([2])}, {}))
+
+    def test_update_and_remove(self):
+        self.notify('VideoLibrary.OnUpdate', {'item': {'type': 'movie', 'id': 1}})
+        self.notify('VideoLibrary.OnRemove', {'type': 'movie', 'id': 1})
+        self.notify('VideoLibrary.OnRemove', {'type': 'movie', 'id': 2})
+        self.notify('VideoLibrary.OnUpdate', {'item': {'type': 'movie', 'id': 2}})
+        self.assertEqual(self.monitor.take(), ({'movie': set([2])}, {'movie': set([1])}))
+
+    def test_debounce(self):
+        self.assertFalse(self.monitor.pending(0))
+        self.notify('VideoLibrary.OnUpdate', {'item': {'type': 'movie', 'id': 1}})
+        self.assertFalse(self.monitor.pending(30))
+        # quiet for long enough, but not while a scan is still running
+        self.monitor.changed = time.time() - 30
+        self.scanning = True
+        self.assertFalse(self.monitor.pending(30))
+        self.scanning = False
+        self.assertTrue(self.monitor.pending(30))
+        # another notification starts the delay over
+        self.notify('VideoLibrary.OnUpdate', {'item': {'type': 'movie', 'id': 2}})
+        self.assertFalse(self.monitor.pending(30))
+        self.monitor.take()
+        self.assertFalse(self.monitor.pending(0))
+
+
+class LockTest(unittest.TestCase):
+
+    def setUp(self):
+        xbmcgui.Window(10000).clearProperty(default.RUNNING)
+
+    def tearDown(self):
+        xbmcgui.Window(10000).clearProperty(default.RUNNING)
+
+    def test_lock(self):
+        self.assertTrue(default.acquire_lock())
+        self.assertFalse(default.acquire_lock())
+        default.release_lock()
+        self.assertTrue(default.acquire_lock())
+        default.release_lock()
+
+    def test_other_owner(self):
+        # a lock set by the script or the service in another interpreter is left alone
+        xbmcgui.Window(10000).setProperty(default.RUNNING, 'other')
+        self.assertFalse(default.acquire_lock())
+        default.release_lock()
+        self.assertEqual(xbmcgui.Window(10000).getProperty(default.RUNNING), 'other')
+
+    def test_threads(self):
+        acquired = []
+        start = threading.Event()
+
+        def acquire():
+            start.wait()
+            acquired.append(default.acquire_lock())
+        threads = [threading.Thread(target=acquire) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        start.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(acquired), [False] * 7 + [True])
+        default.release_lock()
+
+
+if __name__ == '__main__':
+    unittest.main()
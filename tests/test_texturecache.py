@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of the texture cache resolver against a fixture texture database.
+
+    python -m pytest tests
+"""
+
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), 'benchmarks', 'fakekodi'))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import xbmc
+from lib.texturecache import TextureCache, unwrap_image_url
+
+# the columns of Kodi's texture table the resolver reads
+SCHEMA = 'CREATE TABLE texture (id INTEGER PRIMARY KEY, url TEXT, cachedurl TEXT, imagehash TEXT, lasthashcheck TEXT)'
+
+
+class TextureCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='artworkorganizer-test-')
+        xbmc.ROOT = self.root
+        os.makedirs(os.path.join(self.root, 'database'))
+        os.makedirs(os.path.join(self.root, 'thumbnails', 'a'))
+        with sqlite3.connect(os.path.join(self.root, 'database', 'Textures13.db')) as connection:
+            connection.execute(SCHEMA)
+            connection.executemany('INSERT INTO texture (url, cachedurl) VALUES (?, ?)', [
+                ('http://example.com/fanart.jpg', 'a/a1b2.jpg'),
+                ('image://video@%2fmovies%2fmovie.mkv/', 'a/c3d4.jpg'),
+                ('http://example.com/evicted.jpg', 'a/e5f6.jpg')])
+        for name in ('a1b2.jpg', 'c3d4.jpg'):
+            with open(os.path.join(self.root, 'thumbnails', 'a', name), 'wb') as f:
+                f.write(b'cached')
+        self.cache = TextureCache()
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_unwrap(self):
+        self.assertEqual(unwrap_image_url('image://http%3a%2f%2fexample.com%2ffanart.jpg/'), 'http://example.com/fanart.jpg')
+        self.assertEqual(unwrap_image_url('/art/poster.jpg'), '/art/poster.jpg')
+
+    def test_hit(self):
+        path = self.cache.resolve('image://http%3a%2f%2fexample.com%2ffanart.jpg/')
+        self.assertEqual(path, os.path.join(self.root, 'thumbnails', 'a', 'a1b2.jpg'))
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 0))
+
+    def test_wrapped_special_image(self):
+        # video thumbs and embedded art are stored with their image:// url
+        path = self.cache.resolve('image://video@%2fmovies%2fmovie.mkv/')
+        self.assertEqual(path, os.path.join(self.root, 'thumbnails', 'a', 'c3d4.jpg'))
+
+    def test_miss(self):
+        self.assertIsNone(self.cache.resolve('image://http%3a%2f%2fexample.com%2fnew.jpg/'))
+        # a cached image whose file was removed from the thumbnails folder is a miss as well
+        self.assertIsNone(self.cache.resolve('http://example.com/evicted.jpg'))
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 2))
+
+    def test_without_database(self):
+        os.remove(os.path.join(self.root, 'database', 'Textures13.db'))
+        cache = TextureCache()
+        self.assertIsNone(cache.resolve('http://example.com/fanart.jpg'))
+        cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
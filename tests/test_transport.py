@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+"""Tests of the headless runner's JSON-RPC transports against in-process servers.
+
+    python -m pytest tests
+"""
+
+import json
+import os
+import socket
+import sys
+import threading
+import unittest
+
+try:  # python 3
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import StreamRequestHandler, TCPServer, ThreadingMixIn
+except ImportError:  # python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import StreamRequestHandler, TCPServer, ThreadingMixIn
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from headless.transport import HTTPTransport, TCPTransport, TransportError
+
+PING = '{"jsonrpc": "2.0", "method": "JSONRPC.Ping", "id": 1}'
+PONG = '{"id": 1, "jsonrpc": "2.0", "result": "pong"}'
+NOTIFICATION = '{"jsonrpc": "2.0", "method": "VideoLibrary.OnUpdate", "params": {"data": {"item": {"id": 1, "type": "movie"}}}}'
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class ThreadingTCPServer(ThreadingMixIn, TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class JSONRPCHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps the connection open between requests like Kodi's web server
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.requests.append((self.path, self.headers.get('Authorization'), json.loads(body.decode('utf-8'))))
+        status, data = self.server.answers.pop(0) if self.server.answers else (200, PONG)
+        data = data.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        if self.server.close_after:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TCPHandler(StreamRequestHandler):
+
+    def handle(self):
+        decoder = json.JSONDecoder()
+        buffer = ''
+        while True:
+            data = self.request.recv(65536)
+            if not data:
+                return
+            buffer += data.decode('utf-8')
+            request, end = decoder.raw_decode(buffer)
+            buffer = buffer[end:]
+            if self.server.drop:
+                return
+            # a notification ahead of the answer, the answer itself split over two writes
+            answer = NOTIFICATION + json.dumps({'id': request['id'], 'jsonrpc': '2.0', 'result': request['method']})
+            middle = len(answer) - 10
+            self.request.sendall(answer[:middle].encode('utf-8'))
+            self.request.sendall(answer[middle:].encode('utf-8'))
+
+
+class HTTPTransportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), JSONRPCHandler)
+        self.server.connections = 0
+        self.server.requests = []
+        self.server.answers = []
+        self.server.close_after = False
+        threading.Thread(target=self.server.serve_forever).start()
+        self.transport = HTTPTransport('127.0.0.1', self.server.server_address[1], 'kodi', 'secret', timeout=5)
+
+    def tearDown(self):
+        self.transport.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_keep_alive(self):
+        for i in range(3):
+            self.assertEqual(json.loads(self.transport.send(PING))['result'], 'pong')
+        self.assertEqual(self.server.connections, 1)
+        path, authorization, request = self.server.requests[0]
+        self.assertEqual(path, '/jsonrpc')
+        self.assertEqual(authorization, 'Basic a29kaTpzZWNyZXQ=')
+        self.assertEqual(request['method'], 'JSONRPC.Ping')
+
+    def test_connection_per_thread(self):
+        threads = [threading.Thread(target=self.transport.send, args=(PING,)) for i in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.server.connections, 2)
+
+    def test_reconnect_after_close(self):
+        # the server closes every connection after its answer, the next request opens a new one
+        self.server.close_after = True
+        self.transport.send(PING)
+        self.transport.send(PING)
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(self.server.connections, 2)
+
+    def test_error_status(self):
+        self.server.answers.append((401, '{}'))
+        self.assertRaises(TransportError, self.transport.send, PING)
+
+
+class TCPTransportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingTCPServer(('127.0.0.1', 0), TCPHandler)
+        self.server.drop = False
+        threading.Thread(target=self.server.serve_forever).start()
+        self.transport = TCPTransport('127.0.0.1', self.server.server_address[1], timeout=5)
+
+    def tearDown(self):
+        self.transport.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_notifications_skipped(self):
+        for id, method in ((1, 'JSONRPC.Ping'), (2, 'VideoLibrary.GetMovies')):
+            request = json.dumps({'jsonrpc': '2.0', 'method': method, 'id': id})
+            response = json.loads(self.transport.send(request))
+            self.assertEqual((response['id'], response['result']), (id, method))
+
+    def test_closed_connection(self):
+        self.server.drop = True
+        self.assertRaises(TransportError, self.transport.send, PING)
+        # the next request connects again
+        self.server.drop = False
+        self.assertEqual(json.loads(self.transport.send(PING))['result'], 'JSONRPC.Ping')
+
+    def test_refused(self):
+        listener = socket.socket()
+        listener.bind(('127.0.0.1', 0))
+        port = listener.getsockname()[1]
+        listener.close()
+        self.assertRaises(TransportError, TCPTransport('127.0.0.1', port, timeout=5).send, PING)
+
+
+if __name__ == '__main__':
+    unittest.main()